@@ -1,15 +1,25 @@
-from flask import Flask, jsonify, request, Response, make_response
+from flask import Flask, jsonify, request, Response, make_response, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from werkzeug.exceptions import BadRequest, Unauthorized, NotFound
 import logging
 from dotenv import load_dotenv
+import json
 import os
+import time
 
 from models.user_model import Users
-from models.favourite_location import FavoriteLocation
+from models.favourite_location import FAVORITE_FIELDS, FavoriteLocation
 import weather_api
-from db import db
+from auth_tokens import InvalidTokenError, issue_token, verify_token
+from cache_warmer import CacheWarmer
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS, REGISTRY
+from password_hashing import configure_password_hashing
+from query_stats import instrument_engine, start_tracking, stop_tracking
+from response_formats import compress_response, encode_response, negotiate_format
+from resilience import CircuitOpenError, DeadlineExceeded, configure_resilience, end_deadline, start_deadline, time_remaining
+from schema_upgrades import upgrade_favorite_locations, upgrade_geocode_cache, upgrade_location_names
+from db import configure_sqlite_pragmas, db
 from config import ProductionConfig, TestConfig
 
 # Load environment variables from .env file
@@ -32,24 +42,119 @@ def create_app(config_class=TestConfig):
     
     db.init_app(app)  # Initialize db with app
     with app.app_context():
+        configure_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+        instrument_engine(db.engine)  # Per-request query counts, see report_query_stats()
         db.create_all()  # Recreate all tables
+        upgrade_favorite_locations(db.engine)  # Favorites stored before the shared locations table
+        upgrade_location_names(db.engine)  # Locations keyed by their raw name
+        upgrade_geocode_cache(db.engine)  # Geocoding cache stored before its column was renamed
+        FavoriteLocation.create_missing_indexes()  # Indexes added after the table was created
         print("Tables created successfully!")
-    
+
+    # Circuit breakers and retry budgets for the upstream hosts
+    configure_resilience(
+        failure_threshold=app.config['CIRCUIT_FAILURE_THRESHOLD'],
+        recovery_timeout=app.config['CIRCUIT_RECOVERY_TIMEOUT'],
+        retry_budget_ratio=app.config['RETRY_BUDGET_RATIO'],
+        retry_budget_min_retries=app.config['RETRY_BUDGET_MIN_RETRIES'],
+        retry_budget_window=app.config['RETRY_BUDGET_WINDOW']
+    )
+
+    # One long-lived Open-Meteo client per worker, shared by all request threads
+    openmeteo = weather_api.build_client(
+        cache_name=app.config['OPENMETEO_CACHE_NAME'],
+        cache_backend=app.config['OPENMETEO_CACHE_BACKEND'],
+        expire_after=app.config['OPENMETEO_CACHE_EXPIRE'],
+        pool_size=app.config['OPENMETEO_POOL_SIZE'],
+        retries=app.config['OPENMETEO_RETRIES'],
+        backoff_factor=app.config['OPENMETEO_BACKOFF_FACTOR'],
+        timeout=app.config['OPENMETEO_TIMEOUT']
+    )
+    app.extensions['openmeteo'] = openmeteo
+    weather_api.build_openweather_session(
+        pool_size=app.config['OPENWEATHER_POOL_SIZE'],
+        timeout=app.config['OPENWEATHER_TIMEOUT']
+    )
+    weather_api.configure_cache(
+        max_entries=app.config['WEATHER_CACHE_MAX_ENTRIES'],
+        resolution=app.config['WEATHER_CACHE_RESOLUTION'],
+        ttls=app.config['WEATHER_CACHE_TTLS'],
+        single_flight_timeout=app.config['SINGLE_FLIGHT_TIMEOUT'],
+        stale_grace=app.config['WEATHER_CACHE_STALE_GRACE']
+    )
+    weather_api.configure_geocode_cache(
+        max_entries=app.config['GEOCODE_CACHE_MAX_ENTRIES'],
+        ttl=app.config['GEOCODE_CACHE_TTL'],
+        negative_ttl=app.config['GEOCODE_NEGATIVE_TTL']
+    )
+    weather_api.configure_historical_store(
+        directory=app.config['HISTORICAL_STORE_DIR'],
+        settle_days=app.config['HISTORICAL_SETTLE_DAYS'],
+        chunk_days=app.config['HISTORICAL_CHUNK_DAYS'],
+        chunk_retries=app.config['HISTORICAL_CHUNK_RETRIES']
+    )
+    weather_api.configure_fan_out(
+        max_workers=app.config['FAN_OUT_MAX_WORKERS'],
+        max_per_host=app.config['FAN_OUT_MAX_PER_HOST']
+    )
+
+    # Keep the weather cache warm for all stored favorites
+    cache_warmer = CacheWarmer(
+        app,
+        client=openmeteo,
+        lead_time=app.config['CACHE_WARMER_LEAD_TIME'],
+        batch_size=app.config['OPENMETEO_BATCH_SIZE']
+    )
+    app.extensions['cache_warmer'] = cache_warmer
+    if app.config['CACHE_WARMER_ENABLED']:
+        cache_warmer.start()
+
+    configure_password_hashing(
+        algorithm=app.config['PASSWORD_KDF'],
+        cost=app.config['PASSWORD_KDF_COST'],
+        pool_size=app.config['PASSWORD_HASH_WORKERS']
+    )
+
+    if not app.config['AUTH_TOKEN_SECRET']:
+        # Tokens then only verify on the worker that issued them, and not after a restart
+        logger.warning("AUTH_TOKEN_SECRET is not set; using a random per-process secret for session tokens.")
+        app.config['AUTH_TOKEN_SECRET'] = os.urandom(32).hex()
+
+    # Helper function for reading the session token of a request
+    def bearer_token():
+        """
+        Returns the session token from the request's 'Authorization: Bearer <token>' header, or None.
+        """
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token.strip():
+            return None
+        return token.strip()
 
     # Helper function for user authentication
-    def authenticate_user(request_data) -> Users:
+    def authenticate_user(request_data, allow_token: bool = True):
         """
-        Authenticates a user by verifying the provided username and password.
+        Authenticates a user by their session token, or by verifying the provided username and password.
+
+        A session token (see /login) is verified from its signature alone, without touching the database.
 
         Args:
             request_data (dict): Dictionary containing 'username' and 'password'.
+            allow_token (bool): Whether a session token may be used instead of the password.
 
         Returns:
-            Users: The authenticated user object.
+            Users or TokenUser: The authenticated user, with its `id` and `username`.
 
         Raises:
             Unauthorized: If authentication fails.
         """
+        token = bearer_token() if allow_token else None
+        if token:
+            try:
+                return verify_token(token, app.config['AUTH_TOKEN_SECRET'])
+            except InvalidTokenError as ite:
+                logger.warning(f"Session token rejected: {ite}")
+                raise Unauthorized(str(ite))
+
         username = request_data.get('username')
         password = request_data.get('password')
         if not username or not password:
@@ -57,11 +162,10 @@ def create_app(config_class=TestConfig):
             raise Unauthorized("Username and password are required.")
 
         try:
-            is_valid = Users.check_password(username, password)
-            if not is_valid:
+            user = Users.authenticate(username, password)
+            if user is None:
                 logger.warning(f"Authentication failed for user '{username}'.")
                 raise Unauthorized("Invalid username or password.")
-            user = Users.query.filter_by(username=username).first()
             return user
         except ValueError as ve:
             logger.error(f"Authentication error: {ve}")
@@ -70,6 +174,152 @@ def create_app(config_class=TestConfig):
             logger.error(f"Unexpected authentication error: {e}")
             raise Unauthorized("Authentication failed due to an unexpected error.")
 
+    # Helper function for failing fast while an upstream is unavailable
+    def circuit_open_response(error: CircuitOpenError) -> tuple:
+        """
+        Builds the response for a request that could not be served because an upstream circuit is open.
+
+        Args:
+            error (CircuitOpenError): The error raised for the upstream host.
+
+        Returns:
+            tuple: A 503 JSON response with a Retry-After header.
+        """
+        return jsonify({"error": "Weather service temporarily unavailable. Please try again later."}), 503, \
+            {"Retry-After": str(max(int(error.retry_after), 1))}
+
+    # Helper function for requests that ran out of time
+    def deadline_exceeded_response(error: DeadlineExceeded) -> tuple:
+        """
+        Builds the response for a request that could not be served within its deadline.
+
+        Args:
+            error (DeadlineExceeded): The error raised when the deadline passed.
+
+        Returns:
+            tuple: A 504 JSON response.
+        """
+        return jsonify({"error": "The request could not be completed in time. Please try again later."}), 504
+
+    # Count and time every request per route and status, see /api/metrics. Registered first so that
+    # the timing covers the other hooks (after_request functions run in reverse order)
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        labels = {
+            "route": request.url_rule.rule if request.url_rule else 'unmatched',  # Templates keep the series bounded
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        HTTP_REQUESTS.inc(**labels)
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, **labels)
+        return response
+
+    # Every request gets a time budget; upstream calls shrink their timeouts to fit it
+    @app.before_request
+    def start_request_deadline():
+        seconds = app.config['REQUEST_DEADLINES'].get(request.endpoint, app.config['REQUEST_DEADLINE'])
+        g.deadline_token = start_deadline(seconds)
+
+    @app.teardown_request
+    def end_request_deadline(exc):
+        token = g.pop('deadline_token', None)
+        if token is not None:
+            end_deadline(token)
+
+    # Count and time the SQL statements of each request
+    @app.before_request
+    def start_query_stats():
+        g.query_stats, g.query_stats_token = start_tracking()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        message = f"{request.method} {request.path} ran {stats.count} SQL queries in {stats.duration * 1000:.1f} ms"
+        if stats.count > app.config['QUERY_COUNT_WARNING']:
+            logger.warning(message)
+        else:
+            logger.debug(message)
+        if app.config['QUERY_STATS_HEADER']:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-Query-Time-Ms'] = f"{stats.duration * 1000:.1f}"
+        return response
+
+    @app.teardown_request
+    def end_query_stats(exc):
+        token = g.pop('query_stats_token', None)
+        if token is not None:
+            stop_tracking(token)
+
+    # Large responses are compressed for clients that accept it
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request.accept_encodings,
+                                 min_size=app.config['COMPRESSION_MIN_SIZE'], level=app.config['COMPRESSION_LEVEL'])
+
+    # Helper function for content negotiation on the weather routes
+    def response_format(csv_allowed: bool = False) -> str:
+        """
+        Picks the encoding of a weather response from the 'format' query parameter or the Accept header.
+
+        Args:
+            csv_allowed (bool): Whether the route can be encoded as CSV.
+
+        Returns:
+            str: The mimetype to encode the response with.
+
+        Raises:
+            BadRequest: If the requested format is unknown or not available for the route.
+        """
+        try:
+            return negotiate_format(request.accept_mimetypes, request.args.get('format'), csv_allowed)
+        except ValueError as ve:
+            logger.error(str(ve))
+            raise BadRequest(str(ve))
+
+    # Helper function for paging and projecting the favorites listings
+    def favorites_page_args(extra_fields: tuple = ()) -> tuple:
+        """
+        Reads the 'limit', 'cursor' and 'fields' query parameters of a favorites listing.
+
+        Args:
+            extra_fields (tuple): Fields the route adds to each favorite besides FAVORITE_FIELDS.
+
+        Returns:
+            tuple: The page size, the cursor of the previous page (None for the first page),
+                and the requested fields in the order of FAVORITE_FIELDS + extra_fields.
+
+        Raises:
+            BadRequest: If a parameter is invalid or a field is unknown.
+        """
+        allowed = FAVORITE_FIELDS + extra_fields
+        try:
+            limit = int(request.args.get('limit', app.config['FAVORITES_PAGE_SIZE']))
+            cursor = request.args.get('cursor')
+            cursor = int(cursor) if cursor else None
+        except ValueError:
+            raise BadRequest("'limit' and 'cursor' must be integers.")
+        max_limit = app.config['FAVORITES_MAX_PAGE_SIZE']
+        if not 1 <= limit <= max_limit:
+            raise BadRequest(f"'limit' must be between 1 and {max_limit}.")
+
+        requested = request.args.get('fields')
+        if not requested:
+            return limit, cursor, allowed
+        names = {name.strip() for name in requested.split(',') if name.strip()}
+        unknown = names.difference(allowed)
+        if unknown or not names:
+            raise BadRequest(f"Unknown fields: {', '.join(sorted(unknown))}. Expected any of: {', '.join(allowed)}.")
+        return limit, cursor, tuple(name for name in allowed if name in names)
+
 
 
     ####################################################
@@ -112,10 +362,12 @@ def create_app(config_class=TestConfig):
         """
         Route to authenticate a user.
         
-        Expects 'username' and 'password' in the JSON body.
+        Expects 'username' and 'password' in the JSON body. On success, returns a signed session
+        token that the other routes accept in an 'Authorization: Bearer <token>' header instead
+        of the username and password.
         
         Returns:
-            Response: JSON response with success or error message.
+            Response: JSON response with the session token, or error message.
         """
         data = request.get_json()
         if not data or 'username' not in data or 'password' not in data:
@@ -123,9 +375,15 @@ def create_app(config_class=TestConfig):
             raise BadRequest("Invalid request payload. 'username' and 'password' are required.")
 
         try:
-            user = authenticate_user(data)
+            user = authenticate_user(data, allow_token=False)
+            token = issue_token(user.id, user.username, app.config['AUTH_TOKEN_SECRET'], app.config['AUTH_TOKEN_TTL'])
             logger.info(f"User '{user.username}' authenticated successfully.")
-            return jsonify({"message": f"User '{user.username}' authenticated successfully."}), 200
+            return jsonify({
+                "message": f"User '{user.username}' authenticated successfully.",
+                "token": token,
+                "token_type": "Bearer",
+                "expires_in": app.config['AUTH_TOKEN_TTL']
+            }), 200
         except Unauthorized as ue:
             return jsonify({"error": str(ue)}), 401
         except Exception as e:
@@ -153,7 +411,7 @@ def create_app(config_class=TestConfig):
 
         # Authenticate user with current credentials
         try:
-            user = authenticate_user({'username': username, 'password': current_password})
+            user = authenticate_user({'username': username, 'password': current_password}, allow_token=False)
         except Unauthorized as ue:
             return jsonify({"error": str(ue)}), 401
         except Exception as e:
@@ -185,7 +443,7 @@ def create_app(config_class=TestConfig):
         """
         Route to add a new favorite location for a user.
         
-        Expects 'username', 'password', and 'location_name' in the JSON body.
+        Expects 'location_name' in the JSON body, and 'username' and 'password' unless a session token is sent.
         
         Returns:
             Response: JSON response with favorite location name or error message.
@@ -212,6 +470,12 @@ def create_app(config_class=TestConfig):
         except ValueError as ve:
             logger.error(f"Error fetching coordinates: {ve}")
             return jsonify({"error": str(ve)}), 400
+        except CircuitOpenError as ce:
+            logger.error(f"Geocoding unavailable: {ce}")
+            return circuit_open_response(ce)
+        except DeadlineExceeded as de:
+            logger.error(f"Geocoding timed out: {de}")
+            return deadline_exceeded_response(de)
         except Exception as e:
             logger.error(f"Unexpected error fetching coordinates: {e}")
             return jsonify({"error": "Could not fetch coordinates for the provided location."}), 500
@@ -233,20 +497,95 @@ def create_app(config_class=TestConfig):
             return jsonify({"error": "Internal server error."}), 500
             
 
+    @app.route('/api/favorites/import', methods=['POST'])
+    def import_favorite_locations():
+        """
+        Route to add many favorite locations for a user at once.
+
+        Expects a list of location names under 'locations' in the JSON body, and 'username' and
+        'password' unless a session token is sent. Locations are geocoded concurrently and all
+        the ones found are added in a single transaction.
+
+        Returns:
+            Response: JSON response with the result of each location, in order, and counts per status.
+        """
+        data = request.get_json(silent=True)
+        locations = data.get('locations') if isinstance(data, dict) else None
+        if not isinstance(locations, list) or not locations:
+            logger.error("Invalid payload for importing favorite locations.")
+            raise BadRequest("Invalid request payload. 'locations' must be a non-empty list of location names.")
+        max_items = app.config['FAVORITES_IMPORT_MAX_ITEMS']
+        if len(locations) > max_items:
+            raise BadRequest(f"Too many locations. At most {max_items} can be imported at once.")
+        if not all(isinstance(name, str) and name.strip() for name in locations):
+            raise BadRequest("Invalid request payload. Every location must be a non-empty string.")
+
+        # Authenticate user
+        try:
+            user = authenticate_user(data)
+        except Unauthorized as ue:
+            return jsonify({"error": str(ue)}), 401
+        except Exception as e:
+            logger.error(f"Unexpected error during favorite locations import: {e}")
+            return jsonify({"error": "Internal server error."}), 500
+
+        results = [{"location_name": name} for name in locations]
+        found = []
+        for result, coordinates in zip(results, weather_api.get_coordinates_batch(locations)):
+            if isinstance(coordinates, ValueError):
+                result.update(status="error", error=str(coordinates))
+            elif isinstance(coordinates, CircuitOpenError):
+                result.update(status="error", error="Geocoding is temporarily unavailable.")
+            elif isinstance(coordinates, DeadlineExceeded):
+                result.update(status="error", error="Geocoding timed out.")
+            elif isinstance(coordinates, Exception):
+                logger.error(f"Unexpected error fetching coordinates for '{result['location_name']}': {coordinates}")
+                result.update(status="error", error="Could not fetch coordinates for the location.")
+            else:
+                found.append((result, coordinates))
+
+        try:
+            favorites = FavoriteLocation.create_favorites(
+                user.id, [(result["location_name"], lat, lon) for result, (lat, lon) in found]
+            )
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 409
+        except Exception as e:
+            logger.exception(f"Unexpected error while importing favorite locations for user '{user.username}': {e}")
+            return jsonify({"error": "Internal server error."}), 500
+        for (result, _), favorite in zip(found, favorites):
+            if favorite is None:
+                result.update(status="exists")
+            else:
+                result.update(status="created", favorite_location={
+                    "id": favorite.id,
+                    "location_name": favorite.location_name,
+                    "latitude": favorite.latitude,
+                    "longitude": favorite.longitude
+                })
+
+        counts = {status: sum(result["status"] == status for result in results)
+                  for status in ("created", "exists", "error")}
+        logger.info(f"Imported favorite locations for user '{user.username}': {counts}")
+        return jsonify({"results": results, "counts": counts}), 200
+
+
     @app.route('/api/favorites', methods=['GET'])
     def get_all_favorites():
         """
-        Route to retrieve all favorite locations for a user.
+        Route to retrieve the favorite locations of a user, one page at a time.
         
-        Expects 'username' and 'password' as query parameters.
+        Expects 'username' and 'password' as query parameters, unless a session token is sent.
+        'limit' sets the page size, 'cursor' continues after the page that returned it, and
+        'fields' is a comma-separated list of the fields to return for each favorite.
         
         Returns:
-            Response: JSON response with a list of favorite locations.
+            Response: JSON response with a page of favorite locations and the cursor of the next page.
         """
         username = request.args.get('username')
         password = request.args.get('password')
 
-        if not username or not password:
+        if not bearer_token() and (not username or not password):
             logger.error("Missing 'username' or 'password' query parameters.")
             raise BadRequest("Missing 'username' or 'password' query parameters.")
 
@@ -259,39 +598,47 @@ def create_app(config_class=TestConfig):
             logger.error(f"Unexpected error during fetching all favorites: {e}")
             return jsonify({"error": "Internal server error."}), 500
 
-        # Retrieve all favorites
-        favorites = FavoriteLocation.get_all_favorites(user.id)
-        favorites_data = [{
-            "id": fav.id,
-            "location_name": fav.location_name,
-            "latitude": fav.latitude,
-            "longitude": fav.longitude
-        } for fav in favorites]
+        limit, cursor, fields = favorites_page_args()
+
+        # Retrieve one page of favorites, loading only the requested columns
+        favorites, next_cursor = FavoriteLocation.get_favorites_page(user.id, limit, cursor, fields)
+        favorites_data = [{field: getattr(fav, field) for field in fields} for fav in favorites]
 
 
-        logger.info(f"Retrieved all favorites for user '{user.username}'.")
-        return jsonify({"favorites": favorites_data}), 200
+        logger.info(f"Retrieved a page of favorites for user '{user.username}'.")
+        return jsonify({"favorites": favorites_data, "next_cursor": next_cursor}), 200
 
 
     @app.route('/api/favorites/weather', methods=['GET'])
     def get_all_favorites_with_weather():
         """
-        Route to retrieve all favorite locations for a user along with their current weather.
+        Route to retrieve the favorite locations of a user along with their current weather, one page at a time.
+
+        Weather is only fetched for the favorites on the page. With an 'Accept: application/x-ndjson'
+        header or the 'stream' query flag, the page is streamed as newline-delimited JSON instead, one
+        line per favorite in the order their weather becomes available, with the cursor of the next
+        page in the 'X-Next-Cursor' header.
 
         Query Parameters:
-        - username (str, required): The username of the account.
-        - password (str, required): The password of the account.
+        - username (str, required without a session token): The username of the account.
+        - password (str, required without a session token): The password of the account.
+        - limit (int, optional): The page size (default: FAVORITES_PAGE_SIZE).
+        - cursor (int, optional): The 'next_cursor' of the previous page.
+        - fields (str, optional): Comma-separated fields to return for each favorite.
+        - stream (bool, optional): Stream the favorites as newline-delimited JSON.
+        - format (str, optional): 'json' or 'msgpack', overriding the Accept header.
 
         Returns:
-        - 200: A JSON object containing a list of favorite locations with their weather details.
-        - 400: Missing 'username' or 'password' query parameters.
+        - 200: A JSON object containing a list of favorite locations with their weather details,
+            or one JSON object per line when streaming.
+        - 400: Missing 'username' or 'password' query parameters, or invalid paging parameters.
         - 401: Unauthorized access due to invalid credentials.
         - 500: Internal server error.
         """
         username = request.args.get('username')
         password = request.args.get('password')
 
-        if not username or not password:
+        if not bearer_token() and (not username or not password):
             logger.error("Missing 'username' or 'password' query parameters.")
             raise BadRequest("Missing 'username' or 'password' query parameters.")
 
@@ -304,36 +651,67 @@ def create_app(config_class=TestConfig):
             logger.error(f"Unexpected error during fetching favorites with weather: {e}")
             return jsonify({"error": "Internal server error."}), 500
 
-        # Retrieve all favorites
-        favorites = FavoriteLocation.query.filter_by(user_id=user.id).all()
-        if not favorites:
-            logger.info(f"No favorite locations found for user '{user.username}'.")
-            return jsonify({"favorites": []}), 200
+        limit, cursor, fields = favorites_page_args(extra_fields=("current_weather", "cache"))
 
-        favorites_with_weather = []
-        for fav in favorites:
-            try:
-                weather = weather_api.get_current_weather(fav.latitude, fav.longitude)
-                favorites_with_weather.append({
-                    "id": fav.id,
-                    "location_name": fav.location_name,
-                    "latitude": fav.latitude,
-                    "longitude": fav.longitude,
-                    "current_weather": weather['current_weather']
-                })
-            except Exception as e:
-                logger.error(f"Error fetching weather for '{fav.location_name}': {e}")
-                favorites_with_weather.append({
-                    "id": fav.id,
-                    "location_name": fav.location_name,
-                    "latitude": fav.latitude,
-                    "longitude": fav.longitude,
-                    "current_weather": None,
-                    "error": "Could not fetch weather data."
-                })
+        stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes') or \
+            request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+        mimetype = None if stream else response_format()
 
-        logger.info(f"Retrieved all favorites with weather for user '{user.username}'.")
-        return jsonify({"favorites": favorites_with_weather}), 200
+        # Retrieve one page of favorites; the coordinates are needed for the weather either way
+        columns = set(fields).intersection(FAVORITE_FIELDS) | {"latitude", "longitude"}
+        favorites, next_cursor = FavoriteLocation.get_favorites_page(
+            user.id, limit, cursor, tuple(field for field in FAVORITE_FIELDS if field in columns)
+        )
+        if not favorites:
+            logger.info(f"No favorite locations found for user '{user.username}'.")
+            if stream:
+                return Response('', mimetype='application/x-ndjson')
+            return encode_response({"favorites": [], "next_cursor": None}, mimetype)
+
+        def favorite_with_weather(fav, weather) -> dict:
+            entry = {field: getattr(fav, field) for field in fields if field in FAVORITE_FIELDS}
+            if weather is not None and not isinstance(weather, Exception):
+                entry.update((field, weather[field]) for field in ("current_weather", "cache") if field in fields)
+                return entry
+            logger.error(f"Error fetching weather for favorite ID '{fav.id}': {weather}")
+            if "current_weather" in fields:
+                entry["current_weather"] = None
+            entry["error"] = "Weather data could not be fetched in time." if isinstance(weather, DeadlineExceeded) \
+                else "Could not fetch weather data."
+            return entry
+
+        # Fetch the weather for each distinct place on the page in as few upstream requests as possible
+        coords = {fav.location_id: (fav.latitude, fav.longitude) for fav in favorites}
+        if stream:
+            # A user favorites each place at most once
+            favorites_by_location = {fav.location_id: fav for fav in favorites}
+            remaining = time_remaining()
+
+            def generate():
+                # The stream outlives the view, so it carries the request's deadline along
+                token = start_deadline(remaining)
+                try:
+                    for location_id, weather in weather_api.iter_current_weather_batch(
+                            coords, client=openmeteo, chunk_size=app.config['OPENMETEO_BATCH_SIZE']):
+                        yield json.dumps(favorite_with_weather(favorites_by_location[location_id], weather)) + '\n'
+                finally:
+                    end_deadline(token)
+                logger.info(f"Streamed a page of favorites with weather for user '{user.username}'.")
+
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            if next_cursor is not None:
+                response.headers['X-Next-Cursor'] = str(next_cursor)
+            return response
+
+        weather_by_location = weather_api.get_current_weather_batch(
+            coords,
+            client=openmeteo,
+            chunk_size=app.config['OPENMETEO_BATCH_SIZE']
+        )
+        favorites_with_weather = [favorite_with_weather(fav, weather_by_location.get(fav.location_id)) for fav in favorites]
+
+        logger.info(f"Retrieved a page of favorites with weather for user '{user.username}'.")
+        return encode_response({"favorites": favorites_with_weather, "next_cursor": next_cursor}, mimetype)
 
 
     @app.route('/api/favorites/<int:favorite_id>/weather', methods=['GET'])
@@ -345,8 +723,9 @@ def create_app(config_class=TestConfig):
         - favorite_id (int, required): The ID of the favorite location.
 
         Query Parameters:
-        - username (str, required): The username of the account.
-        - password (str, required): The password of the account.
+        - username (str, required without a session token): The username of the account.
+        - password (str, required without a session token): The password of the account.
+        - format (str, optional): 'json' or 'msgpack', overriding the Accept header.
 
         Returns:
         - 200: A JSON object containing the current weather for the specified favorite location.
@@ -354,13 +733,16 @@ def create_app(config_class=TestConfig):
         - 401: Unauthorized access due to invalid credentials.
         - 404: Favorite location not found for the specified user.
         - 500: Internal server error or issue fetching weather data.
+        - 503: The weather service is temporarily unavailable.
+        - 504: The weather data could not be fetched within the request deadline.
         """
         username = request.args.get('username')
         password = request.args.get('password')
 
-        if not username or not password:
+        if not bearer_token() and (not username or not password):
             logger.error("Missing 'username' or 'password' query parameters.")
             raise BadRequest("Missing 'username' or 'password' query parameters.")
+        mimetype = response_format()
 
         # Authenticate user
         try:
@@ -379,21 +761,26 @@ def create_app(config_class=TestConfig):
 
         # Fetch current weather
         try:
-            lat, lon = FavoriteLocation.get_current_weather(favorite_id, user.id)
-            
-            weather = weather_api.get_current_weather(lat, lon)
+            weather = weather_api.get_current_weather(favorite.latitude, favorite.longitude, client=openmeteo)
             
             logger.info(f"Retrieved current weather for favorite location ID {favorite_id}.")
             
-            return jsonify({
+            return encode_response({
                 "favorite_location": {
                     "id": favorite.id,
                     "location_name": favorite.location_name,
                     "latitude": favorite.latitude,
                     "longitude": favorite.longitude
                 },
-                "current_weather": weather['current_weather']
-            }), 200
+                "current_weather": weather['current_weather'],
+                "cache": weather['cache']
+            }, mimetype, headers={"Age": str(weather['cache']['age_seconds'])})
+        except CircuitOpenError as ce:
+            logger.error(f"Weather unavailable for favorite location '{favorite.location_name}': {ce}")
+            return circuit_open_response(ce)
+        except DeadlineExceeded as de:
+            logger.error(f"Weather for favorite location '{favorite.location_name}' timed out: {de}")
+            return deadline_exceeded_response(de)
         except Exception as e:
             logger.error(f"Error fetching weather for favorite location '{favorite.location_name}': {e}")
             return jsonify({"error": "Could not fetch weather data."}), 500
@@ -409,10 +796,12 @@ def create_app(config_class=TestConfig):
         - favorite_id (int, required): The ID of the favorite location.
 
         Query Parameters:
-        - username (str, required): The username of the account.
-        - password (str, required): The password of the account.
+        - username (str, required without a session token): The username of the account.
+        - password (str, required without a session token): The password of the account.
         - start_date (str, required): The start date for historical weather data in 'YYYY-MM-DD' format.
         - end_date (str, required): The end date for historical weather data in 'YYYY-MM-DD' format.
+        - layout (str, optional): 'records' (default, one object per day) or 'columnar' (one list per variable).
+        - format (str, optional): 'json', 'msgpack' or 'csv' (the daily rows only), overriding the Accept header.
 
         Returns:
         - 200: A JSON object containing the historical weather data for the specified favorite location.
@@ -420,16 +809,20 @@ def create_app(config_class=TestConfig):
         - 401: Unauthorized access due to invalid credentials.
         - 404: Favorite location not found for the specified user.
         - 500: Internal server error or issue fetching historical weather data.
+        - 503: The weather service is temporarily unavailable.
+        - 504: The historical weather data could not be fetched within the request deadline.
         """
 
         username = request.args.get('username')
         password = request.args.get('password')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        layout = request.args.get('layout', default='records')
 
-        if not username or not password or not start_date or not end_date:
+        if (not bearer_token() and (not username or not password)) or not start_date or not end_date:
             logger.error("Missing required query parameters for historical weather.")
             raise BadRequest("Missing 'username', 'password', 'start_date', or 'end_date' query parameters.")
+        mimetype = response_format(csv_allowed=True)
 
         # Authenticate user
         try:
@@ -445,21 +838,28 @@ def create_app(config_class=TestConfig):
             latitude, longitude, start_date, end_date = FavoriteLocation.get_historical_weather(favorite_id, user.id, start_date, end_date)
             
             # Fetch historical weather using the retrieved coordinates
-            historical_weather = weather_api.get_historical_weather(latitude, longitude, start_date, end_date)
+            historical_weather = weather_api.get_historical_weather(latitude, longitude, start_date, end_date, client=openmeteo,
+                                                                    layout=layout)
             
             logger.info(f"Retrieved historical weather for favorite location ID '{favorite_id}'.")
             
-            return jsonify({
+            return encode_response({
                 "favorite_location": {
                     "id": favorite_id,
                     "latitude": latitude,
                     "longitude": longitude
                 },
                 "historical_weather": historical_weather['historical_weather']
-            }), 200
+            }, mimetype, csv_key="historical_weather")
         except ValueError as ve:
             logger.error(f"Error retrieving favorite location or historical weather: {ve}")
             return jsonify({"error": str(ve)}), 400
+        except CircuitOpenError as ce:
+            logger.error(f"Historical weather unavailable for favorite ID '{favorite_id}': {ce}")
+            return circuit_open_response(ce)
+        except DeadlineExceeded as de:
+            logger.error(f"Historical weather for favorite ID '{favorite_id}' timed out: {de}")
+            return deadline_exceeded_response(de)
         except Exception as e:
             logger.error(f"Error fetching historical weather for favorite ID '{favorite_id}': {e}")
             return jsonify({"error": "Could not fetch historical weather data."}), 500
@@ -473,9 +873,11 @@ def create_app(config_class=TestConfig):
         - favorite_id (int, required): The ID of the favorite location.
 
         Query Parameters:
-        - username (str, required): The username of the account.
-        - password (str, required): The password of the account.
+        - username (str, required without a session token): The username of the account.
+        - password (str, required without a session token): The password of the account.
         - days (int, optional): The number of days to retrieve the forecast for (default is 7).
+        - layout (str, optional): 'records' (default, one object per day) or 'columnar' (one list per variable).
+        - format (str, optional): 'json' or 'msgpack', overriding the Accept header.
 
         Returns:
         - 200: A JSON object containing the weather forecast for the specified favorite location.
@@ -483,15 +885,19 @@ def create_app(config_class=TestConfig):
         - 401: Unauthorized access due to invalid credentials.
         - 404: Favorite location not found for the specified user.
         - 500: Internal server error or issue fetching forecast data.
+        - 503: The weather service is temporarily unavailable.
+        - 504: The forecast could not be fetched within the request deadline.
         """
         
         username = request.args.get('username')
         password = request.args.get('password')
         days = request.args.get('days', default=7, type=int)
+        layout = request.args.get('layout', default='records')
 
-        if not username or not password:
+        if not bearer_token() and (not username or not password):
             logger.error("Missing 'username' or 'password' query parameters.")
             raise BadRequest("Missing 'username' or 'password' query parameters.")
+        mimetype = response_format()
 
         # Authenticate user
         try:
@@ -517,16 +923,25 @@ def create_app(config_class=TestConfig):
             forecast = weather_api.get_forecast(
                 forecast_latitude,
                 forecast_longitude,
-                days
+                days,
+                client=openmeteo,
+                layout=layout
             )
             logger.info(f"Retrieved forecast for favorite location '{forecast_location}'.")
-            return jsonify({
+            return encode_response({
                 "favorite_location": [forcast_id, forecast_location, forecast_latitude, forecast_longitude],
-                "weather_forecast": forecast['daily_forecast']
-            }), 200
+                "weather_forecast": forecast['daily_forecast'],
+                "cache": forecast['cache']
+            }, mimetype, headers={"Age": str(forecast['cache']['age_seconds'])})
         except ValueError as ve:
             logger.error(f"Forecast request error: {ve}")
             return jsonify({"error": str(ve)}), 400
+        except CircuitOpenError as ce:
+            logger.error(f"Forecast unavailable for '{forecast_location}': {ce}")
+            return circuit_open_response(ce)
+        except DeadlineExceeded as de:
+            logger.error(f"Forecast for '{forecast_location}' timed out: {de}")
+            return deadline_exceeded_response(de)
         except Exception as e:
             logger.error(f"Error fetching forecast for '{forecast_location}': {e}")
             return jsonify({"error": "Could not fetch weather forecast data."}), 500
@@ -550,6 +965,26 @@ def create_app(config_class=TestConfig):
         response = make_response(jsonify({"status": "healthy"}), 200)
         app.logger.debug(f"Health Check Response: {response.get_data(as_text=True)}") 
         return response  
+
+    @app.route('/api/health/cache-warmer', methods=['GET'])
+    def cache_warmer_status() -> Response:
+        """
+        Route to report the progress and lag of the background cache warmer.
+
+        Returns:
+            JSON response with the cache warmer statistics.
+        """
+        return jsonify({"cache_warmer": cache_warmer.stats()}), 200
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics() -> Response:
+        """
+        Route to expose the metrics of this process in the Prometheus text format.
+
+        Returns:
+            Text response with request, upstream, HTTP cache and database metrics.
+        """
+        return Response(REGISTRY.render(), status=200, content_type=METRICS_CONTENT_TYPE)
     
     return app
 
@@ -0,0 +1,78 @@
+"""
+Login throughput benchmark for the password hashing settings.
+
+Measures how many password checks per second one worker process sustains at each cost,
+with concurrent request threads hashing through the process pool, to size workers and
+pick PASSWORD_KDF_COST.
+
+Usage (from the repository root):
+    python -m benchmarks.password_hashing --algorithm pbkdf2_sha256 --costs 100000 300000 600000 --workers 2 --threads 8
+    python -m benchmarks.password_hashing --algorithm scrypt --costs 14 15 16
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from password_hashing import configure_password_hashing, hash_password, verify_password
+
+
+def run(algorithm: str, cost: int, workers: int, threads: int, duration: float) -> dict:
+    """
+    Runs password checks from `threads` threads for `duration` seconds.
+
+    Returns:
+        dict: Checks per second and latency percentiles in milliseconds.
+    """
+    configure_password_hashing(algorithm=algorithm, cost=cost, pool_size=workers)
+    encoded = hash_password("correct horse battery staple")  # Also starts the pool
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def login():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            verify_password("correct horse battery staple", encoded)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=login) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "logins_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if len(latencies) >= 20 else latencies[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--algorithm', default='pbkdf2_sha256', choices=['pbkdf2_sha256', 'scrypt'])
+    parser.add_argument('--costs', type=int, nargs='+', default=[100000, 300000, 600000],
+                        help="PBKDF2 iterations, or log2(N) for scrypt")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Hashing processes (0 hashes on the request threads)")
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent request threads")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds per cost setting")
+    args = parser.parse_args()
+
+    print(f"{args.algorithm}, {args.workers} hashing processes, {args.threads} request threads")
+    print(f"{'cost':>10} {'logins/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for cost in args.costs:
+        result = run(args.algorithm, cost, args.workers, args.threads, args.duration)
+        print(f"{cost:>10} {result['logins_per_second']:>10.1f} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f}")
+    configure_password_hashing(pool_size=0)
+
+
+if __name__ == '__main__':
+    main()
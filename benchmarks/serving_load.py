@@ -0,0 +1,151 @@
+"""
+HTTP load test of the serving setups.
+
+Starts the app with ProductionConfig on a temporary database, once on the Werkzeug
+development server with the debugger (the previous `python app.py` setup) and once under
+gunicorn with the production settings (gunicorn.conf.py). Concurrent clients then request
+a page of favorites with a session token for a fixed time, and requests per second and
+latency percentiles are reported for each setup.
+
+Usage (from the repository root):
+    python -m benchmarks.serving_load --clients 32 --duration 10 --workers 4 --threads 4
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+
+def start_server(setup: str, port: int, directory: str, workers: int, threads: int) -> subprocess.Popen:
+    """
+    Starts the app on `port` with its database, caches and historical store in `directory`.
+    """
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        DATABASE_URL=f"sqlite:///{os.path.join(directory, 'app.db')}",
+        OPENMETEO_CACHE_NAME=os.path.join(directory, 'openmeteo_cache'),
+        HISTORICAL_STORE_DIR=os.path.join(directory, 'historical_store'),
+        AUTH_TOKEN_SECRET='load-test-secret',
+        WEB_WORKERS=str(workers),
+        WEB_THREADS=str(threads),
+        LOG_LEVEL='warning',
+        WEB_ACCESS_LOG='',
+    )
+    if setup == 'dev':
+        command = [sys.executable, '-c',
+                   f"from wsgi import app; app.run(debug=True, host='127.0.0.1', port={port}, use_reloader=False)"]
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_healthy(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+def seed(base_url: str, database_path: str, favorites: int) -> str:
+    """
+    Creates a user with `favorites` favorite locations and returns a session token for it.
+    """
+    credentials = {"username": "loadtest", "password": "password123"}
+    requests.post(f"{base_url}/create-account", json=credentials).raise_for_status()
+    token = requests.post(f"{base_url}/login", json=credentials).json()["token"]
+    # Written straight to the database, as adding favorites through the API would call the geocoder
+    with sqlite3.connect(database_path) as conn:
+        user_id = conn.execute("SELECT id FROM users WHERE username = 'loadtest'").fetchone()[0]
+        conn.executemany("INSERT INTO locations (id, name, latitude, longitude) VALUES (?, ?, ?, ?)",
+                         [(i + 1, f"City {i}", float(i % 90), float(i % 180)) for i in range(favorites)])
+        conn.executemany("INSERT INTO favorite_locations (user_id, location_id) VALUES (?, ?)",
+                         [(user_id, i + 1) for i in range(favorites)])
+    return token
+
+
+def run(base_url: str, token: str, clients: int, duration: float) -> dict:
+    """
+    Requests a page of favorites from `clients` threads for `duration` seconds.
+
+    Returns:
+        dict: Requests per second, latency percentiles in milliseconds and the number of failed requests.
+    """
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = session.get(f"{base_url}/api/favorites", params={"limit": 50}, timeout=10).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if ok else failures).append(elapsed)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float('nan'),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if len(latencies) >= 100 else float('nan'),
+        "failures": len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--setups', nargs='+', default=['dev', 'gunicorn'], choices=['dev', 'gunicorn'])
+    parser.add_argument('--clients', type=int, default=32, help="Concurrent client threads")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per setup")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Gunicorn worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="Gunicorn threads per worker")
+    parser.add_argument('--favorites', type=int, default=200, help="Favorites of the load test user")
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.duration:.0f}s per setup, gunicorn with "
+          f"{args.workers} workers x {args.threads} threads")
+    print(f"{'setup':>10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'failures':>10}")
+    for setup in args.setups:
+        with tempfile.TemporaryDirectory() as directory:
+            base_url = f"http://127.0.0.1:{args.port}"
+            server = start_server(setup, args.port, directory, args.workers, args.threads)
+            try:
+                wait_until_healthy(base_url)
+                token = seed(base_url, os.path.join(directory, 'app.db'), args.favorites)
+                result = run(base_url, token, args.clients, args.duration)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+        print(f"{setup:>10} {result['requests_per_second']:>10.1f} {result['p50_ms']:>10.2f} "
+              f"{result['p99_ms']:>10.2f} {result['failures']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Mixed read/write throughput benchmark for the SQLite storage profile.
+
+Runs concurrent threads against a temporary SQLite file through the app's models: a share
+of the operations add a favorite location (one write transaction each), the others read a
+page of favorites. Compares the default engine (rollback journal, no busy timeout) with the
+production profile (ProductionConfig.SQLITE_PRAGMAS and SQLALCHEMY_ENGINE_OPTIONS), and
+reports operations per second, latency percentiles and "database is locked" failures.
+
+Usage (from the repository root):
+    python -m benchmarks.sqlite_storage --threads 16 --write-ratio 0.2 --duration 5
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from app import create_app
+from config import ProductionConfig, TestConfig
+from db import db
+from models.favourite_location import FavoriteLocation
+from models.user_model import Users
+
+
+def make_config(database_path: str, production_profile: bool):
+    """
+    Returns a test configuration that stores the database in a file, with or without the production profile.
+    """
+    class BenchmarkConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{database_path}"
+        SQLITE_PRAGMAS = ProductionConfig.SQLITE_PRAGMAS if production_profile else {}
+        SQLALCHEMY_ENGINE_OPTIONS = ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS if production_profile else {}
+
+    return BenchmarkConfig
+
+
+def run(production_profile: bool, threads: int, write_ratio: float, duration: float, seed_rows: int) -> dict:
+    """
+    Runs the mixed workload from `threads` threads for `duration` seconds on a fresh database.
+
+    Returns:
+        dict: Operations per second, latency percentiles in milliseconds and the number of failed operations.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(make_config(os.path.join(directory, 'benchmark.db'), production_profile))
+        with app.app_context():
+            user_id = Users.create_user("benchmark", "password123").id
+            FavoriteLocation.create_favorites(user_id, [(f"Seed {i}", float(i % 90), 0.0) for i in range(seed_rows)])
+
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+        counter = iter(range(10 ** 9))
+        deadline = time.perf_counter() + duration
+
+        def worker(index: int):
+            writes_every = round(1 / write_ratio) if write_ratio else 0
+            operations = 0
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    operations += 1
+                    start = time.perf_counter()
+                    try:
+                        if writes_every and (operations + index) % writes_every == 0:
+                            FavoriteLocation.create_favorite(user_id, f"City {next(counter)}", 10.0, float(index))
+                        else:
+                            FavoriteLocation.get_favorites_page(user_id, limit=50)
+                    except Exception as e:
+                        db.session.rollback()
+                        with lock:
+                            failures.append(e)
+                        continue
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                db.session.remove()
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            db.engine.dispose()
+
+    latencies.sort()
+    return {
+        "ops_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float('nan'),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if len(latencies) >= 100 else float('nan'),
+        "failures": len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help="Concurrent request threads")
+    parser.add_argument('--write-ratio', type=float, default=0.2, help="Share of operations that write")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds per profile")
+    parser.add_argument('--seed-rows', type=int, default=1000, help="Favorites stored before the run")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)  # Failed writes are counted, not logged
+
+    print(f"{args.threads} threads, {args.write_ratio:.0%} writes, {args.duration:.0f}s per profile")
+    print(f"{'profile':>12} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'failures':>10}")
+    for name, production_profile in (("default", False), ("production", True)):
+        result = run(production_profile, args.threads, args.write_ratio, args.duration, args.seed_rows)
+        print(f"{name:>12} {result['ops_per_second']:>10.1f} {result['p50_ms']:>10.2f} "
+              f"{result['p99_ms']:>10.2f} {result['failures']:>10}")
+
+
+if __name__ == '__main__':
+    main()
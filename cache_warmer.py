@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+
+from flask import Flask
+
+import weather_api
+from db import db
+from models.favourite_location import FavoriteLocation
+from models.location import Location
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    """
+    Background scheduler that keeps the weather cache warm for every stored favorite.
+
+    Each cycle walks the distinct favorite coordinates and refreshes their current weather
+    shortly before it expires, spreading the batches evenly over the cycle instead of
+    refreshing everything at once. Forecasts are refreshed on the cycles where they would
+    otherwise expire before the next one.
+    """
+
+    def __init__(self, app: Flask, client=None, lead_time: int = 60, batch_size: int = 50, forecast_days: int = 7):
+        """
+        Args:
+            app (Flask): The application, used for database access and the cache settings.
+            client (openmeteo_requests.Client, optional): The Open-Meteo client to use (default: the shared client).
+            lead_time (int): Number of seconds before expiry at which an entry is refreshed.
+            batch_size (int): Maximum number of locations refreshed by one batched upstream request.
+            forecast_days (int): Number of forecast days to keep warm.
+        """
+        self.app = app
+        self.client = client
+        self.lead_time = lead_time
+        self.batch_size = batch_size
+        self.forecast_days = forecast_days
+        ttls = weather_api.get_weather_cache().ttls
+        self.period = max(ttls['current'] - lead_time, 1)
+        self.forecast_period = max(ttls['forecast'] - lead_time, 1)
+        self._forecast_warmed_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "cycles": 0,
+            "locations": 0,
+            "batches": 0,
+            "batches_done": 0,
+            "refreshed": 0,
+            "failed": 0,
+            "lag_seconds": 0.0,
+            "last_cycle_seconds": None,
+        }
+
+    def distinct_locations(self) -> list:
+        """
+        Retrieve the coordinates of every place favorited by at least one user.
+
+        Returns:
+            list: A list of (latitude, longitude) tuples.
+        """
+        with self.app.app_context():
+            favorited = db.session.query(FavoriteLocation.id).filter(FavoriteLocation.location_id == Location.id)
+            rows = db.session.query(Location.latitude, Location.longitude).filter(favorited.exists()).all()
+        return [(row.latitude, row.longitude) for row in rows]
+
+    def run_cycle(self) -> None:
+        """
+        Refresh every favorite location once, spreading the batches over the refresh period.
+        """
+        cycle_start = time.monotonic()
+        coords = self.distinct_locations()
+        cells = list(dict.fromkeys(weather_api.get_weather_cache().cell(lat, lon) for lat, lon in coords))
+        batches = [cells[start:start + self.batch_size] for start in range(0, len(cells), self.batch_size)]
+
+        kinds = ('current',)
+        if self._forecast_warmed_at is None or cycle_start + self.period >= self._forecast_warmed_at + self.forecast_period:
+            kinds = ('current', 'forecast')
+            self._forecast_warmed_at = cycle_start
+
+        with self._lock:
+            self._stats.update(locations=len(cells), batches=len(batches), batches_done=0)
+        logger.info(f"Cache warming cycle started for {len(cells)} locations in {len(batches)} batches ({', '.join(kinds)})")
+
+        spacing = self.period / max(len(batches), 1)
+        for index, batch in enumerate(batches):
+            due = cycle_start + index * spacing
+            if self._stop.wait(max(due - time.monotonic(), 0)):
+                return
+            lag = max(time.monotonic() - due, 0.0)
+            result = weather_api.warm_cache(batch, kinds=kinds, days=self.forecast_days,
+                                            client=self.client, chunk_size=self.batch_size)
+            with self._lock:
+                self._stats["batches_done"] += 1
+                self._stats["refreshed"] += result["refreshed"]
+                self._stats["failed"] += result["failed"]
+                self._stats["lag_seconds"] = lag
+
+        with self._lock:
+            self._stats["cycles"] += 1
+            self._stats["last_cycle_seconds"] = time.monotonic() - cycle_start
+        logger.info(f"Cache warming cycle finished in {time.monotonic() - cycle_start:.1f}s")
+
+    def run_forever(self) -> None:
+        """
+        Run warming cycles, one per refresh period, until stop() is called.
+        """
+        while not self._stop.is_set():
+            cycle_start = time.monotonic()
+            try:
+                self.run_cycle()
+            except Exception as e:
+                logger.error(f"Cache warming cycle failed: {e}")
+            self._stop.wait(max(cycle_start + self.period - time.monotonic(), 0))
+
+    def start(self) -> None:
+        """
+        Start warming in a background daemon thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name='cache-warmer', daemon=True)
+        self._thread.start()
+        logger.info(f"Cache warmer started (refresh period {self.period}s)")
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stop the background thread after its current batch.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait for the thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        logger.info("Cache warmer stopped")
+
+    def stats(self) -> dict:
+        """
+        Returns the warming progress and lag.
+
+        Returns:
+            dict: Cycle counters, the progress of the current cycle (0 to 1) and how late the last batch started.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        stats["progress"] = stats["batches_done"] / stats["batches"] if stats["batches"] else 1.0
+        return stats
+
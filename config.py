@@ -6,10 +6,151 @@ class ProductionConfig():
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # This would almost universally be false in a Flask app
                                            # But we are doing unnecessarily complicated Redis
                                            # write-throughs
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', "DATABASE_URL=sqlite:////app/db/app.db")  # Production database URI from environment
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', "sqlite:////app/db/app.db")  # Production database URI from environment
+    # SQLite storage profile: WAL lets readers run alongside the single writer, and writers
+    # wait for the lock for busy_timeout ms instead of failing with "database is locked"
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",  # Durable in WAL mode except for the last commits on power loss
+        "busy_timeout": 5000,
+        "mmap_size": 268435456,  # 256 MiB of the database file read through memory mapping
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.getenv('DB_POOL_SIZE', 10)),  # At least the request threads per worker
+        "max_overflow": 5,
+        "pool_timeout": 10,
+    }
+
+    # Shared Open-Meteo client (one per worker process)
+    OPENMETEO_CACHE_NAME = os.getenv('OPENMETEO_CACHE_NAME', '.cache')
+    OPENMETEO_CACHE_BACKEND = 'sqlite'
+    OPENMETEO_CACHE_EXPIRE = 900  # Seconds, no longer than the shortest WEATHER_CACHE_TTLS entry
+    OPENMETEO_POOL_SIZE = int(os.getenv('OPENMETEO_POOL_SIZE', 10))  # Keep-alive connections per upstream host
+    OPENMETEO_RETRIES = 5
+    OPENMETEO_BACKOFF_FACTOR = 0.2
+    OPENMETEO_BATCH_SIZE = 50  # Locations per multi-location request
+    OPENMETEO_TIMEOUT = (3.05, 10)  # Connect and read timeouts in seconds
+    OPENWEATHER_POOL_SIZE = 4
+    OPENWEATHER_TIMEOUT = (3.05, 10)
+
+    # Upstream circuit breakers (per host) and retry budgets
+    CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failures that open a circuit
+    CIRCUIT_RECOVERY_TIMEOUT = 30  # Seconds before a trial call is let through
+    RETRY_BUDGET_RATIO = 0.1  # Retries allowed per upstream call
+    RETRY_BUDGET_MIN_RETRIES = 10  # Retries always allowed per window
+    RETRY_BUDGET_WINDOW = 10  # Seconds
+
+    # Time budget per request in seconds, with per-endpoint overrides
+    REQUEST_DEADLINE = 10
+    REQUEST_DEADLINES = {
+        "get_historical_weather_for_favorite": 30,
+        "import_favorite_locations": 30,
+    }
+
+    # Responses of at least this many bytes are gzip/deflate compressed when the client accepts it
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_LEVEL = 6  # 1 (fastest) to 9 (smallest)
+
+    # Per-request SQL query stats: a warning is logged above QUERY_COUNT_WARNING queries,
+    # and X-Query-Count/X-Query-Time-Ms response headers are added when QUERY_STATS_HEADER is set
+    QUERY_COUNT_WARNING = 20
+    QUERY_STATS_HEADER = os.getenv('QUERY_STATS_HEADER', 'false').lower() == 'true'
+    FAN_OUT_MAX_WORKERS = int(os.getenv('FAN_OUT_MAX_WORKERS', 8))  # Concurrent upstream calls per worker
+    FAN_OUT_MAX_PER_HOST = int(os.getenv('FAN_OUT_MAX_PER_HOST', 4))  # Concurrent calls per upstream host
+    FAVORITES_IMPORT_MAX_ITEMS = 500  # Locations per bulk favorites import
+    FAVORITES_PAGE_SIZE = 100  # Favorites per page of a listing by default
+    FAVORITES_MAX_PAGE_SIZE = 500
+
+    # In-process weather cache shared by all users
+    WEATHER_CACHE_MAX_ENTRIES = 10000
+    WEATHER_CACHE_RESOLUTION = 0.1  # Grid cell size in degrees (roughly the model resolution)
+    WEATHER_CACHE_TTLS = {"current": 900, "forecast": 3600}  # Seconds
+    SINGLE_FLIGHT_TIMEOUT = 30  # Seconds a request waits on an identical upstream call in flight
+    WEATHER_CACHE_STALE_GRACE = {"current": 600, "forecast": 1800}  # Seconds expired data is served while refreshing
+
+    # Background cache warming for all stored favorites
+    CACHE_WARMER_ENABLED = os.getenv('CACHE_WARMER_ENABLED', 'false').lower() == 'true'
+    CACHE_WARMER_LEAD_TIME = 60  # Seconds before expiry at which entries are refreshed
+
+    # Geocoding cache (in memory, backed by the geocode_cache table)
+    GEOCODE_CACHE_MAX_ENTRIES = 10000
+    GEOCODE_CACHE_TTL = 30 * 24 * 3600  # Seconds a found location stays cached
+    GEOCODE_NEGATIVE_TTL = 300  # Seconds a "not found" stays cached
+
+    # Signed session tokens issued by /login
+    AUTH_TOKEN_SECRET = os.getenv('AUTH_TOKEN_SECRET')  # Must be shared by all workers
+    AUTH_TOKEN_TTL = 3600  # Seconds
+
+    # Password hashing; existing hashes are rehashed on login when these change
+    PASSWORD_KDF = os.getenv('PASSWORD_KDF', 'pbkdf2_sha256')  # 'pbkdf2_sha256' or 'scrypt'
+    PASSWORD_KDF_COST = int(os.getenv('PASSWORD_KDF_COST', 600000))  # PBKDF2 iterations, or log2(N) for scrypt
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # Processes; 0 hashes on request threads
+
+    # Local store of settled historical days, one file per grid cell
+    HISTORICAL_STORE_DIR = os.getenv('HISTORICAL_STORE_DIR', 'db/historical_store')  # Inside the db volume
+    HISTORICAL_SETTLE_DAYS = 2  # Most recent days that are always fetched
+    HISTORICAL_CHUNK_DAYS = 365  # Days per upstream request; chunks are fetched concurrently
+    HISTORICAL_CHUNK_RETRIES = 1  # Retries of a failed chunk on its own
 
 class TestConfig():
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory database for tests
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory database for tests
+    SQLITE_PRAGMAS = {}  # WAL does not apply to in-memory databases
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    OPENMETEO_CACHE_NAME = 'test_cache'
+    OPENMETEO_CACHE_BACKEND = 'memory'  # Don't write a cache file during tests
+    OPENMETEO_CACHE_EXPIRE = 900
+    OPENMETEO_POOL_SIZE = 2
+    OPENMETEO_RETRIES = 0
+    OPENMETEO_BACKOFF_FACTOR = 0
+    OPENMETEO_BATCH_SIZE = 50
+    OPENMETEO_TIMEOUT = (1, 2)
+    OPENWEATHER_POOL_SIZE = 2
+    OPENWEATHER_TIMEOUT = (1, 2)
+
+    CIRCUIT_FAILURE_THRESHOLD = 5
+    CIRCUIT_RECOVERY_TIMEOUT = 30
+    RETRY_BUDGET_RATIO = 0.1
+    RETRY_BUDGET_MIN_RETRIES = 10
+    RETRY_BUDGET_WINDOW = 10
+
+    REQUEST_DEADLINE = 5
+    REQUEST_DEADLINES = {}
+
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_LEVEL = 6
+    QUERY_COUNT_WARNING = 20
+    QUERY_STATS_HEADER = True
+    FAN_OUT_MAX_WORKERS = 4
+    FAN_OUT_MAX_PER_HOST = 2
+    FAVORITES_IMPORT_MAX_ITEMS = 20
+    FAVORITES_PAGE_SIZE = 100
+    FAVORITES_MAX_PAGE_SIZE = 500
+
+    WEATHER_CACHE_MAX_ENTRIES = 100
+    WEATHER_CACHE_RESOLUTION = 0.1
+    WEATHER_CACHE_TTLS = {"current": 900, "forecast": 3600}
+    SINGLE_FLIGHT_TIMEOUT = 5
+    WEATHER_CACHE_STALE_GRACE = {"current": 600, "forecast": 1800}
+
+    CACHE_WARMER_ENABLED = False
+    CACHE_WARMER_LEAD_TIME = 60
+
+    GEOCODE_CACHE_MAX_ENTRIES = 100
+    GEOCODE_CACHE_TTL = 30 * 24 * 3600
+    GEOCODE_NEGATIVE_TTL = 300
+
+    AUTH_TOKEN_SECRET = 'test-secret'
+    AUTH_TOKEN_TTL = 3600
+
+    PASSWORD_KDF = 'pbkdf2_sha256'
+    PASSWORD_KDF_COST = 1000
+    PASSWORD_HASH_WORKERS = 0
+
+    HISTORICAL_STORE_DIR = None  # In memory only
+    HISTORICAL_SETTLE_DAYS = 2
+    HISTORICAL_CHUNK_DAYS = 365
+    HISTORICAL_CHUNK_RETRIES = 1
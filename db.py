@@ -1,3 +1,37 @@
+import logging
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
 # Initialize the SQLAlchemy extension
 db = SQLAlchemy()
+
+
+def configure_sqlite_pragmas(engine: Engine, pragmas: dict) -> None:
+    """
+    Applies PRAGMA settings to every new connection of a SQLite engine.
+
+    Most pragmas (synchronous, busy_timeout, mmap_size) only last for the connection, so they
+    are set from a connect event hook rather than once. Engines of other databases are left
+    as they are.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine.
+        pragmas (dict): Pragma names and values, e.g. {"journal_mode": "WAL", "busy_timeout": 5000}.
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    logger.info(f"Configured SQLite pragmas: {', '.join(f'{name}={value}' for name, value in pragmas.items())}")
@@ -0,0 +1,37 @@
+# Gunicorn settings for serving wsgi:app in production, tunable through environment variables
+import multiprocessing
+import os
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('WEB_THREADS', 4))  # Request threads per worker, at most DB_POOL_SIZE
+worker_class = 'gthread'
+
+# Import the app and run db.create_all once in the master, then fork the workers from it
+preload_app = True
+
+# Historical requests may run up to their 30s deadline; a graceful stop (SIGTERM) lets
+# in-flight requests finish for up to graceful_timeout seconds
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-') or None  # Empty to disable
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    import wsgi
+    wsgi.prepare_fork(wsgi.app)
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker(wsgi.app)
+
+
+def worker_exit(server, worker):
+    import wsgi
+    wsgi.shutdown_worker(wsgi.app)
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+_LOAD = object()  # Marks a cell that missing_ranges() and read() load themselves
+
+
+class HistoricalStore:
+    """
+    Local store of daily historical weather, one compact file per grid cell.
+
+    Past days never change, so once a day is stored it is never fetched again. Each cell
+    keeps a sorted array of dates and one float32 array per daily variable (NaN for a
+    missing value), saved as a compressed .npz file and replaced atomically on every
+    merge. Only settled days, at least `settle_days` before today (UTC), are stored;
+    more recent days may still be revised upstream. Without a directory the store is
+    kept in memory only.
+    """
+
+    def __init__(self, directory: str = None, variables: list = (), settle_days: int = 2):
+        """
+        Args:
+            directory (str, optional): Directory holding one file per cell (default: in memory only).
+            variables (list): Names of the daily variables stored per day.
+            settle_days (int): Number of most recent days, including today, that are never stored.
+        """
+        self.directory = directory
+        self.variables = list(variables)
+        self.settle_days = settle_days
+        self._memory = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def settled_until(self) -> date:
+        """
+        Returns the most recent day that is stored once fetched.
+        """
+        return datetime.now(timezone.utc).date() - timedelta(days=self.settle_days)
+
+    def load(self, cell: tuple):
+        """
+        Loads everything stored for a cell, to pass to missing_ranges() and read() so that the
+        cell's file is decompressed once.
+
+        Args:
+            cell (tuple): The grid cell (latitude, longitude).
+
+        Returns:
+            tuple: The arrays of the stored days (see merge()) and the cell's location details,
+                or None if nothing is stored for the cell.
+        """
+        return self._load(cell)
+
+    def missing_ranges(self, cell: tuple, start: date, end: date, stored=_LOAD) -> list:
+        """
+        Finds the days between `start` and `end` that are not stored yet.
+
+        Args:
+            cell (tuple): The grid cell (latitude, longitude).
+            start (date): The first day of the range.
+            end (date): The last day of the range, included.
+            stored (tuple, optional): The cell as returned by load() (default: loaded here).
+
+        Returns:
+            list: (start, end) date tuples of each contiguous run of missing days, in order.
+        """
+        if end < start:
+            return []
+        wanted = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        if stored is _LOAD:
+            stored = self._load(cell)
+        missing = wanted if stored is None else wanted[~np.isin(wanted, stored[0]["date"])]
+        if not len(missing):
+            return []
+        # Split where consecutive missing days are more than one day apart
+        breaks = np.flatnonzero(np.diff(missing).astype(int) > 1)
+        starts = np.concatenate(([0], breaks + 1))
+        ends = np.concatenate((breaks, [len(missing) - 1]))
+        return [(missing[first].astype(date), missing[last].astype(date)) for first, last in zip(starts, ends)]
+
+    def merge(self, cell: tuple, arrays: dict, meta: dict) -> int:
+        """
+        Adds fetched days to a cell. Days after settled_until() are left out.
+
+        Args:
+            cell (tuple): The grid cell (latitude, longitude).
+            arrays (dict): A datetime64[D] array under 'date' and one array per variable.
+            meta (dict): Location details returned with the data (coordinates, elevation, timezone).
+
+        Returns:
+            int: The number of days added.
+        """
+        settled = arrays["date"] <= np.datetime64(self.settled_until(), 'D')
+        if not settled.any():
+            return 0
+        with self._cell_lock(cell):
+            stored = self._load(cell)
+            if stored is None:
+                columns = {"date": arrays["date"][settled]}
+                columns.update((name, arrays[name][settled].astype(np.float32)) for name in self.variables)
+            else:
+                new = settled & ~np.isin(arrays["date"], stored[0]["date"])
+                if not new.any():
+                    return 0
+                dates = np.concatenate((stored[0]["date"], arrays["date"][new]))
+                order = np.argsort(dates, kind='stable')
+                columns = {"date": dates[order]}
+                for name in self.variables:
+                    values = np.concatenate((stored[0][name], arrays[name][new].astype(np.float32)))
+                    columns[name] = values[order]
+            added = len(columns["date"]) - (0 if stored is None else len(stored[0]["date"]))
+            self._save(cell, columns, meta)
+        logger.info(f"Stored {added} days of historical weather for {cell}")
+        return added
+
+    def read(self, cell: tuple, start: date, end: date, stored=_LOAD) -> tuple:
+        """
+        Reads the stored days of a cell between `start` and `end`.
+
+        Args:
+            cell (tuple): The grid cell (latitude, longitude).
+            start (date): The first day of the range.
+            end (date): The last day of the range, included.
+            stored (tuple, optional): The cell as returned by load() (default: loaded here).
+
+        Returns:
+            tuple: The arrays of the stored days in the range (see merge()), and the cell's
+                location details (None if nothing is stored for the cell).
+        """
+        if stored is _LOAD:
+            stored = self._load(cell)
+        if stored is None:
+            empty = {"date": np.array([], dtype='datetime64[D]')}
+            empty.update((name, np.array([], dtype=np.float32)) for name in self.variables)
+            return empty, None
+        columns, meta = stored
+        first = np.searchsorted(columns["date"], np.datetime64(start, 'D'), side='left')
+        last = np.searchsorted(columns["date"], np.datetime64(end, 'D'), side='right')
+        return {name: values[first:last] for name, values in columns.items()}, meta
+
+    def _cell_lock(self, cell: tuple) -> threading.Lock:
+        with self._registry_lock:
+            return self._locks.setdefault(cell, threading.Lock())
+
+    def _path(self, cell: tuple) -> str:
+        return os.path.join(self.directory, f"{cell[0]:.6f}_{cell[1]:.6f}.npz")
+
+    def _load(self, cell: tuple):
+        if not self.directory:
+            return self._memory.get(cell)
+        try:
+            with np.load(self._path(cell), allow_pickle=False) as data:
+                columns = {"date": data["date"]}
+                columns.update((name, data[name]) for name in self.variables)
+                return columns, json.loads(str(data["meta"]))
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable historical store file for {cell}: {e}")
+            return None
+
+    def _save(self, cell: tuple, columns: dict, meta: dict) -> None:
+        if not self.directory:
+            self._memory[cell] = (columns, meta)
+            return
+        path = self._path(cell)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            np.savez_compressed(file, meta=np.array(json.dumps(meta)), **columns)
+        os.replace(temp_path, path)
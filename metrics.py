@@ -0,0 +1,236 @@
+import bisect
+import math
+import threading
+
+
+# Upper bounds in seconds of the latency histogram buckets, +Inf is added implicitly
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class _Metric:
+    """
+    Base class of the in-process metrics: a name, a help text and one series per combination of label values.
+
+    Every metric has its own lock, held only for the dictionary update of one observation,
+    so recording from request threads and fan_out() workers is safe and cheap.
+    """
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        """
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple): The names of the labels every observation must be given.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self) -> None:
+        """
+        Drops every series of the metric.
+        """
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> list:
+        """
+        Renders the metric in the Prometheus text exposition format.
+
+        Returns:
+            list: The lines of the metric, HELP and TYPE included.
+        """
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(key, self._snapshot(value)) for key, value in series]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, value in series:
+            lines.extend(self._render_series(tuple(zip(self.labelnames, key)), value))
+        return lines
+
+    def _snapshot(self, value):
+        return value
+
+    def _render_series(self, labels: tuple, value) -> list:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count.
+    """
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Adds `amount` to the series of the given label values.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """
+        Returns the current count of the series of the given label values.
+        """
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, labels: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """
+    Counts observations into cumulative buckets and keeps their sum and count.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple): The names of the labels every observation must be given.
+            buckets (tuple): The increasing upper bounds of the buckets.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Records one observation in the series of the given label values.
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (not cumulative) counts, the +Inf bucket last, then the sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        """
+        Returns the number of observations of the series of the given label values.
+        """
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[:-1]) if series else 0
+
+    def _snapshot(self, value):
+        return list(value)
+
+    def _render_series(self, labels: tuple, value) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), value[:-1]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    The set of metrics exposed together.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Adds a metric to the registry.
+
+        Returns:
+            _Metric: The metric, for use as `METRIC = REGISTRY.register(Counter(...))`.
+
+        Raises:
+            ValueError: If a metric with the same name is already registered.
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def clear(self) -> None:
+        """
+        Drops every series of every registered metric.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        """
+        Renders every registered metric in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The exposition, one line per sample.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# The metrics of this process. Under gunicorn every worker has its own, scraped through the worker that answers.
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'Number of HTTP requests handled.', ('route', 'method', 'status')
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests, up to the response headers.',
+    ('route', 'method', 'status')
+))
+UPSTREAM_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'upstream_request_duration_seconds', 'Time spent in calls to upstream APIs, retries included.', ('host',)
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    'upstream_errors_total', 'Number of failed calls to upstream APIs.', ('host', 'error')
+))
+HTTP_CACHE_REQUESTS = REGISTRY.register(Counter(
+    'http_cache_requests_total', 'Number of upstream requests looked up in the requests_cache HTTP cache.',
+    ('host', 'result')
+))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'Time spent running SQL statements.',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+))
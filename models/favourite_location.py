@@ -4,18 +4,34 @@ from typing import Any, List, Optional
 from datetime import datetime, date
 
 from sqlalchemy import event
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.associationproxy import association_proxy
+
+from models.location import Location
 
 logger = logging.getLogger(__name__)
 
+# Columns a favorites listing can be projected to; the id is always loaded for the page cursor
+FAVORITE_FIELDS = ("id", "location_name", "latitude", "longitude")
+
 class FavoriteLocation(db.Model):
     __tablename__ = 'favorite_locations'
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    location_name = db.Column(db.String(100), nullable=False)
-    latitude = db.Column(db.Float, nullable=False)
-    longitude = db.Column(db.Float, nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    # The place is shared by every user who favorites it, and loaded with the favorite
+    location = db.relationship(Location, lazy='joined', innerjoin=True)
+    location_name = association_proxy('location', 'name')
+    latitude = association_proxy('location', 'latitude')
+    longitude = association_proxy('location', 'longitude')
+
+    __table_args__ = (
+        db.Index('ix_favorite_locations_user_id', 'user_id'),
+        db.Index('ix_favorite_locations_location_id', 'location_id'),
+        # Also what makes a duplicate favorite fail on insert, see create_favorite()
+        db.Index('uq_favorite_locations_user_location', 'user_id', 'location_id', unique=True),
+    )
     
     def __post_init__(self):
         if not self.location_name:
@@ -26,7 +42,7 @@ class FavoriteLocation(db.Model):
     @classmethod
     def create_favorite(cls, user_id: int, location_name: str, latitude: float, longitude: float) -> 'FavoriteLocation':
         """
-        Create a new favorite location for a user.
+        Create a new favorite location for a user, adding the place to the shared locations if it is new.
 
         Args:
             user_id (int): The ID of the user.
@@ -39,7 +55,6 @@ class FavoriteLocation(db.Model):
 
         Raises:
             ValueError: If the favorite location already exists or coordinates cannot be fetched.
-            IntegrityError: If there's a database constraint violation.
         """
         if location_name == None or location_name == "":
             logger.warning(f"Invalid city name.")
@@ -47,33 +62,101 @@ class FavoriteLocation(db.Model):
         
         logger.info(f"Attempting to add favorite location '{location_name}' for user ID '{user_id}'.")
 
-        # Check if the favorite location already exists for the user
-        existing_fav = cls.query.filter_by(user_id=user_id, location_name=location_name, latitude=latitude, longitude=longitude).first()
-        if existing_fav:
-            logger.warning(f"Favorite location '{location_name}' already exists for user ID '{user_id}'.")
-            raise ValueError(f"Favorite location '{location_name}' already exists.")
+        try:
+            location = Location.get_or_create_many([(location_name, latitude, longitude)])[0]
+        except IntegrityError:
+            # Another request added the same place first, so it is found now
+            location = Location.get_or_create_many([(location_name, latitude, longitude)])[0]
 
-        # Create and add the new favorite location
-        new_fav = cls(
-            user_id=user_id,
-            location_name=location_name,
-            latitude=latitude,
-            longitude=longitude
-        )
+        # Create and add the new favorite location; the unique index rejects a duplicate
+        new_fav = cls(user_id=user_id, location=location)
         try:
             db.session.add(new_fav)
             db.session.commit()
             logger.info(f"Favorite location '{location_name}' added successfully for user ID '{user_id}'.")
             return new_fav
-        except IntegrityError as ie:
+        except IntegrityError:
             db.session.rollback()
-            logger.error(f"Database IntegrityError while adding favorite location '{location_name}': {ie}")
-            raise ValueError(f"Favorite location '{location_name}' could not be added due to a database error.")
+            logger.warning(f"Favorite location '{location_name}' already exists for user ID '{user_id}'.")
+            raise ValueError(f"Favorite location '{location_name}' already exists.")
         except Exception as e:
             db.session.rollback()
             logger.error(f"Unexpected error while adding favorite location '{location_name}': {e}")
             raise ValueError("An unexpected error occurred while adding the favorite location.")
 
+    @classmethod
+    def create_favorites(cls, user_id: int, locations: list) -> list:
+        """
+        Create many favorite locations for a user in a single transaction.
+
+        The places are resolved to shared locations in one lookup, and the user's existing
+        favorites are read once to skip duplicates, including duplicates within `locations`,
+        so that one conflict does not abort the whole insert.
+
+        Args:
+            user_id (int): The ID of the user.
+            locations (list): (location_name, latitude, longitude) tuples.
+
+        Returns:
+            list: For each entry of `locations`, in order, the new FavoriteLocation instance,
+                or None if the user already has that favorite.
+
+        Raises:
+            ValueError: If another request added one of the places or favorites concurrently;
+                none of them are then added.
+            Exception: Any other database error, after the session is rolled back.
+        """
+        try:
+            places = Location.get_or_create_many(locations)
+        except IntegrityError:
+            raise ValueError("Some of the favorite locations were added concurrently; none were added.")
+        except Exception:
+            db.session.rollback()
+            raise
+        existing = {location_id for location_id, in db.session.query(cls.location_id).filter_by(user_id=user_id)}
+        results = []
+        new_favs = []
+        for location in places:
+            if location.id in existing:
+                results.append(None)
+                continue
+            existing.add(location.id)
+            new_fav = cls(user_id=user_id, location=location)
+            new_favs.append(new_fav)
+            results.append(new_fav)
+
+        if not new_favs:
+            db.session.commit()  # Keeps any new locations
+            return results
+        try:
+            db.session.add_all(new_favs)
+            db.session.commit()
+            logger.info(f"Added {len(new_favs)} favorite locations for user ID '{user_id}'.")
+            return results
+        except IntegrityError as ie:
+            # Another request added one of the favorites since they were read
+            db.session.rollback()
+            logger.error(f"Database IntegrityError while adding favorite locations for user ID '{user_id}': {ie}")
+            raise ValueError("Some of the favorite locations were added concurrently; none were added.")
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @classmethod
+    def create_missing_indexes(cls) -> None:
+        """
+        Create the indexes of the favorite_locations table on a database whose table predates them.
+
+        db.create_all() only creates indexes together with a new table. A unique index that
+        cannot be built because the table already holds duplicate favorites is skipped with
+        an error; creation then falls back to reporting a database error for duplicates.
+        """
+        for index in cls.__table__.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except (IntegrityError, OperationalError) as e:
+                logger.error(f"Could not create index '{index.name}' on '{cls.__tablename__}': {e}")
+
     @classmethod
     def get_all_favorites(cls, user_id: int) -> List['FavoriteLocation']:
         """
@@ -83,14 +166,50 @@ class FavoriteLocation(db.Model):
             user_id (int): The ID of the user.
 
         Returns:
-            List[FavoriteLocation]: A list of the user's favorite locations.
+            List[FavoriteLocation]: A list of the user's favorite locations, in the order they were added.
         """
         logger.info(f"Retrieving all favorite locations for user ID '{user_id}'.")
-        favorites = cls.query.filter_by(user_id=user_id).all()
+        favorites = cls.query.filter_by(user_id=user_id).order_by(cls.id).all()
         logger.debug(f"Found {len(favorites)} favorite locations for user ID '{user_id}'.")
         return favorites
     
     
+    @classmethod
+    def get_favorites_page(cls, user_id: int, limit: int, after_id: Optional[int] = None,
+                           fields: tuple = FAVORITE_FIELDS) -> tuple:
+        """
+        Retrieve one page of a user's favorite locations, in the order they were added.
+
+        Pages are keyed on the favorite ID (keyset pagination), so each page is a range scan
+        of the user_id index however deep it is. Only the requested columns are loaded, and
+        the locations table is only joined for location columns.
+
+        Args:
+            user_id (int): The ID of the user.
+            limit (int): The maximum number of favorites on the page.
+            after_id (int, optional): The cursor returned with the previous page.
+            fields (tuple): The columns to load, from FAVORITE_FIELDS.
+
+        Returns:
+            tuple: The favorites on the page, as rows with the requested columns, the ID and the
+                location ID as attributes, and the cursor of the next page (None on the last page).
+        """
+        location_columns = {
+            "location_name": Location.name.label("location_name"),
+            "latitude": Location.latitude,
+            "longitude": Location.longitude,
+        }
+        columns = [cls.id, cls.location_id] + [location_columns[field] for field in fields if field in location_columns]
+        query = db.session.query(*columns).select_from(cls).filter(cls.user_id == user_id)
+        if len(columns) > 2:
+            query = query.join(Location, cls.location_id == Location.id)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        rows = query.order_by(cls.id).limit(limit + 1).all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        logger.debug(f"Found {min(len(rows), limit)} favorite locations after ID '{after_id}' for user ID '{user_id}'.")
+        return rows[:limit], next_cursor
+
     @classmethod 
     def get_current_weather(cls, favorite_id: int, user_id: int) -> tuple: 
         """
@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from db import db
+
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeCache(db.Model):
+    __tablename__ = 'geocode_cache'
+
+    normalized_query = db.Column(db.String(200), primary_key=True)  # See weather_api.normalize_location_query()
+    latitude = db.Column(db.Float, nullable=True)  # NULL for a cached "not found"
+    longitude = db.Column(db.Float, nullable=True)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)  # UTC
+
+    @property
+    def found(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+    @property
+    def expires_at_utc(self) -> datetime:
+        """
+        The expiry as an aware UTC datetime; SQLite hands DateTime columns back without a timezone.
+        """
+        if self.expires_at.tzinfo is None:
+            return self.expires_at.replace(tzinfo=timezone.utc)
+        return self.expires_at
+
+    @classmethod
+    def lookup(cls, query: str) -> Optional['GeocodeCache']:
+        """
+        Retrieve the cached geocoding result for a normalized query.
+
+        Args:
+            query (str): The normalized location query.
+
+        Returns:
+            GeocodeCache: The cached result, or None if it is missing or expired.
+        """
+        entry = db.session.get(cls, query)
+        if entry is None or entry.expires_at_utc <= datetime.now(timezone.utc):
+            return None
+        return entry
+
+    @classmethod
+    def store(cls, query: str, latitude: Optional[float], longitude: Optional[float], ttl: int) -> None:
+        """
+        Cache a geocoding result, replacing any previous entry for the query.
+
+        Args:
+            query (str): The normalized location query.
+            latitude (float, optional): The latitude, or None if the location was not found.
+            longitude (float, optional): The longitude, or None if the location was not found.
+            ttl (int): Number of seconds the result stays valid.
+        """
+        cls.store_many([(query, latitude, longitude, ttl)])
+
+    @classmethod
+    def store_many(cls, results: list) -> None:
+        """
+        Cache many geocoding results in one transaction, replacing any previous entries for their queries.
+
+        Args:
+            results (list): (query, latitude, longitude, ttl) tuples, see store().
+        """
+        if not results:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            for query, latitude, longitude, ttl in results:
+                db.session.merge(cls(
+                    normalized_query=query,
+                    latitude=latitude,
+                    longitude=longitude,
+                    expires_at=now + timedelta(seconds=ttl)
+                ))
+            db.session.commit()
+            logger.info("Cached %d geocoding results", len(results))
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Database error while caching geocoding results: %s", str(e))
+            raise
@@ -0,0 +1,95 @@
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+
+
+logger = logging.getLogger(__name__)
+
+# Decimal places coordinates are rounded to (about 11 m), so that geocoder noise maps to one place
+COORDINATE_PRECISION = 4
+
+
+def normalize_location_name(name: str) -> str:
+    """
+    Normalizes a place name so that trivially different spellings ("London", " london ") match.
+
+    Args:
+        name (str): The name as entered by the user.
+
+    Returns:
+        str: The name with surrounding and repeated whitespace removed, case-folded.
+    """
+    return " ".join(name.split()).casefold()
+
+
+def canonical_coordinates(latitude: float, longitude: float) -> tuple:
+    """
+    Rounds coordinates to the precision places are stored with.
+
+    Args:
+        latitude (float): The latitude.
+        longitude (float): The longitude.
+
+    Returns:
+        tuple: The canonical (latitude, longitude).
+    """
+    return round(float(latitude), COORDINATE_PRECISION), round(float(longitude), COORDINATE_PRECISION)
+
+
+class Location(db.Model):
+    __tablename__ = 'locations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Display name, as first entered
+    normalized_name = db.Column(db.String(100), nullable=False)  # See normalize_location_name()
+    latitude = db.Column(db.Float, nullable=False)  # Canonical, see canonical_coordinates()
+    longitude = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('uq_locations_normalized_name_coordinates', 'normalized_name', 'latitude', 'longitude', unique=True),
+    )
+
+    @classmethod
+    def get_or_create_many(cls, places: list) -> list:
+        """
+        Resolve places to their shared Location rows, adding the ones that are new.
+
+        Places match on their normalized name and canonical coordinates; a new row keeps the
+        name as given for display. New rows are flushed, not committed, so they become part
+        of the caller's transaction.
+
+        Args:
+            places (list): (name, latitude, longitude) tuples.
+
+        Returns:
+            list: The Location of each place, in the order of `places`.
+
+        Raises:
+            IntegrityError: If another transaction added one of the new places concurrently.
+                The session is rolled back.
+        """
+        keys = [(normalize_location_name(name),) + canonical_coordinates(latitude, longitude)
+                for name, latitude, longitude in places]
+        names = {key[0] for key in keys}
+        found = {}
+        if names:
+            for location in cls.query.filter(cls.normalized_name.in_(names)).all():
+                found[(location.normalized_name, location.latitude, location.longitude)] = location
+
+        new_locations = []
+        for (name, _, _), key in zip(places, keys):
+            if key not in found:
+                found[key] = cls(name=name, normalized_name=key[0], latitude=key[1], longitude=key[2])
+                new_locations.append(found[key])
+        if new_locations:
+            db.session.add_all(new_locations)
+            try:
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                logger.warning("A location was added concurrently.")
+                raise
+            logger.info(f"Added {len(new_locations)} locations.")
+        return [found[key] for key in keys]
@@ -1,10 +1,11 @@
-import hashlib
 import logging
 import os
+from typing import Optional
 
 from sqlalchemy.exc import IntegrityError
 
 from db import db
+from password_hashing import hash_password, needs_rehash, verify_password
 
 
 logger = logging.getLogger(__name__)
@@ -16,12 +17,12 @@ class Users(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     salt = db.Column(db.String(32), nullable=False)  # 16-byte salt in hex
-    password = db.Column(db.String(64), nullable=False)  # SHA-256 hash in hex
+    password = db.Column(db.String(255), nullable=False)  # Encoded KDF hash, or a legacy SHA-256 hash in hex
 
     @classmethod
     def _generate_hashed_password(cls, password: str) -> tuple[str, str]:
         """
-        Generates a salted, hashed password.
+        Generates a salted, hashed password with the configured key derivation function.
 
         Args:
             password (str): The password to hash.
@@ -30,7 +31,7 @@ class Users(db.Model):
             tuple: A tuple containing the salt and hashed password.
         """
         salt = os.urandom(16).hex()
-        hashed_password = hashlib.sha256((password + salt).encode()).hexdigest()
+        hashed_password = hash_password(password, salt)
         return salt, hashed_password
 
     @classmethod
@@ -67,7 +68,7 @@ class Users(db.Model):
     @classmethod
     def check_password(cls, username: str, password: str) -> bool:
         """
-        Check if a given password matches the stored password for a user.
+        Check if a given password matches the stored password for a user (see authenticate()).
 
         Args:
             username (str): The username of the user.
@@ -76,6 +77,26 @@ class Users(db.Model):
         Returns:
             bool: True if the password is correct, False otherwise.
 
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        return cls.authenticate(username, password) is not None
+
+    @classmethod
+    def authenticate(cls, username: str, password: str) -> Optional['Users']:
+        """
+        Look a user up and check their password with a single query.
+
+        A matching password whose hash was made with other hashing settings (or is a legacy
+        SHA-256 hash) is hashed again with the current ones.
+
+        Args:
+            username (str): The username of the user.
+            password (str): The password to check.
+
+        Returns:
+            Users: The user if the password is correct, None otherwise.
+
         Raises:
             ValueError: If the user does not exist.
         """
@@ -83,8 +104,17 @@ class Users(db.Model):
         if not user:
             logger.info("User %s not found", username)
             raise ValueError(f"User {username} not found")
-        hashed_password = hashlib.sha256((password + user.salt).encode()).hexdigest()
-        return hashed_password == user.password
+        if not verify_password(password, user.password, user.salt):
+            return None
+        if needs_rehash(user.password):
+            user.salt, user.password = cls._generate_hashed_password(password)
+            try:
+                db.session.commit()
+                logger.info("Password rehashed with the current settings for user: %s", username)
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Database error while rehashing password: %s", str(e))
+        return user
 
     @classmethod
     def delete_user(cls, username: str) -> None:
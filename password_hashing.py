@@ -0,0 +1,142 @@
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+PBKDF2_SHA256 = 'pbkdf2_sha256'
+SCRYPT = 'scrypt'
+ALGORITHMS = (PBKDF2_SHA256, SCRYPT)
+
+# Hashing settings and worker pool, see configure_password_hashing()
+_settings = {
+    "algorithm": PBKDF2_SHA256,
+    "cost": 600000,
+}
+_pool_lock = threading.Lock()
+_pool = None
+_pool_size = 0
+
+
+def configure_password_hashing(algorithm: str = PBKDF2_SHA256, cost: int = 600000, pool_size: int = 0) -> None:
+    """
+    Sets the key derivation function used for new password hashes and where hashing runs.
+
+    The cost is the work factor of the algorithm: the number of iterations for PBKDF2, and
+    log2 of the CPU/memory cost N for scrypt. Hashes made with other settings still verify,
+    and are flagged by needs_rehash().
+
+    Args:
+        algorithm (str): The key derivation function, 'pbkdf2_sha256' or 'scrypt'.
+        cost (int): The work factor of the algorithm.
+        pool_size (int): Number of worker processes that hash passwords off the request threads.
+            0 hashes on the calling thread.
+
+    Raises:
+        ValueError: If the algorithm is unknown.
+    """
+    global _pool, _pool_size
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown password hashing algorithm '{algorithm}'. Expected one of: {', '.join(ALGORITHMS)}.")
+    _settings.update(algorithm=algorithm, cost=cost)
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+        _pool_size = pool_size
+
+
+def _get_pool():
+    """
+    Helper that returns the hashing process pool, starting it on first use, or None when hashing runs inline.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None and _pool_size > 0:
+            # Spawned rather than forked workers: the web process runs threads
+            _pool = ProcessPoolExecutor(max_workers=_pool_size, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"Started password hashing pool with {_pool_size} processes")
+        return _pool
+
+
+def _derive(algorithm: str, cost: int, password: str, salt: str) -> str:
+    """
+    Helper that derives the hex digest of a password. Runs in a pool process.
+    """
+    if algorithm == PBKDF2_SHA256:
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), cost)
+    else:
+        n, r, p = 2 ** cost, 8, 1
+        digest = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p, maxmem=256 * n * r)
+    return digest.hex()
+
+
+def _run(algorithm: str, cost: int, password: str, salt: str) -> str:
+    pool = _get_pool()
+    if pool is None:
+        return _derive(algorithm, cost, password, salt)
+    return pool.submit(_derive, algorithm, cost, password, salt).result()
+
+
+def hash_password(password: str, salt: str = None) -> str:
+    """
+    Hashes a password with the configured algorithm and cost.
+
+    Args:
+        password (str): The password to hash.
+        salt (str, optional): The salt in hex (default: 16 random bytes).
+
+    Returns:
+        str: The encoded hash, '<algorithm>$<cost>$<salt>$<digest>'.
+    """
+    salt = salt or os.urandom(16).hex()
+    algorithm, cost = _settings["algorithm"], _settings["cost"]
+    return f"{algorithm}${cost}${salt}${_run(algorithm, cost, password, salt)}"
+
+
+def verify_password(password: str, encoded: str, legacy_salt: str = None) -> bool:
+    """
+    Checks a password against an encoded hash.
+
+    Hashes stored before key derivation functions were introduced (a bare SHA-256 hex
+    digest of the password and its separately stored salt) are still accepted.
+
+    Args:
+        password (str): The password to check.
+        encoded (str): The stored hash.
+        legacy_salt (str, optional): The separately stored salt of a legacy hash.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    if '$' not in encoded:
+        digest = hashlib.sha256((password + (legacy_salt or '')).encode()).hexdigest()
+        return hmac.compare_digest(digest, encoded)
+    try:
+        algorithm, cost, salt, expected = encoded.split('$')
+        cost = int(cost)
+    except ValueError:
+        logger.error("Malformed password hash")
+        return False
+    if algorithm not in ALGORITHMS:
+        logger.error(f"Unknown password hashing algorithm '{algorithm}'")
+        return False
+    return hmac.compare_digest(_run(algorithm, cost, password, salt), expected)
+
+
+def needs_rehash(encoded: str) -> bool:
+    """
+    Checks whether a stored hash was made with other settings than the configured ones.
+
+    Args:
+        encoded (str): The stored hash.
+
+    Returns:
+        bool: True if the password should be hashed again the next time it is known.
+    """
+    return not encoded.startswith(f"{_settings['algorithm']}${_settings['cost']}$")
@@ -0,0 +1,113 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import DB_QUERY_DURATION
+
+
+logger = logging.getLogger(__name__)
+
+# Query stats being collected in the current context, innermost last, see track_queries()
+_active = contextvars.ContextVar('query_stats', default=())
+
+
+class QueryStats:
+    """
+    Count and total duration of the SQL statements run while it is being tracked.
+
+    fan_out() tasks run in a copy of the request's context, so they record into the same
+    stats from other threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def record(self, statement: str, duration: float) -> None:
+        """
+        Records one statement and the seconds it took.
+        """
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.statements.append(statement)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Times every statement run on an engine and records it in the query stats being tracked
+    and in the process-wide query duration metric. Failed statements are recorded too.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine.
+    """
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Keyed by cursor, so that a statement that fails leaves nothing behind for the next one
+    conn.info.setdefault('query_start', {})[cursor] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record(conn, cursor, statement)
+
+
+def _handle_error(exception_context):
+    execution = exception_context.execution_context
+    if exception_context.connection is not None and execution is not None and execution.cursor is not None:
+        _record(exception_context.connection, execution.cursor, exception_context.statement)
+
+
+def _record(conn, cursor, statement: str) -> None:
+    started = conn.info.get('query_start', {}).pop(cursor, None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    DB_QUERY_DURATION.observe(duration)
+    for stats in _active.get():
+        stats.record(statement, duration)
+
+
+def start_tracking() -> tuple:
+    """
+    Starts collecting query stats in the current context, alongside any stats already being collected.
+
+    Returns:
+        tuple: The new QueryStats, and the token to pass to stop_tracking().
+    """
+    stats = QueryStats()
+    return stats, _active.set(_active.get() + (stats,))
+
+
+def stop_tracking(token: contextvars.Token) -> None:
+    """
+    Stops collecting the query stats started with `token`.
+    """
+    _active.reset(token)
+
+
+@contextmanager
+def track_queries():
+    """
+    Collects the stats of the SQL statements run inside the block.
+
+    Yields:
+        QueryStats: The stats, updated as statements run.
+    """
+    stats, token = start_tracking()
+    try:
+        yield stats
+    finally:
+        stop_tracking(token)
@@ -0,0 +1,414 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import Timeout
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from metrics import UPSTREAM_ERRORS, UPSTREAM_REQUEST_DURATION
+
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Registry settings and per-host state, see configure_resilience()
+_registry_lock = threading.Lock()
+_settings = {
+    "failure_threshold": 5,
+    "recovery_timeout": 30,
+    "retry_budget_ratio": 0.1,
+    "retry_budget_min_retries": 10,
+    "retry_budget_window": 10,
+}
+_breakers = {}
+_retry_budgets = {}
+
+# Monotonic deadline of the current request, see start_deadline()
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream host whose circuit is open.
+    """
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Circuit for '{host}' is open; not calling it for another {retry_after:.0f}s.")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when the current request's deadline passes before an operation could finish.
+
+    Deliberately not a TimeoutError (an OSError), which HTTP client libraries would wrap
+    into their own connection errors.
+    """
+
+    def __init__(self, operation: str):
+        super().__init__(f"Request deadline exceeded before {operation} could finish.")
+        self.operation = operation
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker with closed, open and half-open states.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail fast.
+    Once `recovery_timeout` seconds have passed, one trial call is let through (half-open):
+    its success closes the circuit again, its failure re-opens it.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = 5, recovery_timeout: float = 30):
+        """
+        Args:
+            host (str): The upstream host guarded by this breaker.
+            failure_threshold (int): Number of consecutive failures that open the circuit.
+            recovery_timeout (float): Number of seconds the circuit stays open before a trial call.
+        """
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """
+        Checks whether a call may go upstream.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with its trial call already in flight.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            remaining = self._opened_at + self.recovery_timeout - time.monotonic()
+            if self._state == OPEN and remaining <= 0:
+                self._state = HALF_OPEN
+                logger.info(f"Circuit for '{self.host}' is half-open")
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(self.host, max(remaining, 0))
+
+    def record_success(self) -> None:
+        """
+        Records a successful call, closing a half-open circuit.
+        """
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"Circuit for '{self.host}' is closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """
+        Gives back a half-open trial call that ended without telling whether the host recovered.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """
+        Records a failed call, opening the circuit once the failure threshold is reached.
+        """
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"Circuit for '{self.host}' is open after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of the calls made to a host over a sliding window.
+
+    Retries are always allowed up to `min_retries` per window, so that a quiet host can still
+    be retried; beyond that at most `ratio` retries per call are allowed. During a brownout
+    this keeps retries from multiplying the load on the upstream and on our workers.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 10, window: float = 10):
+        """
+        Args:
+            ratio (float): Maximum number of retries per call.
+            min_retries (int): Number of retries allowed per window regardless of the ratio.
+            window (float): Length of the sliding window in seconds.
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._retries = deque()
+
+    def _prune(self, now: float) -> None:
+        for events in (self._calls, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_call(self) -> None:
+        """
+        Records a call to the host.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            self._calls.append(now)
+
+    def try_retry(self) -> bool:
+        """
+        Takes a retry from the budget if one is left.
+
+        Returns:
+            bool: True if the retry may go ahead.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            if len(self._retries) >= max(self.min_retries, self.ratio * len(self._calls)):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class BudgetedRetry(Retry):
+    """
+    urllib3 retry policy that only retries while the host's retry budget allows it.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # Raises when the retries are used up; only a retry that would really happen takes from the budget
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        remaining = time_remaining()
+        if remaining is not None and retry.get_backoff_time() >= remaining:
+            logger.warning(f"Not retrying {url}: the request deadline would pass first")
+            raise DeadlineExceeded(f"a retry of {url}")
+        host = getattr(_pool, 'host', None)
+        if host is not None and not get_retry_budget(host).try_retry():
+            logger.warning(f"Retry budget for '{host}' exhausted; not retrying {url}")
+            raise MaxRetryError(_pool, url, error)
+        return retry
+
+
+class GuardedAdapter(HTTPAdapter):
+    """
+    HTTP adapter that applies default connect/read timeouts and guards each host with a circuit breaker.
+
+    Connection errors, timeouts and 5xx/429 responses count as failures. Every call is also
+    recorded against the host's retry budget. Within a request deadline (see start_deadline())
+    the timeouts are shrunk to the time remaining, and a timeout caused by that is raised as
+    DeadlineExceeded without counting against the host. Call latency and errors are recorded
+    per host in the upstream metrics.
+    """
+
+    def __init__(self, timeout: tuple = (3.05, 10), **kwargs):
+        """
+        Args:
+            timeout (tuple): Default (connect, read) timeouts in seconds.
+            **kwargs: Arguments passed to HTTPAdapter (pool sizes, max_retries).
+        """
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        host = urlparse(request.url).hostname
+        try:
+            check_deadline(f"calling '{host}'")
+        except DeadlineExceeded:
+            UPSTREAM_ERRORS.inc(host=host, error='deadline')
+            raise
+        timeout = timeout or self.timeout
+        bounded = bounded_timeout(timeout)
+        breaker = get_breaker(host)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            UPSTREAM_ERRORS.inc(host=host, error='circuit_open')
+            raise
+        get_retry_budget(host).record_call()
+        started = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, timeout=bounded,
+                                    verify=verify, cert=cert, proxies=proxies)
+        except Timeout as e:
+            if bounded != timeout:
+                UPSTREAM_ERRORS.inc(host=host, error='deadline')
+                breaker.release_trial()
+                raise DeadlineExceeded(f"the call to '{host}'") from e
+            UPSTREAM_ERRORS.inc(host=host, error='timeout')
+            breaker.record_failure()
+            raise
+        except DeadlineExceeded:
+            UPSTREAM_ERRORS.inc(host=host, error='deadline')
+            breaker.release_trial()
+            raise
+        except Exception:
+            UPSTREAM_ERRORS.inc(host=host, error='connection')
+            breaker.record_failure()
+            raise
+        finally:
+            UPSTREAM_REQUEST_DURATION.observe(time.perf_counter() - started, host=host)
+        if response.status_code >= 500 or response.status_code == 429:
+            UPSTREAM_ERRORS.inc(host=host, error=f'http_{response.status_code}')
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+def configure_resilience(failure_threshold: int = 5, recovery_timeout: float = 30, retry_budget_ratio: float = 0.1,
+                         retry_budget_min_retries: int = 10, retry_budget_window: float = 10) -> None:
+    """
+    Sets the circuit breaker and retry budget settings and resets the state of every host.
+
+    Args:
+        failure_threshold (int): Number of consecutive failures that open a host's circuit.
+        recovery_timeout (float): Number of seconds a circuit stays open before a trial call.
+        retry_budget_ratio (float): Maximum number of retries per call to a host.
+        retry_budget_min_retries (int): Number of retries allowed per window regardless of the ratio.
+        retry_budget_window (float): Length of the retry budget window in seconds.
+    """
+    with _registry_lock:
+        _settings.update(
+            failure_threshold=failure_threshold,
+            recovery_timeout=recovery_timeout,
+            retry_budget_ratio=retry_budget_ratio,
+            retry_budget_min_retries=retry_budget_min_retries,
+            retry_budget_window=retry_budget_window,
+        )
+        _breakers.clear()
+        _retry_budgets.clear()
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """
+    Returns the circuit breaker of an upstream host, creating it on first use.
+    """
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host, _settings["failure_threshold"], _settings["recovery_timeout"])
+        return _breakers[host]
+
+
+def get_retry_budget(host: str) -> RetryBudget:
+    """
+    Returns the retry budget of an upstream host, creating it on first use.
+    """
+    with _registry_lock:
+        if host not in _retry_budgets:
+            _retry_budgets[host] = RetryBudget(_settings["retry_budget_ratio"], _settings["retry_budget_min_retries"],
+                                               _settings["retry_budget_window"])
+        return _retry_budgets[host]
+
+
+def find_cause(error: BaseException, error_types: tuple):
+    """
+    Finds an exception of the given types in an exception or the exceptions it was raised from.
+
+    Client libraries such as openmeteo_requests wrap transport errors, so a CircuitOpenError
+    or DeadlineExceeded is usually the cause of the exception the caller sees.
+
+    Args:
+        error (BaseException): The exception raised by an upstream call.
+        error_types (tuple): The exception types to look for.
+
+    Returns:
+        BaseException: The first matching exception, or None if there is none.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, error_types):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def start_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """
+    Sets the deadline of the current request, `seconds` from now.
+
+    The deadline lives in a context variable, so it follows the request through
+    fan_out() tasks but not into background work.
+
+    Args:
+        seconds (float, optional): The time budget in seconds, or None for no deadline.
+
+    Returns:
+        contextvars.Token: The token to pass to end_deadline().
+    """
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def end_deadline(token: contextvars.Token) -> None:
+    """
+    Restores the deadline that was in effect before start_deadline().
+    """
+    _deadline.reset(token)
+
+
+def time_remaining() -> Optional[float]:
+    """
+    Returns the number of seconds left before the current deadline, or None if there is no deadline.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(operation: str) -> None:
+    """
+    Checks that the current deadline has not passed.
+
+    Args:
+        operation (str): What is about to be done, for the error message.
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed.
+    """
+    remaining = time_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(operation)
+
+
+def bounded_timeout(timeout):
+    """
+    Shrinks a requests timeout so that it ends by the current deadline.
+
+    Args:
+        timeout (float or tuple): A timeout in seconds, or a (connect, read) tuple.
+
+    Returns:
+        float or tuple: The timeout, unchanged if there is no deadline or it already fits.
+    """
+    remaining = time_remaining()
+    if remaining is None:
+        return timeout
+    remaining = max(remaining, 0.001)
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
@@ -0,0 +1,131 @@
+import csv
+import gzip
+import io
+import logging
+import zlib
+
+import msgpack
+from flask import Response, jsonify
+
+
+logger = logging.getLogger(__name__)
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CSV = 'text/csv'
+
+# Names accepted for each format in the 'format' query parameter
+FORMAT_NAMES = {
+    'json': JSON,
+    'msgpack': MSGPACK,
+    'csv': CSV,
+}
+
+
+def negotiate_format(accept_mimetypes, requested: str = None, csv_allowed: bool = False) -> str:
+    """
+    Picks the encoding of a weather response.
+
+    Args:
+        accept_mimetypes (MIMEAccept): The request's Accept header.
+        requested (str, optional): An explicit format name from the query string ('json', 'msgpack' or 'csv').
+        csv_allowed (bool): Whether the route can be encoded as CSV.
+
+    Returns:
+        str: The mimetype to encode the response with. JSON unless the client prefers another format.
+
+    Raises:
+        ValueError: If the requested format is unknown or not available for the route.
+    """
+    offered = [JSON, MSGPACK] + ([CSV] if csv_allowed else [])
+    if requested:
+        mimetype = FORMAT_NAMES.get(requested.lower())
+        if mimetype not in offered:
+            raise ValueError(f"Unsupported format '{requested}'. Expected one of: "
+                             f"{', '.join(name for name, value in FORMAT_NAMES.items() if value in offered)}.")
+        return mimetype
+    # Clients commonly send the older x-msgpack name
+    if accept_mimetypes.quality('application/x-msgpack') > accept_mimetypes.quality(MSGPACK):
+        offered = [JSON, 'application/x-msgpack'] + offered[2:]
+    best = accept_mimetypes.best_match(offered, default=JSON)
+    return MSGPACK if best == 'application/x-msgpack' else best
+
+
+def encode_response(body: dict, mimetype: str, status: int = 200, headers: dict = None, csv_key: str = None) -> Response:
+    """
+    Encodes a response body as JSON, MessagePack or CSV.
+
+    JSON and MessagePack carry the same body. CSV carries the daily series under `csv_key`,
+    in records or columnar layout, as one row per day.
+
+    Args:
+        body (dict): The response body.
+        mimetype (str): The encoding chosen by negotiate_format().
+        status (int): The HTTP status code.
+        headers (dict, optional): Extra response headers.
+        csv_key (str, optional): The key of the daily series encoded as CSV.
+
+    Returns:
+        Response: The encoded response, varying on the Accept header.
+    """
+    if mimetype == MSGPACK:
+        response = Response(msgpack.packb(body), status=status, mimetype=MSGPACK)
+    elif mimetype == CSV:
+        response = Response(_to_csv(body[csv_key]), status=status, mimetype=CSV)
+    else:
+        response = jsonify(body)
+        response.status_code = status
+    response.headers.update(headers or {})
+    response.vary.add('Accept')
+    return response
+
+
+def _to_csv(series) -> str:
+    """
+    Helper that writes a daily series, a list of records or a dict of columns, as CSV with a header row.
+    """
+    if isinstance(series, dict):
+        names = list(series)
+        rows = zip(*series.values())
+    else:
+        names = list(series[0]) if series else []
+        rows = (record.values() for record in series)
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(names)
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+def compress_response(response: Response, accept_encodings, min_size: int = 1024, level: int = 6) -> Response:
+    """
+    Compresses a response body with gzip or deflate if the client accepts it and the body is large enough.
+
+    Streamed responses, bodies that are already encoded and bodies under `min_size` bytes
+    are left as they are.
+
+    Args:
+        response (Response): The response to compress.
+        accept_encodings (Accept): The request's Accept-Encoding header.
+        min_size (int): Minimum body size in bytes worth compressing.
+        level (int): Compression level from 1 (fastest) to 9 (smallest).
+
+    Returns:
+        Response: The same response, compressed in place if applicable.
+    """
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accept_encodings.best_match(['gzip', 'deflate'])
+    if encoding is None or response.content_length is None or response.content_length < min_size:
+        return response
+
+    data = response.get_data()
+    if encoding == 'gzip':
+        compressed = gzip.compress(data, compresslevel=level, mtime=0)
+    else:
+        compressed = zlib.compress(data, level)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    logger.debug(f"Compressed response with {encoding} from {len(data)} to {len(compressed)} bytes")
+    return response
@@ -0,0 +1,176 @@
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from models.favourite_location import FavoriteLocation
+from models.location import Location, canonical_coordinates, normalize_location_name
+
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _transaction(engine: Engine):
+    """
+    Helper that opens a transaction that also covers DDL statements.
+
+    pysqlite only begins transactions implicitly before data changes, so on SQLite the
+    transaction is begun explicitly (and immediately, to keep other workers from upgrading
+    at the same time).
+    """
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as conn:
+            yield conn
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.exec_driver_sql('ROLLBACK')
+            raise
+        conn.exec_driver_sql('COMMIT')
+
+
+def upgrade_favorite_locations(engine: Engine) -> bool:
+    """
+    Moves favorite_locations from per-favorite names and coordinates to references into the shared locations table.
+
+    Every distinct (normalized name, canonical coordinates) place becomes one row of `locations`, and the
+    table is rebuilt with a location_id column in place of location_name, latitude and
+    longitude. Favorites of a user that collapse into the same place keep the oldest one.
+    Runs in a single transaction and does nothing on an already upgraded database.
+
+    Args:
+        engine (Engine): The engine of the application database.
+
+    Returns:
+        bool: True if the table was upgraded.
+    """
+    with _transaction(engine) as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table('favorite_locations'):
+            return False
+        if 'location_id' in {column['name'] for column in inspector.get_columns('favorite_locations')}:
+            return False
+
+        Location.__table__.create(conn, checkfirst=True)
+        location_ids = {
+            (row.normalized_name, row.latitude, row.longitude): row.id
+            for row in conn.execute(text("SELECT id, normalized_name, latitude, longitude FROM locations"))
+        }
+        favorites = {}
+        rows = conn.execute(text(
+            "SELECT id, user_id, location_name, latitude, longitude FROM favorite_locations ORDER BY id"
+        )).all()
+        for row in rows:
+            key = (normalize_location_name(row.location_name),) + canonical_coordinates(row.latitude, row.longitude)
+            if key not in location_ids:
+                result = conn.execute(Location.__table__.insert().values(
+                    name=row.location_name, normalized_name=key[0], latitude=key[1], longitude=key[2]
+                ))
+                location_ids[key] = result.inserted_primary_key[0]
+            favorites.setdefault((row.user_id, location_ids[key]), row.id)
+
+        conn.execute(text(
+            "CREATE TABLE favorite_locations_new ("
+            "id INTEGER NOT NULL PRIMARY KEY, "
+            "user_id INTEGER NOT NULL REFERENCES users (id), "
+            "location_id INTEGER NOT NULL REFERENCES locations (id))"
+        ))
+        if favorites:
+            conn.execute(
+                text("INSERT INTO favorite_locations_new (id, user_id, location_id) VALUES (:id, :user_id, :location_id)"),
+                [{"id": favorite_id, "user_id": user_id, "location_id": location_id}
+                 for (user_id, location_id), favorite_id in favorites.items()]
+            )
+        conn.execute(text("DROP TABLE favorite_locations"))
+        conn.execute(text("ALTER TABLE favorite_locations_new RENAME TO favorite_locations"))
+        for index in FavoriteLocation.__table__.indexes:
+            index.create(conn)
+
+    referenced = {location_id for _, location_id in favorites}
+    logger.info(f"Upgraded favorite_locations: {len(rows)} favorites now reference {len(referenced)} locations "
+                f"({len(rows) - len(favorites)} duplicates dropped)")
+    return True
+
+
+def upgrade_location_names(engine: Engine) -> bool:
+    """
+    Adds locations.normalized_name and merges the places that only differed by the case or spacing of their name.
+
+    The oldest row of each merged place is kept, with its name for display. Favorites of the
+    merged rows are moved to it; a user who favorited several of them keeps the oldest favorite.
+    Runs in a single transaction and does nothing on an already upgraded database.
+
+    Args:
+        engine (Engine): The engine of the application database.
+
+    Returns:
+        bool: True if the table was upgraded.
+    """
+    with _transaction(engine) as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table('locations'):
+            return False
+        if 'normalized_name' in {column['name'] for column in inspector.get_columns('locations')}:
+            return False
+
+        conn.execute(text("ALTER TABLE locations ADD COLUMN normalized_name VARCHAR(100) NOT NULL DEFAULT ''"))
+        kept = {}
+        merged = {}
+        for row in conn.execute(text("SELECT id, name, latitude, longitude FROM locations ORDER BY id")).all():
+            key = (normalize_location_name(row.name), row.latitude, row.longitude)
+            merged[row.id] = kept.setdefault(key, row.id)
+            if merged[row.id] == row.id:
+                conn.execute(text("UPDATE locations SET normalized_name = :normalized_name WHERE id = :id"),
+                             {"normalized_name": key[0], "id": row.id})
+
+        duplicates = [location_id for location_id, keep in merged.items() if location_id != keep]
+        dropped = 0
+        if duplicates:
+            favorites = {}
+            for row in conn.execute(text("SELECT id, user_id, location_id FROM favorite_locations ORDER BY id")).all():
+                key = (row.user_id, merged[row.location_id])
+                if key in favorites:
+                    conn.execute(text("DELETE FROM favorite_locations WHERE id = :id"), {"id": row.id})
+                    dropped += 1
+                    continue
+                favorites[key] = row.id
+                if row.location_id != key[1]:
+                    conn.execute(text("UPDATE favorite_locations SET location_id = :location_id WHERE id = :id"),
+                                 {"location_id": key[1], "id": row.id})
+            conn.execute(text("DELETE FROM locations WHERE id = :id"), [{"id": location_id} for location_id in duplicates])
+
+        if 'uq_locations_name_coordinates' in {index['name'] for index in inspector.get_indexes('locations')}:
+            conn.execute(text("DROP INDEX uq_locations_name_coordinates"))
+        for index in Location.__table__.indexes:
+            index.create(conn)
+
+    logger.info(f"Upgraded locations: {len(duplicates)} duplicate places merged ({dropped} duplicate favorites dropped)")
+    return True
+
+
+def upgrade_geocode_cache(engine: Engine) -> bool:
+    """
+    Renames geocode_cache.query to normalized_query, the name it is mapped under.
+
+    A column named `query` shadowed Flask-SQLAlchemy's Model.query. Cached entries are kept.
+
+    Args:
+        engine (Engine): The engine of the application database.
+
+    Returns:
+        bool: True if the table was upgraded.
+    """
+    with _transaction(engine) as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table('geocode_cache'):
+            return False
+        if 'query' not in {column['name'] for column in inspector.get_columns('geocode_cache')}:
+            return False
+        conn.execute(text("ALTER TABLE geocode_cache RENAME COLUMN query TO normalized_query"))
+    logger.info("Upgraded geocode_cache: renamed column query to normalized_query")
+    return True
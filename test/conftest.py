@@ -1,8 +1,11 @@
+from contextlib import contextmanager
+
 import pytest
 
 from app import create_app
 from config import TestConfig
 from db import db
+from query_stats import track_queries
 
 @pytest.fixture
 def app():
@@ -39,3 +42,24 @@ def session(app):
     """
     with app.app_context():
         yield db.session
+
+@pytest.fixture
+def query_budget():
+    """
+    Pytest fixture to declare the maximum number of SQL queries a block may run.
+
+    Usage:
+        with query_budget(2):
+            client.get(...)
+
+    Returns:
+        - Context manager failing the test if the block runs more queries than its budget.
+    """
+    @contextmanager
+    def budget(max_queries: int):
+        with track_queries() as stats:
+            yield stats
+        assert stats.count <= max_queries, \
+            f"{stats.count} queries over a budget of {max_queries}:\n" + "\n".join(stats.statements)
+
+    return budget
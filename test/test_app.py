@@ -0,0 +1,361 @@
+import gzip
+import json
+
+import msgpack
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from models.user_model import Users
+from models.favourite_location import FavoriteLocation
+from test.test_weather_api import fake_weather_api
+
+
+@pytest.fixture
+def user(session):
+    return Users.create_user("testuser", "password123")
+
+
+@pytest.fixture
+def upstream(app, monkeypatch):
+    """Replace the shared Open-Meteo client's transport with the fake upstream and record the calls."""
+    calls = []
+
+    def weather_api(url, params, **kwargs):
+        calls.append(params)
+        return fake_weather_api(url, params)
+
+    monkeypatch.setattr(app.extensions["openmeteo"], "weather_api", weather_api)
+    return calls
+
+
+@pytest.fixture
+def favorite(user):
+    return FavoriteLocation.create_favorite(user.id, "London", 51.5, -0.1)
+
+
+##########################################################
+# Session Tokens
+##########################################################
+
+def test_login_issues_token_accepted_by_routes(client, favorite, upstream):
+    """Test that the token from /login authenticates data routes without a password."""
+    login = client.post("/login", json={"username": "testuser", "password": "password123"})
+    token = login.get_json()["token"]
+
+    response = client.get(f"/api/favorites/{favorite.id}/weather", headers={"Authorization": f"Bearer {token}"})
+
+    assert login.get_json()["expires_in"] == 3600
+    assert response.status_code == 200
+    assert response.get_json()["favorite_location"]["location_name"] == "London"
+
+
+def test_invalid_token_is_unauthorized(client, favorite):
+    """Test that a bad token is rejected rather than falling back to the password."""
+    response = client.get(f"/api/favorites/{favorite.id}/weather?username=testuser&password=password123",
+                          headers={"Authorization": "Bearer not-a-token"})
+
+    assert response.status_code == 401
+
+
+def test_non_ascii_token_is_unauthorized(client, favorite):
+    """Test that a malformed token with non-ASCII characters gets a 401, not a server error."""
+    response = client.get("/api/favorites", headers={"Authorization": "Bearer abc.d\u00e9f"})
+
+    assert response.status_code == 401
+
+
+def test_update_password_requires_password_even_with_token(client, user):
+    """Test that a session token cannot be used to change the password."""
+    token = client.post("/login", json={"username": "testuser", "password": "password123"}).get_json()["token"]
+
+    response = client.post("/update-password", headers={"Authorization": f"Bearer {token}"},
+                           json={"username": "testuser", "current_password": "wrong", "new_password": "new"})
+
+    assert response.status_code == 401
+
+
+##########################################################
+# Query Budgets
+##########################################################
+
+def test_login_query_budget(client, user, query_budget):
+    """Test that logging in looks the user up once."""
+    with query_budget(1):
+        response = client.post('/login', json={"username": "testuser", "password": "password123"})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("path", [
+    "/api/favorites",
+    "/api/favorites/weather",
+    "/api/favorites/{id}/weather",
+    "/api/favorites/{id}/forecast",
+    "/api/favorites/{id}/historical?start_date=2024-01-01&end_date=2024-01-03",
+])
+def test_favorite_routes_query_budget(client, favorite, upstream, query_budget, path):
+    """Test that the favorite routes load the user and the favorites once each."""
+    separator = "&" if "?" in path else "?"
+    url = path.format(id=favorite.id) + separator + "username=testuser&password=password123"
+    with query_budget(2):
+        response = client.get(url)
+    assert response.status_code == 200
+
+
+def test_query_stats_header(client, favorite, upstream):
+    """Test that the query count and time of a request are reported in debug headers."""
+    response = client.get("/api/favorites?username=testuser&password=password123")
+    assert response.headers["X-Query-Count"] == "2"
+    assert float(response.headers["X-Query-Time-Ms"]) >= 0
+
+
+##########################################################
+# Favorites Import
+##########################################################
+
+def test_import_favorites_reports_each_location(client, user, monkeypatch):
+    """Test that an import adds the found locations in one go and reports every item."""
+    FavoriteLocation.create_favorite(user.id, "London", 51.5, -0.1)
+
+    def get_coordinates_batch(cities):
+        coordinates = {"London": (51.5, -0.1), "Paris": (48.9, 2.4), "Rome": (41.9, 12.5)}
+        return [coordinates[city] if city in coordinates else ValueError(f"Location '{city}' not found.")
+                for city in cities]
+
+    monkeypatch.setattr("weather_api.get_coordinates_batch", get_coordinates_batch)
+    response = client.post('/api/favorites/import', json={
+        "username": "testuser", "password": "password123",
+        "locations": ["Paris", "London", "Atlantis", "Rome", "Paris"],
+    })
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result["status"] for result in body["results"]] == ["created", "exists", "error", "created", "exists"]
+    assert body["counts"] == {"created": 2, "exists": 2, "error": 1}
+    assert "not found" in body["results"][2]["error"]
+    names = [fav.location_name for fav in FavoriteLocation.get_all_favorites(user.id)]
+    assert names == ["London", "Paris", "Rome"]
+
+
+def test_import_favorites_database_error_is_not_a_conflict(client, user, session, monkeypatch):
+    """Test that an unexpected database error during an import is a server error, not a 409 conflict."""
+    def add_all(instances):
+        raise OperationalError("INSERT INTO favorite_locations", {}, Exception("disk I/O error"))
+
+    monkeypatch.setattr("weather_api.get_coordinates_batch", lambda cities: [(48.9, 2.4) for _ in cities])
+    monkeypatch.setattr(session, "add_all", add_all)
+    response = client.post('/api/favorites/import', json={
+        "username": "testuser", "password": "password123", "locations": ["Paris"],
+    })
+
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Internal server error."}
+
+
+def test_import_favorites_rejects_too_many_locations(client, user, app):
+    """Test that an import larger than the configured limit is rejected before geocoding."""
+    response = client.post('/api/favorites/import', json={
+        "username": "testuser", "password": "password123",
+        "locations": ["Paris"] * (app.config['FAVORITES_IMPORT_MAX_ITEMS'] + 1),
+    })
+    assert response.status_code == 400
+
+
+##########################################################
+# Favorites Listings
+##########################################################
+
+def test_favorites_are_paged_by_cursor(client, user):
+    """Test that following next_cursor walks every favorite exactly once, in order."""
+    for index in range(5):
+        FavoriteLocation.create_favorite(user.id, f"City {index}", float(index), 0.0)
+
+    names, cursor = [], None
+    for _ in range(3):
+        url = "/api/favorites?username=testuser&password=password123&limit=2"
+        body = client.get(url + (f"&cursor={cursor}" if cursor else "")).get_json()
+        names += [fav["location_name"] for fav in body["favorites"]]
+        cursor = body["next_cursor"]
+
+    assert names == [f"City {index}" for index in range(5)]
+    assert cursor is None
+
+
+def test_favorites_fields_projection(client, favorite):
+    """Test that 'fields' limits each favorite to the requested fields."""
+    response = client.get("/api/favorites?username=testuser&password=password123&fields=location_name")
+    assert response.get_json()["favorites"] == [{"location_name": "London"}]
+
+    response = client.get("/api/favorites?username=testuser&password=password123&fields=location_name,elevation")
+    assert response.status_code == 400
+
+
+def test_favorites_weather_fetches_only_the_page(client, user, upstream):
+    """Test that weather is fetched for the favorites on the page only, projected to the requested fields."""
+    for index in range(3):
+        FavoriteLocation.create_favorite(user.id, f"City {index}", float(index), 0.0)
+
+    response = client.get("/api/favorites/weather?username=testuser&password=password123"
+                          "&limit=2&fields=id,current_weather")
+
+    body = response.get_json()
+    assert [set(fav) for fav in body["favorites"]] == [{"id", "current_weather"}] * 2
+    assert body["next_cursor"] == body["favorites"][1]["id"]
+    assert sum(len(params["latitude"]) for params in upstream) == 2
+
+
+def test_favorites_rejects_invalid_limit(client, user, app):
+    """Test that a page size outside the configured bounds is rejected."""
+    limit = app.config['FAVORITES_MAX_PAGE_SIZE'] + 1
+    assert client.get(f"/api/favorites?username=testuser&password=password123&limit={limit}").status_code == 400
+    assert client.get("/api/favorites?username=testuser&password=password123&limit=0").status_code == 400
+
+
+##########################################################
+# Favorites With Weather
+##########################################################
+
+def test_favorites_weather_batches_upstream_calls(client, user, upstream):
+    """Test that all favorites are served from one multi-location upstream request."""
+    FavoriteLocation.create_favorite(user.id, "London", 51.5, -0.1)
+    FavoriteLocation.create_favorite(user.id, "Paris", 48.9, 2.4)
+
+    response = client.get("/api/favorites/weather?username=testuser&password=password123")
+
+    assert response.status_code == 200
+    favorites = response.get_json()["favorites"]
+    assert [fav["location_name"] for fav in favorites] == ["London", "Paris"]
+    assert all(fav["current_weather"]["temperature"] == 20.0 for fav in favorites)
+    assert len(upstream) == 1
+
+
+def test_favorites_weather_reports_per_favorite_error(client, user, upstream):
+    """Test that a location rejected upstream yields an error entry without failing the others."""
+    FavoriteLocation.create_favorite(user.id, "London", 51.5, -0.1)
+    FavoriteLocation.create_favorite(user.id, "Nowhere", 99.0, 0.0)
+
+    response = client.get("/api/favorites/weather?username=testuser&password=password123")
+
+    assert response.status_code == 200
+    london, nowhere = response.get_json()["favorites"]
+    assert london["current_weather"]["temperature"] == 20.0
+    assert nowhere["current_weather"] is None
+    assert nowhere["error"] == "Could not fetch weather data."
+
+
+def test_favorites_weather_streams_ndjson(client, user, upstream):
+    """Test that the favorites can be streamed as one JSON line each."""
+    FavoriteLocation.create_favorite(user.id, "London", 51.5, -0.1)
+    FavoriteLocation.create_favorite(user.id, "Nowhere", 99.0, 0.0)
+
+    response = client.get("/api/favorites/weather?username=testuser&password=password123",
+                          headers={"Accept": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    by_name = {line["location_name"]: line for line in lines}
+    assert by_name["London"]["current_weather"]["temperature"] == 20.0
+    assert by_name["Nowhere"]["error"] == "Could not fetch weather data."
+
+
+def test_favorites_weather_stream_logs_token_user(client, favorite, upstream, caplog):
+    """Test that a stream authenticated by a session token logs the user it was served to."""
+    token = client.post("/login", json={"username": "testuser", "password": "password123"}).get_json()["token"]
+
+    with caplog.at_level("INFO", logger="app"):
+        response = client.get("/api/favorites/weather?stream=true", headers={"Authorization": f"Bearer {token}"})
+        response.get_data()
+
+    assert "Streamed a page of favorites with weather for user 'testuser'." in caplog.messages
+
+
+def test_favorites_weather_stream_query_flag(client, user, upstream):
+    """Test that the stream query flag selects NDJSON too."""
+    FavoriteLocation.create_favorite(user.id, "London", 51.5, -0.1)
+
+    response = client.get("/api/favorites/weather?username=testuser&password=password123&stream=true")
+
+    assert response.mimetype == "application/x-ndjson"
+    assert len(response.get_data(as_text=True).splitlines()) == 1
+
+
+##########################################################
+# Favorite Weather
+##########################################################
+
+def test_favorite_weather_reports_cache_age(client, favorite, upstream):
+    """Test that the response carries the age and staleness of the weather data."""
+    url = f"/api/favorites/{favorite.id}/weather?username=testuser&password=password123"
+    first = client.get(url)
+    second = client.get(url)
+
+    assert first.status_code == 200
+    assert first.get_json()["cache"] == {"age_seconds": 0, "stale": False}
+    assert second.headers["Age"] == "0"
+    assert len(upstream) == 1
+
+
+##########################################################
+# Favorite Forecast
+##########################################################
+
+def test_favorite_forecast_columnar_layout(client, favorite, upstream):
+    """Test that layout=columnar returns one list per daily variable."""
+    response = client.get(f"/api/favorites/{favorite.id}/forecast?username=testuser&password=password123&days=2&layout=columnar")
+
+    assert response.status_code == 200
+    forecast = response.get_json()["weather_forecast"]
+    assert forecast["date"] == ["2024-01-01", "2024-01-02"]
+    assert forecast["temperature_2m_max"] == [0.0, 1.0]
+
+
+def test_favorite_forecast_rejects_unknown_layout(client, favorite, upstream):
+    """Test that an unknown layout is a bad request."""
+    response = client.get(f"/api/favorites/{favorite.id}/forecast?username=testuser&password=password123&layout=rows")
+
+    assert response.status_code == 400
+    assert len(upstream) == 0
+
+
+##########################################################
+# Response Encodings
+##########################################################
+
+def test_favorite_weather_msgpack_matches_json(client, favorite, upstream):
+    """Test that MessagePack carries the same body as JSON."""
+    url = f"/api/favorites/{favorite.id}/weather?username=testuser&password=password123"
+    as_json = client.get(url).get_json()
+    response = client.get(url, headers={"Accept": "application/msgpack"})
+
+    assert response.mimetype == "application/msgpack"
+    assert msgpack.unpackb(response.data) == as_json
+
+
+def test_favorite_historical_csv(client, favorite, upstream):
+    """Test that historical weather can be downloaded as CSV, one row per day."""
+    response = client.get(f"/api/favorites/{favorite.id}/historical?username=testuser&password=password123"
+                          "&start_date=2024-01-01&end_date=2024-01-03&format=csv")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    header, *rows = response.get_data(as_text=True).splitlines()
+    assert header.startswith("date,temperature_2m_max,")
+    assert [row.split(",")[0] for row in rows] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+
+def test_csv_not_offered_for_forecast(client, favorite, upstream):
+    """Test that an unavailable format is a bad request."""
+    response = client.get(f"/api/favorites/{favorite.id}/forecast?username=testuser&password=password123&format=csv")
+
+    assert response.status_code == 400
+
+
+def test_large_responses_are_gzipped(client, favorite, upstream):
+    """Test that responses above the size threshold are compressed and small ones are not."""
+    url = f"/api/favorites/{favorite.id}/historical?username=testuser&password=password123&start_date=2024-01-01"
+    large = client.get(url + "&end_date=2024-03-31", headers={"Accept-Encoding": "gzip"})
+    small = client.get("/api/health", headers={"Accept-Encoding": "gzip"})
+
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(large.data))["historical_weather"]) == 91
+    assert "Content-Encoding" not in small.headers
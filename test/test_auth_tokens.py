@@ -0,0 +1,45 @@
+import pytest
+
+from auth_tokens import InvalidTokenError, TokenUser, issue_token, verify_token
+
+
+def test_verify_token_returns_user():
+    """Test that a token issued for a user verifies back to that user."""
+    token = issue_token(7, "testuser", "secret")
+
+    assert verify_token(token, "secret") == TokenUser(7, "testuser")
+
+
+def test_verify_token_rejects_other_secret():
+    """Test that a token signed with another secret is rejected."""
+    token = issue_token(7, "testuser", "secret")
+
+    with pytest.raises(InvalidTokenError, match="Invalid session token."):
+        verify_token(token, "other-secret")
+
+
+def test_verify_token_rejects_tampered_payload():
+    """Test that changing the payload invalidates the signature."""
+    payload, signature = issue_token(7, "testuser", "secret").split(".")
+    forged = issue_token(1, "admin", "secret").split(".")[0]
+
+    with pytest.raises(InvalidTokenError):
+        verify_token(f"{forged}.{signature}", "secret")
+    with pytest.raises(InvalidTokenError):
+        verify_token(payload, "secret")
+
+
+def test_verify_token_rejects_non_ascii_token():
+    """Test that a malformed token with non-ASCII characters is rejected, not crashing the comparison."""
+    with pytest.raises(InvalidTokenError, match="Invalid session token."):
+        verify_token("abc.déf", "secret")
+    with pytest.raises(InvalidTokenError):
+        verify_token("é.abc", "secret")
+
+
+def test_verify_token_rejects_expired_token():
+    """Test that an expired token is rejected."""
+    token = issue_token(7, "testuser", "secret", ttl=-1)
+
+    with pytest.raises(InvalidTokenError, match="Session token has expired."):
+        verify_token(token, "secret")
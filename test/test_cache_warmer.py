@@ -0,0 +1,71 @@
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+import weather_api
+from cache_warmer import CacheWarmer
+from models.user_model import Users
+from models.favourite_location import FavoriteLocation
+from test.test_weather_api import fake_weather_api
+
+
+@pytest.fixture
+def fake_client():
+    client = MagicMock()
+    client.weather_api.side_effect = fake_weather_api
+    return client
+
+
+@pytest.fixture
+def favorites(session):
+    user = Users.create_user("testuser", "password123")
+    other = Users.create_user("otheruser", "password123")
+    FavoriteLocation.create_favorite(user.id, "London", 51.5072, -0.1276)
+    FavoriteLocation.create_favorite(other.id, "London", 51.5123, -0.1301)  # Same grid cell
+    FavoriteLocation.create_favorite(user.id, "Paris", 48.8566, 2.3522)
+    FavoriteLocation.create_favorite(user.id, "Berlin", 52.52, 13.405)
+
+
+def test_run_cycle_warms_every_distinct_cell(app, favorites, fake_client):
+    """Test that one cycle refreshes current weather and forecasts for every distinct grid cell."""
+    weather_api.configure_cache(ttls={"current": 2, "forecast": 2})
+    warmer = CacheWarmer(app, client=fake_client, lead_time=1, batch_size=50)
+
+    warmer.run_cycle()
+
+    stats = warmer.stats()
+    assert stats["locations"] == 3
+    assert stats["refreshed"] == 6  # 3 cells, current weather and forecast
+    assert stats["progress"] == 1.0
+    assert fake_client.weather_api.call_count == 2  # One batched request per kind of data
+    assert all(call.kwargs["force_refresh"] for call in fake_client.weather_api.call_args_list)
+
+    weather_api.get_current_weather(51.5072, -0.1276, client=fake_client)
+    weather_api.get_forecast(48.8566, 2.3522, client=fake_client)
+    assert fake_client.weather_api.call_count == 2
+
+
+def test_run_cycle_spreads_batches(app, favorites, fake_client):
+    """Test that batches are spread over the refresh period instead of sent in one burst."""
+    weather_api.configure_cache(ttls={"current": 2, "forecast": 2})
+    warmer = CacheWarmer(app, client=fake_client, lead_time=1, batch_size=2)
+    call_times = []
+
+    def timed_weather_api(url, params, **kwargs):
+        call_times.append(time.monotonic())
+        return fake_weather_api(url, params)
+
+    fake_client.weather_api.side_effect = timed_weather_api
+
+    warmer.run_cycle()
+
+    assert warmer.stats()["batches"] == 2
+    assert call_times[-1] - call_times[0] >= 0.45  # Second batch starts half a period later
+
+
+def test_cache_warmer_status_route(client):
+    """Test that the warmer statistics are exposed."""
+    response = client.get("/api/health/cache-warmer")
+    assert response.status_code == 200
+    assert response.get_json()["cache_warmer"]["running"] is False
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from db import configure_sqlite_pragmas
+from query_stats import instrument_engine, track_queries
+
+
+def test_sqlite_pragmas_apply_to_every_connection(tmp_path):
+    """Test that the pragmas are set on each new connection of a file database."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    configure_sqlite_pragmas(engine, {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000})
+
+    with engine.connect() as first, engine.connect() as second:
+        for connection in (first, second):
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+
+def test_failed_statements_are_timed_and_cleaned_up():
+    """Test that a failing statement is recorded and leaves no start time behind on its connection."""
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+
+    with engine.connect() as connection, track_queries() as stats:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing_table"))
+        connection.execute(text("SELECT 1"))
+        assert connection.info["query_start"] == {}
+
+    assert stats.count == 2
+    engine.dispose()
+
@@ -4,6 +4,7 @@ import pytest
 from unittest.mock import patch
 from models.user_model import Users
 from models.favourite_location import FavoriteLocation
+from models.location import Location
 from sqlalchemy.exc import IntegrityError
 
 
@@ -194,4 +195,61 @@ def test_get_forecast_details_not_found(session):
         FavoriteLocation.get_forecast_details(favorite_id=999, user_id=user.id)
 
     # Assertions
-    assert "not found" in str(exc_info.value)
\ No newline at end of file
+    assert "not found" in str(exc_info.value)
+
+def test_add_favorite_location_duplicate_is_single_insert(session):
+    """
+    Test that a duplicate favorite is rejected by the unique index, leaving the session usable.
+    """
+    user = Users.create_user("testuser", "password123")
+    FavoriteLocation.create_favorite(user.id, "Paris", 48.8566, 2.3522)
+
+    with pytest.raises(ValueError, match="already exists"):
+        FavoriteLocation.create_favorite(user.id, "Paris", 48.8566, 2.3522)
+
+    # Same name at other coordinates is a different favorite
+    FavoriteLocation.create_favorite(user.id, "Paris", 33.6609, -95.5555)
+    assert len(FavoriteLocation.get_all_favorites(user.id)) == 2
+
+
+def test_favorite_location_indexes(session):
+    """
+    Test that favorite_locations is indexed by user and unique per user and location.
+    """
+    indexes = {index.name: index for index in FavoriteLocation.__table__.indexes}
+    assert [column.name for column in indexes['ix_favorite_locations_user_id'].columns] == ['user_id']
+    unique = indexes['uq_favorite_locations_user_location']
+    assert unique.unique
+    assert [column.name for column in unique.columns] == ['user_id', 'location_id']
+
+
+def test_favorites_share_locations(session):
+    """
+    Test that users favoriting the same place share one location row, whatever geocoder noise.
+    """
+    user = Users.create_user("testuser", "password123")
+    other = Users.create_user("otheruser", "password123")
+
+    fav = FavoriteLocation.create_favorite(user.id, "Boston", 42.36008, -71.05888)
+    other_fav = FavoriteLocation.create_favorite(other.id, "Boston", 42.360081, -71.058881)
+
+    assert fav.location_id == other_fav.location_id
+    assert (other_fav.latitude, other_fav.longitude) == (42.3601, -71.0589)
+    assert Location.query.count() == 1
+
+
+def test_location_names_differing_in_case_or_spacing_share_a_location(session):
+    """
+    Test that names differing only by case or whitespace are one location, shown as first entered.
+    """
+    user = Users.create_user("testuser", "password123")
+    other = Users.create_user("otheruser", "password123")
+
+    fav = FavoriteLocation.create_favorite(user.id, "New York", 40.7128, -74.0060)
+    other_fav = FavoriteLocation.create_favorite(other.id, "  new   YORK ", 40.7128, -74.0060)
+
+    assert fav.location_id == other_fav.location_id
+    assert other_fav.location_name == "New York"
+    assert Location.query.count() == 1
+    with pytest.raises(ValueError, match="already exists"):
+        FavoriteLocation.create_favorite(user.id, "NEW YORK", 40.7128, -74.0060)
@@ -0,0 +1,130 @@
+import io
+import threading
+
+import pytest
+import requests
+import urllib3
+
+from metrics import REGISTRY, Counter, Histogram
+from resilience import GuardedAdapter, configure_resilience
+from weather_api import MeteredCachedSession
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    """Start every test with empty metrics, breakers and retry budgets."""
+    REGISTRY.clear()
+    configure_resilience()
+    yield
+    REGISTRY.clear()
+
+
+@pytest.fixture
+def upstream_status(monkeypatch):
+    """Answer every upstream call with the status code in the returned list."""
+    status = [200]
+
+    def send(self, request, **kwargs):
+        raw = urllib3.HTTPResponse(body=io.BytesIO(b'{}'), headers={'Content-Type': 'application/json'},
+                                   status=status[0], preload_content=False, request_url=request.url)
+        return self.build_response(request, raw)
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", send)
+    return status
+
+
+##########################################################
+# Metric Types
+##########################################################
+
+def test_histogram_renders_cumulative_buckets():
+    """Test that a histogram renders cumulative buckets, sum and count per label set."""
+    histogram = Histogram("job_seconds", "Job time.", ("job",), buckets=(0.1, 1))
+    histogram.observe(0.05, job="a")
+    histogram.observe(0.5, job="a")
+    histogram.observe(5, job="a")
+
+    assert histogram.render() == [
+        '# HELP job_seconds Job time.',
+        '# TYPE job_seconds histogram',
+        'job_seconds_bucket{job="a",le="0.1"} 1',
+        'job_seconds_bucket{job="a",le="1"} 2',
+        'job_seconds_bucket{job="a",le="+Inf"} 3',
+        'job_seconds_sum{job="a"} 5.55',
+        'job_seconds_count{job="a"} 3',
+    ]
+
+
+def test_counter_is_safe_across_threads():
+    """Test that increments from concurrent threads are not lost."""
+    counter = Counter("events_total", "Events.", ("kind",))
+
+    def work():
+        for _ in range(10000):
+            counter.inc(kind="x")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.value(kind="x") == 80000
+
+
+def test_metric_rejects_wrong_labels():
+    """Test that observations must carry exactly the declared labels."""
+    counter = Counter("events_total", "Events.", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+##########################################################
+# Collection Points
+##########################################################
+
+def test_metrics_route_reports_requests_by_route_and_status(client):
+    """Test that requests are counted and timed per route template and status."""
+    client.get("/api/health")
+    client.get("/api/favorites/12345/weather")  # No credentials
+    client.get("/no-such-page")
+
+    response = client.get("/api/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{route="/api/health",method="GET",status="200"} 1' in body
+    assert 'http_requests_total{route="/api/favorites/<int:favorite_id>/weather",method="GET",status="400"} 1' in body
+    assert 'http_requests_total{route="unmatched",method="GET",status="404"} 1' in body
+    assert 'http_request_duration_seconds_count{route="/api/health",method="GET",status="200"} 1' in body
+    assert 'db_query_duration_seconds_count' in body
+
+
+def test_upstream_latency_and_errors_are_recorded_per_host(upstream_status):
+    """Test that upstream calls are timed and failed ones counted per host and error."""
+    session = requests.Session()
+    session.mount("https://", GuardedAdapter())
+
+    session.get("https://upstream.test/v1")
+    upstream_status[0] = 503
+    session.get("https://upstream.test/v1")
+
+    body = REGISTRY.render()
+    assert 'upstream_request_duration_seconds_count{host="upstream.test"} 2' in body
+    assert 'upstream_errors_total{host="upstream.test",error="http_503"} 1' in body
+
+
+def test_http_cache_hits_and_misses_are_counted(upstream_status):
+    """Test that the requests_cache session counts its hits and misses per host."""
+    session = MeteredCachedSession("metrics-test", backend="memory", expire_after=60)
+    session.mount("https://", GuardedAdapter())
+
+    session.get("https://upstream.test/v1?lat=1")
+    session.get("https://upstream.test/v1?lat=1")
+    session.get("https://upstream.test/v1?lat=2")
+
+    body = REGISTRY.render()
+    assert 'http_cache_requests_total{host="upstream.test",result="hit"} 1' in body
+    assert 'http_cache_requests_total{host="upstream.test",result="miss"} 2' in body
+    assert 'upstream_request_duration_seconds_count{host="upstream.test"} 2' in body
@@ -0,0 +1,51 @@
+import hashlib
+
+import pytest
+
+from password_hashing import configure_password_hashing, hash_password, needs_rehash, verify_password
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing():
+    """Use cheap settings so the tests run quickly."""
+    configure_password_hashing(cost=1000)
+    yield
+    configure_password_hashing(cost=1000)
+
+
+@pytest.mark.parametrize("algorithm, cost", [("pbkdf2_sha256", 1000), ("scrypt", 10)])
+def test_hash_and_verify(algorithm, cost):
+    """Test that each supported KDF verifies the right password only."""
+    configure_password_hashing(algorithm=algorithm, cost=cost)
+    encoded = hash_password("password123")
+
+    assert encoded.startswith(f"{algorithm}${cost}$")
+    assert verify_password("password123", encoded)
+    assert not verify_password("wrong", encoded)
+
+
+def test_legacy_sha256_hash_still_verifies():
+    """Test that hashes from before the KDF change are accepted and flagged for rehashing."""
+    salt = "00" * 16
+    legacy = hashlib.sha256(("password123" + salt).encode()).hexdigest()
+
+    assert verify_password("password123", legacy, salt)
+    assert needs_rehash(legacy)
+
+
+def test_needs_rehash_when_cost_changes():
+    """Test that a hash made with an older cost is flagged for rehashing."""
+    encoded = hash_password("password123")
+    assert not needs_rehash(encoded)
+
+    configure_password_hashing(cost=2000)
+    assert needs_rehash(encoded)
+    assert verify_password("password123", encoded)
+
+
+def test_hashing_in_process_pool():
+    """Test that hashing off the calling thread gives the same result."""
+    inline = hash_password("password123", salt="ab" * 16)
+    configure_password_hashing(cost=1000, pool_size=1)
+
+    assert hash_password("password123", salt="ab" * 16) == inline
@@ -0,0 +1,220 @@
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
+
+import weather_api
+from models.favourite_location import FavoriteLocation
+from models.user_model import Users
+from resilience import (CLOSED, HALF_OPEN, OPEN, BudgetedRetry, CircuitBreaker, CircuitOpenError, DeadlineExceeded,
+                        GuardedAdapter, RetryBudget, bounded_timeout, configure_resilience, end_deadline, find_cause,
+                        get_breaker, get_retry_budget, start_deadline)
+
+
+@pytest.fixture(autouse=True)
+def resilience():
+    """Start every test with fresh breakers and retry budgets."""
+    configure_resilience(failure_threshold=2, recovery_timeout=30)
+    yield
+    configure_resilience()
+
+
+##########################################################
+# Circuit Breaker
+##########################################################
+
+def test_breaker_opens_after_consecutive_failures():
+    """Test that the circuit opens at the failure threshold and then fails fast."""
+    breaker = CircuitBreaker("example.com", failure_threshold=2, recovery_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as exc_info:
+        breaker.before_call()
+    assert 0 < exc_info.value.retry_after <= 30
+
+
+def test_breaker_half_open_allows_one_trial_call():
+    """Test that after the recovery timeout a single trial call decides whether the circuit closes."""
+    breaker = CircuitBreaker("example.com", failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure()
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_breaker_reopens_when_trial_call_fails():
+    """Test that a failed trial call re-opens the circuit."""
+    breaker = CircuitBreaker("example.com", failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+##########################################################
+# Retry Budget
+##########################################################
+
+def test_retry_budget_caps_retries_to_ratio_of_calls():
+    """Test that retries beyond the minimum are limited to a fraction of the calls."""
+    budget = RetryBudget(ratio=0.1, min_retries=2, window=60)
+    for _ in range(30):
+        budget.record_call()
+
+    allowed = sum(budget.try_retry() for _ in range(10))
+
+    assert allowed == 3
+
+
+def test_exhausted_retries_leave_the_budget_untouched():
+    """Test that a call out of retries does not take a retry from its host's budget."""
+    pool = MagicMock(host="upstream.test")
+    with pytest.raises(MaxRetryError):
+        BudgetedRetry(total=0).increment("GET", "/v1", error=ConnectTimeoutError("timed out"), _pool=pool)
+    BudgetedRetry(total=1).increment("GET", "/v1", error=ConnectTimeoutError("timed out"), _pool=pool)
+
+    # One retry taken out of the 10 allowed per window
+    assert sum(get_retry_budget("upstream.test").try_retry() for _ in range(20)) == 9
+
+
+##########################################################
+# Guarded Adapter
+##########################################################
+
+def test_adapter_applies_default_timeout_and_records_failures(monkeypatch):
+    """Test that requests get the default timeout and server errors count against the circuit."""
+    sent = []
+
+    def send(self, request, **kwargs):
+        sent.append(kwargs["timeout"])
+        response = requests.Response()
+        response.status_code = 503
+        return response
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", send)
+    session = requests.Session()
+    session.mount("https://", GuardedAdapter(timeout=(1, 2)))
+
+    for _ in range(2):
+        session.get("https://upstream.test/v1")
+    with pytest.raises(CircuitOpenError):
+        session.get("https://upstream.test/v1")
+
+    assert sent == [(1, 2), (1, 2)]
+    assert get_breaker("upstream.test").state == OPEN
+
+
+def test_find_cause_unwraps_wrapped_errors():
+    """Test that the breaker's error is found behind a client library's wrapper."""
+    circuit_error = CircuitOpenError("upstream.test", 10)
+    try:
+        try:
+            raise circuit_error
+        except CircuitOpenError as e:
+            raise RuntimeError("request failed") from e
+    except RuntimeError as wrapped:
+        assert find_cause(wrapped, (CircuitOpenError,)) is circuit_error
+    assert find_cause(ValueError("bad input"), (CircuitOpenError,)) is None
+
+
+##########################################################
+# Deadlines
+##########################################################
+
+def test_bounded_timeout_shrinks_to_deadline():
+    """Test that upstream timeouts never outlast the request deadline."""
+    token = start_deadline(0.5)
+    try:
+        connect, read = bounded_timeout((3.05, 10))
+    finally:
+        end_deadline(token)
+
+    assert 0 < connect <= 0.5 and 0 < read <= 0.5
+    assert bounded_timeout((3.05, 10)) == (3.05, 10)
+
+
+def test_adapter_fails_fast_after_deadline(monkeypatch):
+    """Test that no upstream call is made once the deadline has passed, and the circuit is unaffected."""
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", MagicMock())
+    session = requests.Session()
+    session.mount("https://", GuardedAdapter())
+
+    token = start_deadline(0)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            session.get("https://upstream.test/v1")
+    finally:
+        end_deadline(token)
+
+    requests.adapters.HTTPAdapter.send.assert_not_called()
+    assert get_breaker("upstream.test").state == CLOSED
+
+
+def test_fan_out_tasks_share_the_deadline():
+    """Test that fan-out tasks see the caller's deadline."""
+    token = start_deadline(0)
+    try:
+        results = weather_api.fan_out(lambda n: weather_api.check_deadline("work"), [(1,), (2,)], host="upstream.test")
+    finally:
+        end_deadline(token)
+
+    assert all(isinstance(result, DeadlineExceeded) for result in results)
+
+
+def test_route_returns_504_when_deadline_passes(client, session, monkeypatch):
+    """Test that a request running out of time gets a 504 rather than a generic error."""
+    def slow(lat, lon, start, end, client=None, layout="records"):
+        raise DeadlineExceeded("processing historical weather")
+
+    user = Users.create_user("testuser", "password123")
+    favorite = FavoriteLocation.create_favorite(user.id, "London", 51.5, -0.1)
+    monkeypatch.setattr(weather_api, "get_historical_weather", slow)
+
+    response = client.get(f"/api/favorites/{favorite.id}/historical?username=testuser&password=password123"
+                          "&start_date=2024-01-01&end_date=2024-01-07")
+
+    assert response.status_code == 504
+
+
+##########################################################
+# Fallbacks
+##########################################################
+
+def test_stale_weather_served_when_upstream_fails(monkeypatch):
+    """Test that an expired cache entry is served, marked stale, when the refresh fails."""
+    weather_api.configure_cache(ttls={"current": 0}, stale_grace={"current": 0})
+    client = MagicMock()
+    client.weather_api.side_effect = [[MagicMock()], RuntimeError("upstream down")]
+    monkeypatch.setattr(weather_api, "_parse_current_weather", lambda response: {"temperature": 20.0})
+
+    weather_api.get_current_weather(51.5, -0.1, client=client)
+    weather = weather_api.get_current_weather(51.5, -0.1, client=client)
+
+    assert weather["temperature"] == 20.0
+    assert weather["cache"]["stale"] is True
+
+
+def test_route_returns_503_while_circuit_is_open(client, session, monkeypatch):
+    """Test that an open circuit turns into a 503 with a Retry-After header."""
+    def fail(city):
+        raise CircuitOpenError("api.openweathermap.org", 12.4)
+
+    Users.create_user("testuser", "password123")
+    monkeypatch.setattr(weather_api, "get_coordinates", fail)
+
+    response = client.post("/api/favorites", json={
+        "username": "testuser", "password": "password123", "location_name": "London"
+    })
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
@@ -0,0 +1,128 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app import create_app
+from config import TestConfig
+from db import db
+from models.favourite_location import FavoriteLocation
+from models.geocode_cache import GeocodeCache
+from schema_upgrades import upgrade_favorite_locations, upgrade_geocode_cache, upgrade_location_names
+
+
+def old_schema_engine(path):
+    """Create a database with the favorite_locations table as it was before the shared locations table."""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80))"))
+        conn.execute(text(
+            "CREATE TABLE favorite_locations (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), "
+            "location_name VARCHAR(100) NOT NULL, latitude FLOAT NOT NULL, longitude FLOAT NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_favorite_locations_user_id ON favorite_locations (user_id)"))
+        conn.execute(text("CREATE UNIQUE INDEX uq_favorite_locations_user_location "
+                          "ON favorite_locations (user_id, location_name, latitude, longitude)"))
+        conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'alice'), (2, 'bob')"))
+        conn.execute(text(
+            "INSERT INTO favorite_locations (id, user_id, location_name, latitude, longitude) VALUES "
+            "(1, 1, 'Boston', 42.36008, -71.05888), "
+            "(2, 2, 'Boston', 42.360081, -71.058881), "  # Same place for another user
+            "(3, 1, 'Paris', 48.8566, 2.3522), "
+            "(4, 1, 'Boston', 42.360079, -71.05888)"  # Same place again for the same user
+        ))
+    return engine
+
+
+def test_upgrade_moves_favorites_to_shared_locations(tmp_path):
+    """Test that every distinct place becomes one location and favorites keep their IDs."""
+    engine = old_schema_engine(tmp_path / "app.db")
+
+    assert upgrade_favorite_locations(engine) is True
+
+    with engine.connect() as conn:
+        locations = conn.execute(text("SELECT id, name, latitude, longitude FROM locations ORDER BY id")).all()
+        favorites = conn.execute(text("SELECT id, user_id, location_id FROM favorite_locations ORDER BY id")).all()
+    assert [tuple(row[1:]) for row in locations] == [("Boston", 42.3601, -71.0589), ("Paris", 48.8566, 2.3522)]
+    boston, paris = locations[0].id, locations[1].id
+    assert [tuple(row) for row in favorites] == [(1, 1, boston), (2, 2, boston), (3, 1, paris)]
+    indexes = {index["name"] for index in inspect(engine).get_indexes("favorite_locations")}
+    assert {"ix_favorite_locations_user_id", "uq_favorite_locations_user_location"} <= indexes
+    engine.dispose()
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    """Test that an upgraded database is left as it is."""
+    engine = old_schema_engine(tmp_path / "app.db")
+    upgrade_favorite_locations(engine)
+    assert upgrade_favorite_locations(engine) is False
+    engine.dispose()
+
+
+def test_app_reads_upgraded_favorites(tmp_path):
+    """Test that favorites stored with the old schema are served after create_app upgrades the database."""
+    path = tmp_path / "app.db"
+    old_schema_engine(path).dispose()
+
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+
+    with create_app(FileConfig).app_context():
+        assert [(fav.location_name, fav.latitude) for fav in FavoriteLocation.get_all_favorites(1)] == \
+            [("Boston", 42.3601), ("Paris", 48.8566)]
+        db.engine.dispose()
+
+
+def test_location_names_upgrade_merges_case_variants(tmp_path):
+    """Test that locations differing only by the case or spacing of their name are merged with their favorites."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80))"))
+        conn.execute(text("CREATE TABLE locations (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, "
+                          "latitude FLOAT NOT NULL, longitude FLOAT NOT NULL)"))
+        conn.execute(text("CREATE UNIQUE INDEX uq_locations_name_coordinates ON locations (name, latitude, longitude)"))
+        conn.execute(text(
+            "CREATE TABLE favorite_locations (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), "
+            "location_id INTEGER NOT NULL REFERENCES locations (id))"
+        ))
+        conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'alice'), (2, 'bob')"))
+        conn.execute(text(
+            "INSERT INTO locations (id, name, latitude, longitude) VALUES "
+            "(1, 'Boston', 42.3601, -71.0589), (2, 'boston ', 42.3601, -71.0589), (3, 'Paris', 48.8566, 2.3522)"
+        ))
+        conn.execute(text(
+            "INSERT INTO favorite_locations (id, user_id, location_id) VALUES "
+            "(1, 1, 2), (2, 2, 1), (3, 1, 1), (4, 1, 3)"  # alice has both Boston rows
+        ))
+
+    assert upgrade_location_names(engine) is True
+    assert upgrade_location_names(engine) is False
+
+    with engine.connect() as conn:
+        locations = conn.execute(text("SELECT id, name, normalized_name FROM locations ORDER BY id")).all()
+        favorites = conn.execute(text("SELECT id, user_id, location_id FROM favorite_locations ORDER BY id")).all()
+    assert [tuple(row) for row in locations] == [(1, "Boston", "boston"), (3, "Paris", "paris")]
+    assert [tuple(row) for row in favorites] == [(1, 1, 1), (2, 2, 1), (4, 1, 3)]
+    indexes = {index["name"] for index in inspect(engine).get_indexes("locations")}
+    assert indexes == {"uq_locations_normalized_name_coordinates"}
+    engine.dispose()
+
+
+def test_geocode_cache_upgrade_keeps_entries(tmp_path):
+    """Test that the renamed geocode_cache column keeps its cached entries and can be queried."""
+    path = tmp_path / "app.db"
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE geocode_cache (query VARCHAR(200) PRIMARY KEY, latitude FLOAT, "
+                          "longitude FLOAT, expires_at DATETIME NOT NULL)"))
+        conn.execute(text("INSERT INTO geocode_cache VALUES ('boston', 42.36, -71.06, '2999-01-01 00:00:00')"))
+
+    assert upgrade_geocode_cache(engine) is True
+    assert upgrade_geocode_cache(engine) is False
+    engine.dispose()
+
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+
+    with create_app(FileConfig).app_context():
+        assert GeocodeCache.lookup("boston").latitude == 42.36
+        assert GeocodeCache.query.filter_by(normalized_query="boston").count() == 1
+        db.engine.dispose()
+
@@ -1,3 +1,5 @@
+import hashlib
+
 import pytest
 
 from models.user_model import Users
@@ -22,7 +24,8 @@ def test_create_user(session, sample_user):
     assert user is not None, "User should be created in the database."
     assert user.username == sample_user["username"], "Username should match the input."
     assert len(user.salt) == 32, "Salt should be 32 characters (hex)."
-    assert len(user.password) == 64, "Password should be a 64-character SHA-256 hash."
+    assert user.password.startswith("pbkdf2_sha256$"), "Password should be hashed with the configured KDF."
+    assert user.salt in user.password, "Password hash should embed its salt."
 
 def test_create_duplicate_user(session, sample_user):
     """Test attempting to create a user with a duplicate username."""
@@ -44,6 +47,16 @@ def test_check_password_incorrect(session, sample_user):
     Users.create_user(**sample_user)
     assert Users.check_password(sample_user["username"], "wrongpassword") is False, "Password should not match."
 
+def test_check_password_rehashes_legacy_hash(session, sample_user):
+    """Test that a legacy SHA-256 hash is replaced with a KDF hash on a successful check."""
+    user = Users.create_user(**sample_user)
+    user.password = hashlib.sha256((sample_user["password"] + user.salt).encode()).hexdigest()
+    session.commit()
+
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is True
+    assert user.password.startswith("pbkdf2_sha256$"), "Password should be rehashed with the configured KDF."
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is True
+
 def test_check_password_user_not_found(session):
     """Test checking password for a non-existent user."""
     with pytest.raises(ValueError, match="User nonexistentuser not found"):
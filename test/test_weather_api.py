@@ -0,0 +1,652 @@
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy
+import pytest
+from unittest.mock import MagicMock, patch
+
+import weather_api
+from db import db
+from historical_store import HistoricalStore
+from models.geocode_cache import GeocodeCache
+from resilience import DeadlineExceeded, end_deadline, start_deadline
+from weather_cache import SingleFlight, WeatherCache
+
+
+class FakeVariable:
+    def __init__(self, value):
+        self._value = value
+
+    def Value(self):
+        return self._value
+
+
+class FakeCurrent:
+    def __init__(self, values, time=1700000000):
+        self._values = values
+        self._time = time
+
+    def Time(self):
+        return self._time
+
+    def Variables(self, index):
+        return FakeVariable(self._values[index])
+
+
+class FakeSeries:
+    def __init__(self, values):
+        self._values = values
+
+    def ValuesAsNumpy(self):
+        return numpy.array(self._values, dtype=numpy.float32)
+
+
+class FakeDaily:
+    def __init__(self, days, start=1704067200):
+        self._days = days
+        self._start = start
+
+    def Time(self):
+        return self._start
+
+    def TimeEnd(self):
+        return self._start + self._days * 86400
+
+    def Interval(self):
+        return 86400
+
+    def Variables(self, index):
+        return FakeSeries([float(index + day) for day in range(self._days)])
+
+
+class FakeResponse:
+    def __init__(self, lat, lon, current_values=None, days=7, start=1704067200):
+        self._lat = lat
+        self._lon = lon
+        self._current = FakeCurrent(current_values or [20.0, 50.0, 0.0, 0.0, 0.0, 0.0, 5.0])
+        self._daily = FakeDaily(days, start)
+
+    def Latitude(self):
+        return self._lat
+
+    def Longitude(self):
+        return self._lon
+
+    def Elevation(self):
+        return 10.0
+
+    def Timezone(self):
+        return b"GMT"
+
+    def UtcOffsetSeconds(self):
+        return 0
+
+    def TimezoneAbbreviation(self):
+        return b"GMT"
+
+    def Current(self):
+        return self._current
+
+    def Daily(self):
+        return self._daily
+
+
+def fake_weather_api(url, params, **kwargs):
+    """Answer single- and multi-location requests; a latitude above 90 is rejected like upstream does."""
+    lats, lons = params["latitude"], params["longitude"]
+    if not isinstance(lats, list):
+        lats, lons = [lats], [lons]
+    if any(lat > 90 for lat in lats):
+        raise ValueError("Latitude must be in range of -90 to 90°.")
+    if "start_date" in params:
+        start, end = date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])
+        start_time = (start - date(1970, 1, 1)).days * 86400
+        return [FakeResponse(lat, lon, days=(end - start).days + 1, start=start_time) for lat, lon in zip(lats, lons)]
+    return [FakeResponse(lat, lon, days=params.get("forecast_days", 7)) for lat, lon in zip(lats, lons)]
+
+
+@pytest.fixture(autouse=True)
+def weather_cache():
+    """Give every test an empty weather cache and historical store."""
+    weather_api.configure_historical_store()
+    return weather_api.configure_cache()
+
+
+@pytest.fixture
+def geocoder():
+    """Replace OpenWeather's geocoding API; 'Atlantis' is unknown."""
+    def get(url, params, **kwargs):
+        response = MagicMock()
+        response.json.return_value = [] if params["q"] == "Atlantis" else [{"lat": 51.5072, "lon": -0.1276}]
+        return response
+
+    with patch.object(weather_api.get_openweather_session(), "get", side_effect=get) as mock_get:
+        yield mock_get
+
+
+@pytest.fixture
+def fake_client():
+    client = MagicMock()
+    client.weather_api.side_effect = fake_weather_api
+    return client
+
+
+##########################################################
+# Client
+##########################################################
+
+def test_build_client_pools_connections():
+    """Test that the built client mounts a sized connection pool with retries."""
+    client = weather_api.build_client(cache_backend="memory", pool_size=4, retries=2)
+    adapter = client._session.get_adapter("https://api.open-meteo.com/v1/forecast")
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 2
+
+
+def test_close_connections_closes_http_cache_databases(tmp_path):
+    """Test that the SQLite connections of the HTTP cache are closed before a fork and reopen on use."""
+    client = weather_api.build_client(cache_name=str(tmp_path / "http_cache"), cache_backend="sqlite")
+    cache = client._session.cache
+    for table in (cache.responses, cache.redirects):
+        with table.connection():
+            pass
+
+    weather_api.close_connections(client)
+
+    assert cache.responses._connection is None and cache.redirects._connection is None
+    assert len(cache.responses) == 0  # Reopened lazily
+
+
+def test_create_app_builds_client(app):
+    """Test that create_app builds the shared client from the app config."""
+    client = app.extensions["openmeteo"]
+    adapter = client._session.get_adapter("https://api.open-meteo.com/v1/forecast")
+    assert adapter._pool_maxsize == app.config["OPENMETEO_POOL_SIZE"]
+
+
+##########################################################
+# Geocoding
+##########################################################
+
+def test_get_coordinates_caches_normalized_query(app, geocoder):
+    """Test that a location seen before costs no external call, whatever its spelling."""
+    weather_api.configure_geocode_cache()
+    assert weather_api.get_coordinates("London") == (51.5072, -0.1276)
+    assert weather_api.get_coordinates("  london ") == (51.5072, -0.1276)
+    assert geocoder.call_count == 1
+
+
+def test_get_coordinates_survives_restart(app, geocoder):
+    """Test that the geocode_cache table answers once the in-memory tier is gone."""
+    weather_api.configure_geocode_cache()
+    weather_api.get_coordinates("London")
+    weather_api.configure_geocode_cache()
+    assert weather_api.get_coordinates("LONDON") == (51.5072, -0.1276)
+    assert geocoder.call_count == 1
+
+
+def test_get_coordinates_caches_not_found(app, geocoder):
+    """Test that unknown locations are negatively cached."""
+    weather_api.configure_geocode_cache()
+    for _ in range(2):
+        with pytest.raises(ValueError, match="not found"):
+            weather_api.get_coordinates("Atlantis")
+    assert geocoder.call_count == 1
+
+
+def test_get_coordinates_negative_entries_expire(app, geocoder):
+    """Test that a "not found" is only cached for the negative TTL."""
+    weather_api.configure_geocode_cache(negative_ttl=0)
+    for _ in range(2):
+        with pytest.raises(ValueError, match="not found"):
+            weather_api.get_coordinates("Atlantis")
+    assert geocoder.call_count == 2
+
+
+def test_get_coordinates_batch_geocodes_each_query_once(app, geocoder):
+    """Test that a batch geocodes only uncached queries, once per normalized spelling, keeping the order."""
+    weather_api.configure_geocode_cache()
+    weather_api.get_coordinates("London")
+    geocoder.reset_mock()
+
+    results = weather_api.get_coordinates_batch(["LONDON", "Paris", " paris", "Atlantis"])
+
+    assert results[:3] == [(51.5072, -0.1276)] * 3
+    assert isinstance(results[3], ValueError)
+    assert sorted(call.kwargs["params"]["q"] for call in geocoder.call_args_list) == ["Atlantis", "Paris"]
+    # Fetched results are cached like single lookups
+    assert weather_api.get_coordinates("paris") == (51.5072, -0.1276)
+    assert geocoder.call_count == 2
+
+
+def test_get_coordinates_batch_stores_results_in_one_commit(app, geocoder, monkeypatch):
+    """Test that the geocode_cache rows of a batch are written in a single transaction."""
+    weather_api.configure_geocode_cache()
+    commits = []
+    commit = db.session.commit
+    monkeypatch.setattr(db.session, "commit", lambda: commits.append(1) or commit())
+
+    weather_api.get_coordinates_batch(["London", "Paris", "Atlantis"])
+
+    assert len(commits) == 1
+    assert GeocodeCache.query.count() == 3
+
+
+##########################################################
+# Current Weather
+##########################################################
+
+def test_get_current_weather_uses_given_client(fake_client):
+    """Test that get_current_weather makes exactly one call on the injected client."""
+    weather = weather_api.get_current_weather(40.7, -74.0, client=fake_client)
+    assert fake_client.weather_api.call_count == 1
+    assert weather["current_weather"]["temperature"] == 20.0
+    assert weather["current_weather"]["windspeed"] == 5.0
+
+
+def test_get_current_weather_batch_chunks_requests(fake_client):
+    """Test that many locations are fetched in chunked multi-location requests."""
+    coords = {favorite_id: (float(favorite_id), 10.0) for favorite_id in range(1, 6)}
+    results = weather_api.get_current_weather_batch(coords, client=fake_client, chunk_size=2)
+    assert fake_client.weather_api.call_count == 3
+    assert sorted(results) == [1, 2, 3, 4, 5]
+    assert all(results[favorite_id]["coordinates"]["latitude"] == float(favorite_id) for favorite_id in coords)
+
+
+def test_get_current_weather_batch_deduplicates_locations(fake_client):
+    """Test that favorites sharing coordinates are requested once and mapped back to every ID."""
+    results = weather_api.get_current_weather_batch({1: (51.5, -0.1), 2: (51.5, -0.1)}, client=fake_client)
+    params = fake_client.weather_api.call_args.kwargs["params"]
+    assert params["latitude"] == [51.5]
+    assert results[1] is results[2]
+
+
+def test_iter_current_weather_batch_releases_claims_when_closed_early(fake_client):
+    """Test that a consumer stopping after a cached entry leaves no identical call waiting forever."""
+    weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+    batch = weather_api.iter_current_weather_batch({1: (51.5, -0.1), 2: (48.9, 2.4)}, client=fake_client)
+
+    assert next(batch)[0] == 1
+    batch.close()
+
+    assert weather_api._in_flight.in_flight() == 0
+
+
+def test_iter_current_weather_batch_resolves_chunk_before_yielding(fake_client):
+    """Test that a fetched chunk is released to followers before its first entry is handed out."""
+    batch = weather_api.iter_current_weather_batch({1: (51.5, -0.1), 2: (48.9, 2.4)}, client=fake_client)
+
+    next(batch)
+
+    assert weather_api._in_flight.in_flight() == 0
+    batch.close()
+
+
+def test_get_current_weather_batch_isolates_bad_location(fake_client):
+    """Test that one rejected location only produces an error for its own key."""
+    results = weather_api.get_current_weather_batch({1: (51.5, -0.1), 2: (99.0, 0.0)}, client=fake_client)
+    assert results[1]["current_weather"]["temperature"] == 20.0
+    assert isinstance(results[2], Exception)
+
+
+def test_get_current_weather_batch_uses_cache(fake_client):
+    """Test that cached cells are not requested again."""
+    weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+    results = weather_api.get_current_weather_batch({1: (51.5, -0.1), 2: (48.9, 2.4)}, client=fake_client)
+    assert fake_client.weather_api.call_count == 2
+    assert fake_client.weather_api.call_args.kwargs["params"]["latitude"] == [48.9]
+    assert sorted(results) == [1, 2]
+
+
+def test_iter_current_weather_batch_yields_cached_first(fake_client):
+    """Test that cached locations are handed out before any upstream call is made."""
+    weather_api.get_current_weather(48.9, 2.4, client=fake_client)
+    fake_client.weather_api.reset_mock()
+
+    results = weather_api.iter_current_weather_batch({1: (51.5, -0.1), 2: (48.9, 2.4)}, client=fake_client)
+    first_key, _ = next(results)
+
+    assert first_key == 2
+    assert fake_client.weather_api.call_count == 0
+    assert [key for key, _ in results] == [1]
+
+
+##########################################################
+# Forecast and Historical Weather
+##########################################################
+
+def test_get_forecast_returns_one_record_per_day(fake_client):
+    """Test that each day gets its own date and values."""
+    forecast = weather_api.get_forecast(51.5, -0.1, days=3, client=fake_client)
+
+    days = forecast["daily_forecast"]
+    assert [day["date"] for day in days] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert [day["temperature_2m_min"] for day in days] == [1.0, 2.0, 3.0]
+
+
+def test_get_historical_weather_columnar_layout(fake_client):
+    """Test that the columnar layout has one list per variable, with None for missing values."""
+    def weather_api_with_gap(url, params, **kwargs):
+        response = FakeResponse(params["latitude"], params["longitude"], days=2)
+        response.Daily().Variables = lambda index: FakeSeries([1.0, float("nan")])
+        return [response]
+
+    fake_client.weather_api.side_effect = weather_api_with_gap
+    historical = weather_api.get_historical_weather(51.5, -0.1, "2024-01-01", "2024-01-02",
+                                                    client=fake_client, layout="columnar")
+
+    columns = historical["historical_weather"]
+    assert columns["date"] == ["2024-01-01", "2024-01-02"]
+    assert columns["wind_speed_10m_max"] == [1.0, None]
+
+
+def test_historical_weather_fetches_only_missing_days(fake_client):
+    """Test that overlapping ranges are served from the historical store, fetching only the gaps."""
+    weather_api.get_historical_weather(51.5, -0.1, "2024-01-10", "2024-01-20", client=fake_client)
+    historical = weather_api.get_historical_weather(51.5, -0.1, "2024-01-05", "2024-01-25", client=fake_client)
+
+    ranges = [(call.kwargs["params"]["start_date"], call.kwargs["params"]["end_date"])
+              for call in fake_client.weather_api.call_args_list]
+    assert ranges == [("2024-01-10", "2024-01-20"), ("2024-01-05", "2024-01-09"), ("2024-01-21", "2024-01-25")]
+    dates = [day["date"] for day in historical["historical_weather"]]
+    assert dates == [(date(2024, 1, 5) + timedelta(days=n)).isoformat() for n in range(21)]
+
+
+def test_historical_weather_refetches_unsettled_days(fake_client):
+    """Test that days too recent to be settled are fetched on every call, and historical data is not kept in the weather cache."""
+    end = weather_api.get_historical_store().settled_until() + timedelta(days=2)
+    start = (end - timedelta(days=5)).isoformat()
+
+    weather_api.get_historical_weather(51.5, -0.1, start, end.isoformat(), client=fake_client)
+    weather_api.get_historical_weather(51.5, -0.1, start, end.isoformat(), client=fake_client)
+
+    ranges = [(call.kwargs["params"]["start_date"], call.kwargs["params"]["end_date"])
+              for call in fake_client.weather_api.call_args_list]
+    recent = ((end - timedelta(days=1)).isoformat(), end.isoformat())
+    assert ranges.count(recent) == 2
+    assert len(ranges) == 3  # The settled days only once
+    assert weather_api.get_weather_cache().stats()["entries"] == 0
+
+
+def test_historical_weather_loads_stored_cell_once(fake_client, tmp_path, monkeypatch):
+    """Test that a range served from the historical store decompresses the cell's file only once."""
+    weather_api.configure_historical_store(directory=str(tmp_path))
+    weather_api.get_historical_weather(51.5, -0.1, "2024-01-01", "2024-01-10", client=fake_client)
+    weather_api.configure_cache()
+
+    loads = []
+    load = HistoricalStore._load
+    monkeypatch.setattr(HistoricalStore, "_load", lambda self, cell: loads.append(cell) or load(self, cell))
+    historical = weather_api.get_historical_weather(51.5, -0.1, "2024-01-01", "2024-01-10", client=fake_client)
+
+    assert fake_client.weather_api.call_count == 1
+    assert len(loads) == 1
+    assert len(historical["historical_weather"]) == 10
+
+
+def test_historical_weather_fetches_long_ranges_in_chunks(fake_client):
+    """Test that a long range is fetched as concurrent chunks and joined back in order."""
+    weather_api.configure_historical_store(chunk_days=10)
+    historical = weather_api.get_historical_weather(51.5, -0.1, "2024-01-01", "2024-01-25",
+                                                    client=fake_client, layout="columnar")
+
+    ranges = sorted((call.kwargs["params"]["start_date"], call.kwargs["params"]["end_date"])
+                    for call in fake_client.weather_api.call_args_list)
+    assert ranges == [("2024-01-01", "2024-01-10"), ("2024-01-11", "2024-01-20"), ("2024-01-21", "2024-01-25")]
+    assert historical["historical_weather"]["date"] == [(date(2024, 1, 1) + timedelta(days=n)).isoformat() for n in range(25)]
+
+
+def test_historical_weather_retries_failed_chunk_alone(fake_client):
+    """Test that only the chunk that failed is fetched again."""
+    weather_api.configure_historical_store(chunk_days=10)
+    failures = ["2024-01-11"]
+
+    def flaky_weather_api(url, params, **kwargs):
+        if params["start_date"] in failures:
+            failures.remove(params["start_date"])
+            raise RuntimeError("upstream hiccup")
+        return fake_weather_api(url, params)
+
+    fake_client.weather_api.side_effect = flaky_weather_api
+    historical = weather_api.get_historical_weather(51.5, -0.1, "2024-01-01", "2024-01-25",
+                                                    client=fake_client, layout="columnar")
+
+    starts = [call.kwargs["params"]["start_date"] for call in fake_client.weather_api.call_args_list]
+    assert sorted(starts) == ["2024-01-01", "2024-01-11", "2024-01-11", "2024-01-21"]
+    assert len(historical["historical_weather"]["date"]) == 25
+
+
+def test_historical_store_persists_settled_days_only(tmp_path):
+    """Test that settled days survive a restart while recent days are never stored."""
+    store = HistoricalStore(str(tmp_path), ["temperature_2m_max"], settle_days=2)
+    today = store.settled_until() + timedelta(days=2)
+    days = numpy.arange(numpy.datetime64(today - timedelta(days=3), 'D'), numpy.datetime64(today, 'D') + 1)
+    store.merge((51.5, -0.1), {"date": days, "temperature_2m_max": numpy.arange(4, dtype=numpy.float32)}, {"elevation": 10.0})
+
+    reopened = HistoricalStore(str(tmp_path), ["temperature_2m_max"], settle_days=2)
+    arrays, meta = reopened.read((51.5, -0.1), days[0].astype(date), today)
+
+    assert arrays["temperature_2m_max"].tolist() == [0.0, 1.0]
+    assert meta == {"elevation": 10.0}
+    assert reopened.missing_ranges((51.5, -0.1), days[0].astype(date), today) == [(today - timedelta(days=1), today)]
+
+
+def test_get_forecast_rejects_unknown_layout(fake_client):
+    """Test that an unknown layout is refused before any upstream call."""
+    with pytest.raises(ValueError):
+        weather_api.get_forecast(51.5, -0.1, client=fake_client, layout="rows")
+    fake_client.weather_api.assert_not_called()
+
+
+##########################################################
+# Weather Cache
+##########################################################
+
+def test_nearby_locations_share_cached_weather(fake_client, weather_cache):
+    """Test that locations in the same grid cell share one upstream call."""
+    first = weather_api.get_current_weather(51.5072, -0.1276, client=fake_client)
+    second = weather_api.get_current_weather(51.5123, -0.1301, client=fake_client)
+    assert fake_client.weather_api.call_count == 1
+    assert first["current_weather"] is second["current_weather"]
+    assert fake_client.weather_api.call_args.kwargs["params"]["latitude"] == 51.5
+    assert weather_cache.stats()["hits"]["current"] == 1
+    assert weather_cache.stats()["misses"]["current"] == 1
+
+
+def test_weather_cache_expires_entries(monkeypatch):
+    """Test that entries expire after the TTL for their kind of data."""
+    cache = WeatherCache(ttls={"current": 10})
+    now = [1000.0]
+    monkeypatch.setattr("weather_cache.time.monotonic", lambda: now[0])
+    cache.set("current", (51.5, -0.1), {"temperature": 20.0})
+    assert cache.get("current", (51.5, -0.1)) == {"temperature": 20.0}
+    now[0] += 11
+    assert cache.get("current", (51.5, -0.1)) is None
+
+
+def test_weather_cache_evicts_least_recently_used():
+    """Test that the least recently used entry is evicted when the cache is full."""
+    cache = WeatherCache(max_entries=2)
+    cache.set("current", (1.0, 1.0), "a")
+    cache.set("current", (2.0, 2.0), "b")
+    cache.get("current", (1.0, 1.0))
+    cache.set("current", (3.0, 3.0), "c")
+    assert cache.get("current", (2.0, 2.0)) is None
+    assert cache.get("current", (1.0, 1.0)) == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+##########################################################
+# Stale-while-revalidate
+##########################################################
+
+def test_expired_entry_served_stale_and_refreshed(fake_client, monkeypatch):
+    """Test that an entry within the grace window is served at once and refreshed in the background."""
+    now = [1000.0]
+    monkeypatch.setattr("weather_cache.time.monotonic", lambda: now[0])
+    weather_api.configure_cache(ttls={"current": 10}, stale_grace={"current": 60})
+
+    fresh = weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+    assert fresh["cache"] == {"age_seconds": 0, "stale": False}
+
+    now[0] += 20
+    stale = weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+    assert stale["cache"] == {"age_seconds": 20, "stale": True}
+
+    for _ in range(100):
+        if weather_api.get_weather_cache().lookup("current", (51.5, -0.1))[0] is not None:
+            break
+        time.sleep(0.01)
+    assert fake_client.weather_api.call_count == 2
+    assert weather_api.get_current_weather(51.5, -0.1, client=fake_client)["cache"]["stale"] is False
+
+
+def test_entry_past_grace_window_is_refetched(fake_client, monkeypatch):
+    """Test that data older than the grace window makes the caller wait for fresh data."""
+    now = [1000.0]
+    monkeypatch.setattr("weather_cache.time.monotonic", lambda: now[0])
+    weather_api.configure_cache(ttls={"current": 10}, stale_grace={"current": 60})
+
+    weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+    now[0] += 100
+    weather = weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+    assert weather["cache"]["stale"] is False
+    assert fake_client.weather_api.call_count == 2
+
+
+##########################################################
+# Single-flight
+##########################################################
+
+def test_concurrent_identical_calls_share_one_upstream_call(fake_client):
+    """Test that concurrent callers for the same cell wait on a single upstream call."""
+    release = threading.Event()
+
+    def slow_weather_api(url, params, **kwargs):
+        release.wait(1)
+        return fake_weather_api(url, params)
+
+    fake_client.weather_api.side_effect = slow_weather_api
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(weather_api.get_current_weather(51.5, -0.1, client=fake_client)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert fake_client.weather_api.call_count == 1
+    assert len(results) == 5
+    assert all(result["current_weather"] is results[0]["current_weather"] for result in results)
+
+
+def test_follower_calls_again_when_leader_runs_out_of_time(fake_client):
+    """Test that a follower with time left is not failed by the leader's request deadline."""
+    leading = threading.Event()
+
+    def weather_api_call(url, params, **kwargs):
+        if not leading.is_set():
+            leading.set()
+            time.sleep(0.1)  # Long enough for the follower to join the call
+            raise DeadlineExceeded("the call to 'api.open-meteo.com'")
+        return fake_weather_api(url, params)
+
+    def lead():
+        token = start_deadline(0.05)
+        try:
+            weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+        except DeadlineExceeded:
+            pass
+        finally:
+            end_deadline(token)
+
+    fake_client.weather_api.side_effect = weather_api_call
+    leader = threading.Thread(target=lead)
+    leader.start()
+    leading.wait(1)
+    token = start_deadline(5)
+    try:
+        result = weather_api.get_current_weather(51.5, -0.1, client=fake_client)
+    finally:
+        end_deadline(token)
+    leader.join()
+
+    assert result["current_weather"]["temperature"] == 20.0
+    assert fake_client.weather_api.call_count == 2
+
+
+def test_single_flight_shares_leader_error():
+    """Test that followers get the exception raised by the leader's call."""
+    flight = SingleFlight()
+    call, leader = flight.claim(("current", 1.0, 1.0))
+    follower_call, follower_leads = flight.claim(("current", 1.0, 1.0))
+    assert leader and not follower_leads
+    flight.resolve(("current", 1.0, 1.0), error=ValueError("upstream failed"))
+    with pytest.raises(ValueError, match="upstream failed"):
+        SingleFlight.wait(follower_call)
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_resolves_interrupted_leader():
+    """Test that followers are released with an error when the leader is interrupted."""
+    flight = SingleFlight()
+    key = ("current", 1.0, 1.0)
+
+    followers = []
+
+    def interrupted():
+        followers.append(flight.claim(key)[0])
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        flight.do(key, interrupted)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        SingleFlight.wait(followers[0], timeout=0.01)
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_follower_times_out():
+    """Test that a stuck leader cannot block followers forever."""
+    flight = SingleFlight()
+    flight.claim(("current", 1.0, 1.0))
+    with pytest.raises(TimeoutError):
+        flight.do(("current", 1.0, 1.0), lambda: "never called", timeout=0.01)
+
+
+##########################################################
+# Fan-out
+##########################################################
+
+def test_fan_out_keeps_order_and_isolates_errors():
+    """Test that results come back in call order with per-call exceptions."""
+    def half(value):
+        if value == 2:
+            raise ValueError("bad value")
+        return value / 2
+
+    results = weather_api.fan_out(half, [(1,), (2,), (4,)], host="example.com")
+    assert results[0] == 0.5
+    assert isinstance(results[1], ValueError)
+    assert results[2] == 2
+
+
+def test_fan_out_caps_calls_per_host():
+    """Test that no more than max_per_host calls run against one host at a time."""
+    weather_api.configure_fan_out(max_workers=8, max_per_host=2)
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def slow_call(_):
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.pop()
+
+    weather_api.fan_out(slow_call, [(i,) for i in range(8)], host="example.com")
+    assert max(peak) == 2
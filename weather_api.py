@@ -1,13 +1,26 @@
+import contextvars
 import os
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from urllib.parse import urlparse
 import requests
 import logging
 from dotenv import load_dotenv
+from flask import has_app_context
 
 import openmeteo_requests
 
 import requests_cache
-import pandas as pd
-from retry_requests import retry
+import numpy as np
+
+from historical_store import HistoricalStore
+from metrics import HTTP_CACHE_REQUESTS
+from models.geocode_cache import GeocodeCache
+from models.location import normalize_location_name
+from resilience import (BudgetedRetry, CircuitOpenError, DeadlineExceeded, GuardedAdapter, check_deadline, find_cause,
+                        time_remaining)
+from weather_cache import LRUCache, SingleFlight, WeatherCache
 
 
 load_dotenv()
@@ -16,36 +29,728 @@ logger = logging.getLogger(__name__)
 
 OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
 BASE_URL = "https://api.openweathermap.org"
+OPENWEATHER_HOST = urlparse(BASE_URL).hostname
+CURRENT_URL = "https://api.open-meteo.com/v1/forecast"
+OPEN_METEO_HOST = urlparse(CURRENT_URL).hostname
+# The order of variables is important to assign them correctly in _parse_current_weather
+CURRENT_VARIABLES = ["temperature_2m", "relative_humidity_2m", "precipitation", "rain", "showers", "snowfall", "wind_speed_10m"]
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+HISTORICAL_URL = "https://historical-forecast-api.open-meteo.com/v1/forecast"
+HISTORICAL_HOST = urlparse(HISTORICAL_URL).hostname
+# The order of variables is important to assign them correctly in _parse_daily
+DAILY_VARIABLES = ["temperature_2m_max", "temperature_2m_min", "apparent_temperature_max", "apparent_temperature_min", "daylight_duration", "precipitation_sum", "precipitation_probability_max", "wind_speed_10m_max"]
+# Shapes of daily series in responses: one dict per day, or one list per variable
+LAYOUTS = ("records", "columnar")
+
+_default_client = None
+_default_client_lock = threading.Lock()
+_openweather_session = None
+
+_weather_cache = None
+_in_flight = SingleFlight()
+_single_flight_timeout = 30
+_stale_grace = {}
+_geocode_cache = None
+_geocode_ttl = 30 * 24 * 3600
+_geocode_negative_ttl = 300
+_NOT_FOUND = object()  # Marks a cached "location not found"
+_historical_store = None
+_historical_chunk_days = 365
+_historical_chunk_retries = 1
+
+# Fan-out executor state, see configure_fan_out()
+_fan_out_lock = threading.Lock()
+_fan_out_executor = None
+_fan_out_max_per_host = 4
+_host_slots = {}
+_fan_out_state = threading.local()
+
+
+class MeteredCachedSession(requests_cache.CachedSession):
+    """
+    requests_cache session that counts its cache hits and misses per host in the HTTP cache metrics.
+    """
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        result = 'hit' if getattr(response, 'from_cache', False) else 'miss'
+        HTTP_CACHE_REQUESTS.inc(host=urlparse(request.url).hostname, result=result)
+        return response
+
+
+def build_client(cache_name: str = '.cache', cache_backend: str = 'sqlite', expire_after: int = 3600,
+                 pool_size: int = 10, retries: int = 5, backoff_factor: float = 0.2,
+                 timeout: tuple = (3.05, 10)) -> openmeteo_requests.Client:
+    """
+    Builds a long-lived Open-Meteo client backed by a cached, pooled HTTP session.
+
+    The client is meant to be created once per worker and shared by every request thread.
+    The underlying session keeps up to `pool_size` keep-alive connections per host and
+    retries failed requests with exponential backoff, within the host's retry budget.
+    Calls are guarded by a per-host circuit breaker (see resilience.GuardedAdapter).
+
+    Args:
+        cache_name (str): Name of the requests_cache cache (the SQLite file for the 'sqlite' backend).
+        cache_backend (str): The requests_cache backend to use ('sqlite', 'memory', ...).
+        expire_after (int): Number of seconds a cached response stays valid.
+        pool_size (int): Maximum number of pooled connections kept per upstream host.
+        retries (int): Maximum number of retries for a failed request.
+        backoff_factor (float): Backoff factor applied between retries.
+        timeout (tuple): Default (connect, read) timeouts in seconds.
+
+    Returns:
+        openmeteo_requests.Client: The Open-Meteo client.
+    """
+    cache_session = MeteredCachedSession(cache_name, backend=cache_backend, expire_after=expire_after)
+    _mount_guarded_adapter(cache_session, pool_size, retries, backoff_factor, timeout)
+    logger.info(f"Built Open-Meteo client (cache backend '{cache_backend}', pool size {pool_size})")
+    return openmeteo_requests.Client(session=cache_session)
+
+
+def build_openweather_session(pool_size: int = 4, retries: int = 2, backoff_factor: float = 0.2,
+                              timeout: tuple = (3.05, 10)) -> requests.Session:
+    """
+    Builds the pooled session used for OpenWeather's geocoding API and makes it the shared one.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections kept per upstream host.
+        retries (int): Maximum number of retries for a failed request.
+        backoff_factor (float): Backoff factor applied between retries.
+        timeout (tuple): Default (connect, read) timeouts in seconds.
+
+    Returns:
+        requests.Session: The OpenWeather session.
+    """
+    global _openweather_session
+    session = requests.Session()
+    _mount_guarded_adapter(session, pool_size, retries, backoff_factor, timeout)
+    _openweather_session = session
+    return session
+
+
+def _mount_guarded_adapter(session: requests.Session, pool_size: int, retries: int, backoff_factor: float,
+                           timeout: tuple) -> None:
+    """
+    Helper that mounts a pooled, retrying and circuit-guarded adapter on a session.
+    """
+    retry_policy = BudgetedRetry(
+        total=retries,
+        read=retries,
+        connect=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 504),
+        allowed_methods=None
+    )
+    adapter = GuardedAdapter(timeout=timeout, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry_policy)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+def get_client() -> openmeteo_requests.Client:
+    """
+    Returns the process-wide default Open-Meteo client, building it on first use.
+
+    Used when a fetch function is called without an explicit client, e.g. from scripts.
+
+    Returns:
+        openmeteo_requests.Client: The shared Open-Meteo client.
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = build_client()
+    return _default_client
+
+
+def get_openweather_session() -> requests.Session:
+    """
+    Returns the shared OpenWeather session, building it with the default settings on first use.
+
+    Returns:
+        requests.Session: The OpenWeather session.
+    """
+    if _openweather_session is None:
+        return build_openweather_session()
+    return _openweather_session
+
+
+def close_connections(*clients) -> None:
+    """
+    Closes the HTTP cache databases and pooled connections of Open-Meteo clients, the default client and the OpenWeather session.
+
+    Used before forking worker processes, which must not inherit them (a sqlite3 connection must
+    never be shared across a fork). The sessions stay usable and reopen them lazily.
+
+    Args:
+        *clients (openmeteo_requests.Client): Open-Meteo clients built with build_client().
+    """
+    sessions = [client._session for client in clients + (_default_client,) if client is not None]
+    if _openweather_session is not None:
+        sessions.append(_openweather_session)
+    for session in sessions:
+        if isinstance(session, requests_cache.CachedSession):
+            session.cache.close()  # The responses and redirects SQLite connections
+        session.close()  # Pooled connections of the mounted adapters
 
 
 def get_coordinates(city: str):
     """
     Fetches geographical coordinates (latitude and longitude) for a given city using OpenWeather's Geo API.
 
+    Results are cached in two tiers keyed on the normalized query: an in-memory LRU and, when an
+    application context is available, the persistent `geocode_cache` table. Unknown locations are
+    cached too, with a short time-to-live.
+
     Args:
         city (str): The name of the city to fetch coordinates for.
 
     Returns:
         tuple: A tuple containing latitude and longitude as floats.
 
+    Raises:
+        ValueError: If the location could not be found.
+        CircuitOpenError: If OpenWeather's circuit is open.
+        HTTPError: If the API request fails or returns an error.
+    """
+    query = normalize_location_query(city)
+    cached = _cached_coordinates(query)
+    if cached is None:
+        cached = _fetch_coordinates(city)
+        _store_coordinates(query, cached)
+    return _coordinates_or_error(city, cached)
+
+
+def get_coordinates_batch(cities: list) -> list:
+    """
+    Fetches the coordinates of many locations, geocoding the ones that are not cached concurrently.
+
+    Uses the same caches as get_coordinates(). Each distinct normalized query is looked up
+    once; the cache tiers are read and written on the calling thread, and only the calls to
+    OpenWeather run on the fan-out pool.
+
+    Args:
+        cities (list): The names of the locations.
+
+    Returns:
+        list: The (latitude, longitude) tuple of each location, or the Exception raised for it
+            (ValueError if it was not found), in the order of `cities`.
+    """
+    queries = [normalize_location_query(city) for city in cities]
+    resolved = {}
+    misses = {}
+    for city, query in zip(cities, queries):
+        if query in resolved or query in misses:
+            continue
+        cached = _cached_coordinates(query)
+        if cached is None:
+            misses[query] = city
+        else:
+            resolved[query] = cached
+
+    if misses:
+        logger.info(f"Geocoding {len(misses)} of {len(resolved) + len(misses)} locations with OpenWeather")
+        fetched = fan_out(_fetch_coordinates, [(city,) for city in misses.values()], host=OPENWEATHER_HOST)
+        geocoded = {}
+        for query, result in zip(misses, fetched):
+            if isinstance(result, Exception):
+                resolved[query] = _upstream_error(result)
+            else:
+                geocoded[query] = resolved[query] = result
+        _store_coordinates_many(geocoded)  # One geocode_cache transaction for the whole batch
+
+    results = []
+    for city, query in zip(cities, queries):
+        result = resolved[query]
+        if not isinstance(result, Exception):
+            try:
+                result = _coordinates_or_error(city, result)
+            except ValueError as e:
+                result = e
+        results.append(result)
+    return results
+
+
+def _cached_coordinates(query: str):
+    """
+    Helper that looks a normalized query up in the in-memory and persistent geocode caches.
+
+    Returns:
+        The cached (latitude, longitude) tuple, _NOT_FOUND, or None on a cache miss.
+    """
+    cache = get_geocode_cache()
+    cached = cache.get('found', (query,)) or cache.get('not_found', (query,))
+    if cached is None and has_app_context():
+        try:
+            entry = GeocodeCache.lookup(query)
+        except Exception as e:
+            logger.warning(f"Could not read the geocode cache table: {e}")
+            entry = None
+        if entry is not None:
+            cached = (entry.latitude, entry.longitude) if entry.found else _NOT_FOUND
+            cache.set('found' if entry.found else 'not_found', (query,), cached)
+    return cached
+
+
+def _store_coordinates(query: str, result) -> None:
+    """
+    Helper that caches a geocoding result, (latitude, longitude) or _NOT_FOUND, in both tiers.
+    """
+    _store_coordinates_many({query: result})
+
+
+def _store_coordinates_many(results: dict) -> None:
+    """
+    Helper that caches geocoding results by normalized query in both tiers, writing the table in one transaction.
+    """
+    rows = []
+    for query, result in results.items():
+        found = result is not _NOT_FOUND
+        get_geocode_cache().set('found' if found else 'not_found', (query,), result)
+        lat, lon = result if found else (None, None)
+        rows.append((query, lat, lon, _geocode_ttl if found else _geocode_negative_ttl))
+    if rows and has_app_context():
+        try:
+            GeocodeCache.store_many(rows)
+        except Exception as e:
+            logger.warning(f"Could not write the geocode cache table: {e}")
+
+
+def _coordinates_or_error(city: str, result) -> tuple:
+    """
+    Helper that returns cached coordinates, raising ValueError for a cached "not found".
+    """
+    if result is _NOT_FOUND:
+        logger.warning(f"Location '{city}' not found.")
+        raise ValueError(f"Location '{city}' not found.")
+    return result
+
+
+def _fetch_coordinates(city: str):
+    """
+    Helper that calls OpenWeather's direct geocoding API for a city.
+
+    Args:
+        city (str): The name of the city to fetch coordinates for.
+
+    Returns:
+        tuple: The (latitude, longitude) of the best match, or _NOT_FOUND if there is none.
+
     Raises:
         HTTPError: If the API request fails or returns an error.
-        KeyError: If the response does not contain valid coordinates.
     """
-    url =f"{BASE_URL}/geo/1.0/direct?q={city}&limit=5&appid={OPENWEATHER_API_KEY}"
-    response = requests.get(url)
+    url = f"{BASE_URL}/geo/1.0/direct"
+    params = {"q": city, "limit": 5, "appid": OPENWEATHER_API_KEY}
+    response = get_openweather_session().get(url, params=params)
     response.raise_for_status()
     data = response.json()
-    lat, lon = data[0]["lat"], data[0]["lon"]
-    return lat, lon
+    if not data:
+        return _NOT_FOUND
+    logger.info(f"Geocoded '{city}' with OpenWeather")
+    return data[0]["lat"], data[0]["lon"]
+
+
+def normalize_location_query(city: str) -> str:
+    """
+    Normalizes a location query so that trivially different spellings share a cache entry.
+
+    Args:
+        city (str): The location query as entered by the user.
+
+    Returns:
+        str: The query with surrounding and repeated whitespace removed, case-folded.
+    """
+    return normalize_location_name(city)
+
+
+def configure_cache(max_entries: int = 10000, resolution: float = 0.1, ttls: dict = None,
+                    single_flight_timeout: float = 30, stale_grace: dict = None) -> WeatherCache:
+    """
+    Replaces the process-wide weather cache shared by all fetch functions.
+
+    Args:
+        max_entries (int): Maximum number of cached entries.
+        resolution (float): Grid cell size in degrees used to key entries. 0 disables quantization.
+        ttls (dict, optional): Time-to-live in seconds per kind of data ('current', 'forecast').
+        single_flight_timeout (float): Maximum number of seconds a caller waits on an identical call in flight.
+        stale_grace (dict, optional): Number of seconds past expiry during which an entry is served stale
+            while it is refreshed in the background, per kind of data. Kinds not listed are never served stale.
+
+    Returns:
+        WeatherCache: The new cache.
+    """
+    global _weather_cache, _single_flight_timeout, _stale_grace
+    _weather_cache = WeatherCache(max_entries=max_entries, resolution=resolution, ttls=ttls)
+    _single_flight_timeout = single_flight_timeout
+    _stale_grace = dict(stale_grace or {})
+    logger.info(f"Configured weather cache ({max_entries} entries, {resolution} degree cells)")
+    return _weather_cache
+
+
+def get_weather_cache() -> WeatherCache:
+    """
+    Returns the process-wide weather cache, creating it with the default settings on first use.
+
+    Returns:
+        WeatherCache: The shared weather cache.
+    """
+    if _weather_cache is None:
+        configure_cache()
+    return _weather_cache
+
+
+def configure_geocode_cache(max_entries: int = 10000, ttl: int = 30 * 24 * 3600, negative_ttl: int = 300) -> LRUCache:
+    """
+    Replaces the process-wide in-memory geocoding cache and sets the time-to-live of both tiers.
+
+    Args:
+        max_entries (int): Maximum number of queries kept in memory.
+        ttl (int): Number of seconds a found location stays cached.
+        negative_ttl (int): Number of seconds a "not found" result stays cached.
+
+    Returns:
+        LRUCache: The new in-memory geocoding cache.
+    """
+    global _geocode_cache, _geocode_ttl, _geocode_negative_ttl
+    _geocode_ttl = ttl
+    _geocode_negative_ttl = negative_ttl
+    _geocode_cache = LRUCache(max_entries, {'found': ttl, 'not_found': negative_ttl})
+    return _geocode_cache
+
+
+def get_geocode_cache() -> LRUCache:
+    """
+    Returns the process-wide in-memory geocoding cache, creating it with the default settings on first use.
+
+    Returns:
+        LRUCache: The shared geocoding cache.
+    """
+    if _geocode_cache is None:
+        configure_geocode_cache()
+    return _geocode_cache
+
+
+def configure_historical_store(directory: str = None, settle_days: int = 2, chunk_days: int = 365,
+                               chunk_retries: int = 1) -> HistoricalStore:
+    """
+    Replaces the process-wide store of daily historical weather and sets how missing days are fetched.
+
+    Args:
+        directory (str, optional): Directory holding one file per grid cell (default: in memory only).
+        settle_days (int): Number of most recent days, including today, that are always fetched rather than stored.
+        chunk_days (int): Maximum number of days fetched by one upstream request.
+        chunk_retries (int): Number of times a failed chunk is retried on its own.
+
+    Returns:
+        HistoricalStore: The new historical store.
+    """
+    global _historical_store, _historical_chunk_days, _historical_chunk_retries
+    _historical_chunk_days = chunk_days
+    _historical_chunk_retries = chunk_retries
+    _historical_store = HistoricalStore(directory, DAILY_VARIABLES, settle_days)
+    return _historical_store
+
+
+def get_historical_store() -> HistoricalStore:
+    """
+    Returns the process-wide historical store, creating an in-memory one on first use.
+
+    Returns:
+        HistoricalStore: The shared historical store.
+    """
+    if _historical_store is None:
+        configure_historical_store()
+    return _historical_store
+
+
+def configure_fan_out(max_workers: int = 8, max_per_host: int = 4) -> None:
+    """
+    Configures the bounded thread pool used to run upstream calls concurrently.
+
+    Args:
+        max_workers (int): Maximum number of upstream calls in flight in this worker process.
+        max_per_host (int): Maximum number of concurrent calls to any single upstream host.
+    """
+    global _fan_out_executor, _fan_out_max_per_host
+    with _fan_out_lock:
+        previous = _fan_out_executor
+        _fan_out_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='weather-fan-out')
+        _fan_out_max_per_host = max_per_host
+        _host_slots.clear()
+    if previous is not None:
+        previous.shutdown(wait=False)
+    logger.info(f"Configured fan-out executor ({max_workers} workers, {max_per_host} per host)")
+
+
+def _get_fan_out_executor() -> ThreadPoolExecutor:
+    """
+    Helper that returns the fan-out executor, creating it with the default limits on first use.
+    """
+    if _fan_out_executor is None:
+        configure_fan_out()
+    return _fan_out_executor
+
+
+def _host_slot(host: str) -> threading.BoundedSemaphore:
+    """
+    Helper that returns the semaphore capping concurrent calls to an upstream host.
+    """
+    with _fan_out_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(_fan_out_max_per_host)
+        return _host_slots[host]
+
+
+def _run_in_slot(host: str, func, args: tuple):
+    """
+    Helper that runs one fan-out call on a pool thread while holding a slot for its host.
+    """
+    _fan_out_state.active = True
+    try:
+        with _host_slot(host):
+            return func(*args)
+    finally:
+        _fan_out_state.active = False
+
+
+def fan_out(func, calls: list, host: str) -> list:
+    """
+    Runs `func(*args)` for every args tuple in `calls` concurrently on the bounded fan-out pool.
+
+    Results keep the order of `calls`. A call that raises does not affect the others; its
+    exception is returned in its place. See fan_out_as_completed() for how calls are run.
+
+    Args:
+        func (callable): The function to call.
+        calls (list): A list of argument tuples, one per call.
+        host (str): The upstream host the calls go to, used for the per-host concurrency cap.
+
+    Returns:
+        list: The result of each call, or the Exception it raised, in the order of `calls`.
+    """
+    results = [None] * len(calls)
+    for index, result in fan_out_as_completed(func, calls, host):
+        results[index] = result
+    return results
+
+
+def fan_out_as_completed(func, calls: list, host: str):
+    """
+    Runs `func(*args)` for every args tuple in `calls` concurrently and yields each result as soon as it is ready.
+
+    Calls made from inside a fan-out task run inline so that nested fan-outs cannot deadlock
+    the pool. Tasks run in a copy of the caller's context, so they share its request deadline;
+    calls still running when the deadline passes are reported as DeadlineExceeded instead of
+    being waited for.
+
+    Args:
+        func (callable): The function to call.
+        calls (list): A list of argument tuples, one per call.
+        host (str): The upstream host the calls go to, used for the per-host concurrency cap.
+
+    Yields:
+        tuple: The index of the call in `calls` and its result, or the Exception it raised.
+    """
+    if len(calls) <= 1 or getattr(_fan_out_state, 'active', False):
+        for index, args in enumerate(calls):
+            try:
+                yield index, func(*args)
+            except Exception as e:
+                yield index, e
+        return
+
+    executor = _get_fan_out_executor()
+    futures = {executor.submit(contextvars.copy_context().run, _run_in_slot, host, func, args): index
+               for index, args in enumerate(calls)}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=_wait_timeout(None)):
+            pending.discard(future)
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+    except FutureTimeoutError:
+        for future in pending:
+            yield futures[future], DeadlineExceeded(f"a call to '{host}'")
+
+
+def _wait_timeout(timeout):
+    """
+    Helper that shortens a wait timeout (None for no limit) so that it ends by the request deadline.
+    """
+    remaining = time_remaining()
+    if remaining is None:
+        return timeout
+    return max(remaining, 0) if timeout is None else max(min(timeout, remaining), 0)
+
+
+def _upstream_error(error: Exception) -> Exception:
+    """
+    Helper that maps an upstream call's exception to the error the caller should see.
+
+    Open circuits and passed deadlines are unwrapped from client library errors, and a
+    single-flight wait cut short by the deadline is reported as DeadlineExceeded.
+    """
+    cause = find_cause(error, (CircuitOpenError, DeadlineExceeded))
+    if cause is not None:
+        return cause
+    remaining = time_remaining()
+    if isinstance(error, TimeoutError) and remaining is not None and remaining <= 0:
+        return DeadlineExceeded("an identical upstream call")
+    return error
+
+
+def _cached_fetch(kind: str, key: tuple, fetch, *args):
+    """
+    Helper that serves weather data from the weather cache, or fetches and caches it.
+
+    On a cache miss, concurrent callers asking for the same `kind` and `key` share a single
+    upstream call (see SingleFlight). Followers give up after the single-flight timeout.
+    An entry that expired less than the stale grace window ago is served immediately and
+    refreshed in the background (stale-while-revalidate). If the upstream call fails, any
+    cached entry is served as stale instead (stale-if-error). Waits never outlast the
+    request deadline. A follower is not failed by the leader's deadline, which belongs to
+    another request: it makes the call again under its own.
+
+    Args:
+        kind (str): The kind of data ('current' or 'forecast').
+        key (tuple): The normalized request key, starting with the grid cell.
+        fetch (callable): The uncached fetch function.
+        *args: Arguments passed to `fetch`.
+
+    Returns:
+        dict: The weather data, with a 'cache' entry giving its age in seconds and whether it is stale.
+
+    Raises:
+        TimeoutError: If this caller waited on another caller's upstream call for too long.
+        CircuitOpenError: If the upstream host's circuit is open and nothing is cached.
+        DeadlineExceeded: If the request deadline passed and nothing is cached.
+        Exception: If the upstream call fails and nothing is cached.
+    """
+    cache = get_weather_cache()
+    cached, age, stale = cache.lookup(kind, key, grace=_stale_grace.get(kind, 0))
+    if cached is not None:
+        logger.info(f"Serving {'stale' if stale else 'cached'} {kind} weather for {key}")
+        if stale:
+            _refresh_in_background(kind, key, fetch, *args)
+        return _with_cache_info(cached, age, stale)
+
+    led = []
+
+    def load():
+        led.append(True)
+        data = fetch(*args)
+        cache.set(kind, key, data)
+        return data
+
+    try:
+        while True:
+            try:
+                data = _in_flight.do((kind,) + key, load, timeout=_wait_timeout(_single_flight_timeout))
+                break
+            except DeadlineExceeded:
+                if led:
+                    raise
+                # The leader's deadline passed, not ours: call again, leading or following a newer call
+                logger.info(f"Identical {kind} weather call for {key} ran out of its own time; calling again")
+        return _with_cache_info(data, 0, False)
+    except Exception as e:
+        # Fall back to whatever we still have cached, however old, rather than failing
+        cached, age, _ = cache.lookup(kind, key, grace=float('inf'))
+        if cached is not None:
+            logger.warning(f"Serving stale {kind} weather for {key} after upstream error: {e}")
+            return _with_cache_info(cached, age, True)
+        upstream_error = _upstream_error(e)
+        if upstream_error is not e:
+            raise upstream_error from e
+        raise
+
+
+def _refresh_in_background(kind: str, key: tuple, fetch, *args) -> None:
+    """
+    Helper that refreshes a stale cache entry on the fan-out pool, unless a refresh is already in flight.
+
+    Args:
+        kind (str): The kind of data ('current' or 'forecast').
+        key (tuple): The normalized request key, starting with the grid cell.
+        fetch (callable): The uncached fetch function.
+        *args: Arguments passed to `fetch`.
+    """
+    call, leader = _in_flight.claim((kind,) + key)
+    if not leader:
+        return
+
+    def refresh():
+        try:
+            data = fetch(*args, force_refresh=True)
+        except Exception as e:
+            logger.warning(f"Background refresh of {kind} weather for {key} failed: {e}")
+            _in_flight.resolve((kind,) + key, error=e)
+            return
+        get_weather_cache().set(kind, key, data)
+        _in_flight.resolve((kind,) + key, result=data)
+
+    try:
+        _get_fan_out_executor().submit(refresh)
+    except Exception as e:
+        _in_flight.resolve((kind,) + key, error=e)
+        logger.warning(f"Could not schedule background refresh of {kind} weather for {key}: {e}")
+
+
+def _with_cache_info(data: dict, age: float, stale: bool) -> dict:
+    """
+    Helper that returns a shallow copy of cached weather data annotated with its age and staleness.
+    """
+    return dict(data, cache={"age_seconds": int(age), "stale": stale})
 
-def get_current_weather(lat, lon):
+
+def _parse_current_weather(response) -> dict:
+    """
+    Helper that converts a single-location Open-Meteo response into the current weather dictionary.
+
+    Args:
+        response (WeatherApiResponse): The Open-Meteo response for one location.
+
+    Returns:
+        dict: A dictionary containing current weather information.
+    """
+    # Extract current weather data
+    current = response.Current()
+    current_temperature_2m = current.Variables(0).Value()
+    current_relative_humidity_2m = current.Variables(1).Value()
+    current_precipitation = current.Variables(2).Value()
+    current_wind_speed_10m = current.Variables(6).Value()
+
+    # Structure the data into a dictionary
+    return {
+        "coordinates": {
+            "latitude": response.Latitude(),
+            "longitude": response.Longitude()
+        },
+        "elevation": response.Elevation(),
+        "timezone": response.Timezone(),
+        "utc_offset_seconds": response.UtcOffsetSeconds(),
+        "current_weather": {
+            "time": current.Time(),
+            "temperature": current_temperature_2m,
+            "humidity": current_relative_humidity_2m,
+            "windspeed": current_wind_speed_10m,
+            "precipitation": current_precipitation,
+        }
+    }
+
+
+def get_current_weather(lat, lon, client=None):
     """
     Retrieves the current weather data for a given location using Open-Meteo API.
 
+    Results are cached per grid cell (see WeatherCache), so nearby locations share one upstream call.
+
     Args:
         lat (float): Latitude of the location.
         lon (float): Longitude of the location.
+        client (openmeteo_requests.Client, optional): The Open-Meteo client to use (default: the shared client).
 
     Returns:
         dict: A dictionary containing current weather information
@@ -53,52 +758,35 @@ def get_current_weather(lat, lon):
     Raises:
         Exception: If there is an error fetching current the weather data.
     """
-    # Setup the Open-Meteo API client with cache and retry on error
-    cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-    openmeteo = openmeteo_requests.Client(session = retry_session)
+    # Use the shared Open-Meteo client (cached, pooled and retrying on error)
+    openmeteo = client or get_client()
+    lat, lon = get_weather_cache().cell(lat, lon)
+    return _cached_fetch('current', (lat, lon), _fetch_current_weather, lat, lon, openmeteo)
+
+
+def _fetch_current_weather(lat, lon, client, force_refresh: bool = False) -> dict:
+    """
+    Helper that fetches the current weather for one location from Open-Meteo, bypassing the weather cache.
 
-    # Make sure all required weather variables are listed here
-    # The order of variables in hourly or daily is important to assign them correctly below
-    url = "https://api.open-meteo.com/v1/forecast"
+    Args:
+        lat (float): Latitude of the location.
+        lon (float): Longitude of the location.
+        client (openmeteo_requests.Client): The Open-Meteo client to use.
+        force_refresh (bool): Bypass the HTTP response cache and always call upstream.
+
+    Returns:
+        dict: A dictionary containing current weather information.
+    """
     params = {
         "latitude": lat,
         "longitude": lon,
-        "current": ["temperature_2m", "relative_humidity_2m", "precipitation", "rain", "showers", "snowfall", "wind_speed_10m"]
+        "current": CURRENT_VARIABLES
     }
-    responses = openmeteo.weather_api(url, params=params)
 
     try:
-        responses = openmeteo.weather_api(url, params=params)
+        responses = client.weather_api(CURRENT_URL, params=params, force_refresh=force_refresh)
         response = responses[0]  # Assuming single location response
-
-        # Extract current weather data
-        current = response.Current()
-        current_temperature_2m = current.Variables(0).Value()
-        current_relative_humidity_2m = current.Variables(1).Value()
-        current_precipitation = current.Variables(2).Value()
-        current_rain = current.Variables(3).Value()
-        current_showers = current.Variables(4).Value()
-        current_snowfall = current.Variables(5).Value()
-        current_wind_speed_10m = current.Variables(6).Value()
-
-        # Structure the data into a dictionary
-        weather_data = {
-            "coordinates": {
-                "latitude": response.Latitude(),
-                "longitude": response.Longitude()
-            },
-            "elevation": response.Elevation(),
-            "timezone": response.Timezone(),
-            "utc_offset_seconds": response.UtcOffsetSeconds(),
-            "current_weather": {
-                "time": current.Time(),
-                "temperature": current_temperature_2m,
-                "humidity": current_relative_humidity_2m,
-                "windspeed": current_wind_speed_10m,
-                "precipitation": current_precipitation,
-            }
-        }
+        weather_data = _parse_current_weather(response)
 
         logger.info(f"Successfully fetched current weather for ({lat}, {lon})")
         return weather_data
@@ -106,9 +794,171 @@ def get_current_weather(lat, lon):
     except Exception as e:
         logger.error(f"Error fetching current weather: {e}")
         raise
+
+
+def get_current_weather_batch(coords: dict, client=None, chunk_size: int = 50) -> dict:
+    """
+    Retrieves the current weather for many locations with as few Open-Meteo requests as possible.
+
+    See iter_current_weather_batch() for how locations are served and fetched.
+
+    Args:
+        coords (dict): Mapping of a caller key (e.g. a favorite ID) to a (latitude, longitude) tuple.
+        client (openmeteo_requests.Client, optional): The Open-Meteo client to use (default: the shared client).
+        chunk_size (int): Maximum number of locations per upstream request.
+
+    Returns:
+        dict: Mapping of each key to its current weather dictionary (with a 'cache' entry, see _cached_fetch),
+            or to the Exception raised for it (DeadlineExceeded if the request deadline passed first).
+    """
+    return dict(iter_current_weather_batch(coords, client=client, chunk_size=chunk_size))
+
+
+def iter_current_weather_batch(coords: dict, client=None, chunk_size: int = 50):
+    """
+    Retrieves the current weather for many locations, yielding each one as soon as it is available.
+
+    Locations are snapped to their weather cache grid cell and served from the cache, or from an
+    identical call already in flight, where possible. Cached locations are yielded first.
+    The remaining cells are de-duplicated and packed into multi-location requests of at most `chunk_size`
+    coordinates each, and yielded as each request completes. If a chunk fails (e.g. because one
+    coordinate is rejected), its locations are retried one by one so that a single bad location
+    only fails its own entry. Chunks and retries run concurrently on the fan-out pool (see fan_out()).
+
+    Args:
+        coords (dict): Mapping of a caller key (e.g. a favorite ID) to a (latitude, longitude) tuple.
+        client (openmeteo_requests.Client, optional): The Open-Meteo client to use (default: the shared client).
+        chunk_size (int): Maximum number of locations per upstream request.
+
+    Yields:
+        tuple: A key and its current weather dictionary (with a 'cache' entry, see _cached_fetch),
+            or the Exception raised for it (DeadlineExceeded if the request deadline passed first).
+    """
+    openmeteo = client or get_client()
+    cache = get_weather_cache()
+
+    # Group keys by grid cell so locations sharing a cell are only requested once
+    keys_by_location = {}
+    for key, (lat, lon) in coords.items():
+        keys_by_location.setdefault(cache.cell(lat, lon), []).append(key)
+
+    # Serve what we can from the weather cache, and join identical calls already in flight. Every
+    # call this batch leads is claimed before the first yield, so that the finally block below
+    # releases them all if the consumer stops early (e.g. a streaming client disconnects)
+    cached_results = []
+    locations = []
+    followed = {}
+    for location, keys in keys_by_location.items():
+        cached, age, stale = cache.lookup('current', location, grace=_stale_grace.get('current', 0))
+        if cached is not None:
+            if stale:
+                _refresh_in_background('current', location, _fetch_current_weather, location[0], location[1], openmeteo)
+            cached_results.append((location, _with_cache_info(cached, age, stale)))
+            continue
+        call, leader = _in_flight.claim(('current',) + location)
+        if leader:
+            locations.append(location)
+        else:
+            followed[location] = call
+
+    def resolve(fetched):
+        # Publish the outcome of led calls to their followers before handing out any of their entries,
+        # so that a slow consumer never keeps other requests waiting
+        results = []
+        for location, weather_data in fetched:
+            if isinstance(weather_data, Exception):
+                _in_flight.resolve(('current',) + location, error=weather_data)
+            else:
+                cache.set('current', location, weather_data)
+                _in_flight.resolve(('current',) + location, result=weather_data)
+            unresolved.discard(location)
+            results.append((location, _batch_result(cache, location, weather_data)))
+        return entries(results)
+
+    def entries(results):
+        return [(key, result) for location, result in results for key in keys_by_location[location]]
+
+    unresolved = set(locations)
+    try:
+        yield from entries(cached_results)
+
+        # Fetch all chunks concurrently, handing out each as it completes
+        chunks = [locations[start:start + chunk_size] for start in range(0, len(locations), chunk_size)]
+        failed_locations = []
+        for index, chunk_result in fan_out_as_completed(_fetch_current_weather_chunk, [(chunk, openmeteo) for chunk in chunks],
+                                                        host=OPEN_METEO_HOST):
+            chunk = chunks[index]
+            if isinstance(chunk_result, DeadlineExceeded):
+                yield from resolve((location, chunk_result) for location in chunk)
+            elif isinstance(chunk_result, Exception):
+                logger.warning(f"Batched current weather request failed, retrying {len(chunk)} locations individually: {chunk_result}")
+                failed_locations.extend(chunk)
+            else:
+                yield from resolve(zip(chunk, chunk_result))
+
+        # Retry the locations of failed chunks one by one, also concurrently
+        for index, weather_data in fan_out_as_completed(_fetch_current_weather, [(lat, lon, openmeteo) for lat, lon in failed_locations],
+                                                        host=OPEN_METEO_HOST):
+            yield from resolve([(failed_locations[index], weather_data)])
+    finally:
+        # Always release the calls this batch leads, so followers are never left waiting
+        for location in list(unresolved):
+            _in_flight.resolve(('current',) + location, error=RuntimeError("Batched current weather request was interrupted."))
+
+    for location, call in followed.items():
+        try:
+            result = _batch_result(cache, location, _in_flight.wait(call, _wait_timeout(_single_flight_timeout)))
+        except DeadlineExceeded:
+            # The leader's deadline passed, not necessarily ours: call again under this request's deadline
+            try:
+                result = _cached_fetch('current', location, _fetch_current_weather, location[0], location[1], openmeteo)
+            except Exception as e:
+                result = e
+        except Exception as e:
+            result = _batch_result(cache, location, e)
+        yield from entries([(location, result)])
+
+
+def _batch_result(cache: WeatherCache, location: tuple, weather_data):
+    """
+    Helper that turns a location's fetched weather, or its error, into a batch result.
+
+    A failed location falls back to whatever is still cached for it, however old (stale-if-error).
+    """
+    if not isinstance(weather_data, Exception):
+        return _with_cache_info(weather_data, 0, False)
+    cached, age, _ = cache.lookup('current', location, grace=float('inf'))
+    return _upstream_error(weather_data) if cached is None else _with_cache_info(cached, age, True)
+
+
+def _fetch_current_weather_chunk(chunk: list, client, force_refresh: bool = False) -> list:
+    """
+    Helper that fetches the current weather for a chunk of locations in one multi-location request.
+
+    Args:
+        chunk (list): A list of (latitude, longitude) tuples.
+        client (openmeteo_requests.Client): The Open-Meteo client to use.
+        force_refresh (bool): Bypass the HTTP response cache and always call upstream.
+
+    Returns:
+        list: The current weather dictionaries, in the order of `chunk`.
+
+    Raises:
+        Exception: If the request fails or does not return one response per location.
+    """
+    params = {
+        "latitude": [lat for lat, _ in chunk],
+        "longitude": [lon for _, lon in chunk],
+        "current": CURRENT_VARIABLES
+    }
+    responses = client.weather_api(CURRENT_URL, params=params, force_refresh=force_refresh)
+    if len(responses) != len(chunk):
+        raise ValueError(f"Expected {len(chunk)} responses, got {len(responses)}.")
+    logger.info(f"Successfully fetched current weather for {len(chunk)} locations in one request")
+    return [_parse_current_weather(response) for response in responses]
     
 
-def get_forecast(lat, lon, days=7):
+def get_forecast(lat, lon, days=7, client=None, layout: str = 'records'):
     """
     Fetches a weather forecast for the specified number of days at a given location using Open-Meteo API.
 
@@ -116,74 +966,60 @@ def get_forecast(lat, lon, days=7):
         lat (float): Latitude of the location.
         lon (float): Longitude of the location.
         days (int): Number of forecast days (maximum 16).
+        client (openmeteo_requests.Client, optional): The Open-Meteo client to use (default: the shared client).
+        layout (str): Shape of the daily forecast, 'records' (one dict per day) or 'columnar' (one list per variable).
 
     Returns:
         dict: A dictionary containing daily forecast data for the specified number of days.
 
     Raises:
-        ValueError: If the number of days exceeds 16.
+        ValueError: If the number of days exceeds 16 or the layout is unknown.
         Exception: If there is an error fetching or processing the forecast data.
     """
+    _check_layout(layout)
     if (days > 16):
         logger.error("Maximum number of days possible is 16.")
         return {"error" : "Forecast days exceeded."}
-    # Setup the Open-Meteo API client with cache and retry on error
-    cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-    openmeteo = openmeteo_requests.Client(session = retry_session)
-
-    # Make sure all required weather variables are listed here
-    # The order of variables in hourly or daily is important to assign them correctly below
-    url = "https://api.open-meteo.com/v1/forecast"
+
+    # Use the shared Open-Meteo client (cached, pooled and retrying on error)
+    openmeteo = client or get_client()
+    lat, lon = get_weather_cache().cell(lat, lon)
+    forecast = _cached_fetch('forecast', (lat, lon, days), _fetch_forecast, lat, lon, days, openmeteo)
+    return _with_layout(forecast, 'daily_forecast', layout)
+
+
+def _fetch_forecast(lat, lon, days, client, force_refresh: bool = False) -> dict:
+    """
+    Helper that fetches a daily forecast for one location from Open-Meteo, bypassing the weather cache.
+
+    Args:
+        lat (float): Latitude of the location.
+        lon (float): Longitude of the location.
+        days (int): Number of forecast days.
+        client (openmeteo_requests.Client): The Open-Meteo client to use.
+        force_refresh (bool): Bypass the HTTP response cache and always call upstream.
+
+    Returns:
+        dict: A dictionary containing daily forecast data.
+    """
     params = {
         "latitude": lat,
         "longitude": lon,
-        "daily": ["temperature_2m_max", "temperature_2m_min", "apparent_temperature_max", "apparent_temperature_min", "daylight_duration", "precipitation_sum", "precipitation_probability_max", "wind_speed_10m_max"],
+        "daily": DAILY_VARIABLES,
         "timezone": "auto",
         "forecast_days": days
     }
     
     
     try:
-        responses = openmeteo.weather_api(url, params=params)
+        responses = client.weather_api(FORECAST_URL, params=params, force_refresh=force_refresh)
         # Process first location. Add a for-loop for multiple locations or weather models
         response = responses[0]
         
-        print(f"Coordinates {response.Latitude()}°N {response.Longitude()}°E")
-        print(f"Elevation {response.Elevation()} m asl")
-        print(f"Timezone {response.Timezone()} {response.TimezoneAbbreviation()}")
-        print(f"Timezone difference to GMT+0 {response.UtcOffsetSeconds()} s")
-
-        # Process daily data. The order of variables needs to be the same as requested.
-        daily = response.Daily()
-        dates = pd.to_datetime(daily.Time(), unit="s", utc=True)
-        daily_data = {
-            "date": dates,
-            "temperature_2m_max": daily.Variables(0).ValuesAsNumpy().tolist(),
-            "temperature_2m_min": daily.Variables(1).ValuesAsNumpy().tolist(),
-            "apparent_temperature_max": daily.Variables(2).ValuesAsNumpy().tolist(),
-            "apparent_temperature_min": daily.Variables(3).ValuesAsNumpy().tolist(),
-            "daylight_duration": daily.Variables(4).ValuesAsNumpy().tolist(),
-            "precipitation_sum": daily.Variables(5).ValuesAsNumpy().tolist(),
-            "precipitation_probability_max": daily.Variables(6).ValuesAsNumpy().tolist(),
-            "wind_speed_10m_max": daily.Variables(7).ValuesAsNumpy().tolist()
-        }
-        
-        forecast_dataframe = pd.DataFrame(data=daily_data)
-        
-        # Convert DataFrame to dictionary for JSON serialization
-        forecast_data = forecast_dataframe.to_dict(orient='records')
-        
-        structured_data = {
-            "coordinates": {
-                "latitude": response.Latitude(),
-                "longitude": response.Longitude()
-            },
-            "elevation": response.Elevation(),
-            "timezone": response.Timezone(),
-            "utc_offset_seconds": response.UtcOffsetSeconds(),
-            "daily_forecast": forecast_data
-        }
+        logger.debug(f"Forecast for {response.Latitude()}°N {response.Longitude()}°E, elevation {response.Elevation()} m asl, "
+                     f"timezone {response.Timezone()}, UTC offset {response.UtcOffsetSeconds()} s")
+
+        structured_data = _parse_forecast(response)
 
         logger.info(f"Successfully fetched forecast for ({lat}, {lon}) for {days} days")
         return structured_data
@@ -192,69 +1028,348 @@ def get_forecast(lat, lon, days=7):
         logger.error(f"Error fetching forecast: {e}")
         raise
 
-def get_historical_weather(lat, lon, start: str, end: str):
-    # Setup the Open-Meteo API client with cache and retry on error
-    cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-    openmeteo = openmeteo_requests.Client(session = retry_session)
 
-    # Make sure all required weather variables are listed here
-    # The order of variables in hourly or daily is important to assign them correctly below
-    url = "https://historical-forecast-api.open-meteo.com/v1/forecast"
+def _fetch_forecast_chunk(chunk: list, days: int, client, force_refresh: bool = False) -> list:
+    """
+    Helper that fetches daily forecasts for a chunk of locations in one multi-location request.
+
+    Args:
+        chunk (list): A list of (latitude, longitude) tuples.
+        days (int): Number of forecast days.
+        client (openmeteo_requests.Client): The Open-Meteo client to use.
+        force_refresh (bool): Bypass the HTTP response cache and always call upstream.
+
+    Returns:
+        list: The forecast dictionaries, in the order of `chunk`.
+
+    Raises:
+        Exception: If the request fails or does not return one response per location.
+    """
+    params = {
+        "latitude": [lat for lat, _ in chunk],
+        "longitude": [lon for _, lon in chunk],
+        "daily": DAILY_VARIABLES,
+        "timezone": "auto",
+        "forecast_days": days
+    }
+    responses = client.weather_api(FORECAST_URL, params=params, force_refresh=force_refresh)
+    if len(responses) != len(chunk):
+        raise ValueError(f"Expected {len(chunk)} responses, got {len(responses)}.")
+    logger.info(f"Successfully fetched forecasts for {len(chunk)} locations in one request")
+    return [_parse_forecast(response) for response in responses]
+
+
+def _parse_forecast(response) -> dict:
+    """
+    Helper that converts a single-location Open-Meteo response into the daily forecast dictionary.
+
+    Args:
+        response (WeatherApiResponse): The Open-Meteo response for one location.
+
+    Returns:
+        dict: A dictionary containing the daily forecast in columnar layout.
+    """
+    return dict(_response_meta(response), daily_forecast=_json_columns(_daily_arrays(response)))
+
+
+def _response_meta(response) -> dict:
+    """
+    Helper that extracts the location details of a single-location Open-Meteo response.
+    """
+    timezone = response.Timezone()
+    return {
+        "coordinates": {
+            "latitude": response.Latitude(),
+            "longitude": response.Longitude()
+        },
+        "elevation": response.Elevation(),
+        "timezone": timezone.decode() if isinstance(timezone, bytes) else timezone,
+        "utc_offset_seconds": response.UtcOffsetSeconds()
+    }
+
+
+def _daily_arrays(response) -> dict:
+    """
+    Helper that reads the daily series of an Open-Meteo response straight into arrays.
+
+    Dates are computed from the series' start, end and interval in the location's local time,
+    without building per-day objects.
+
+    Args:
+        response (WeatherApiResponse): The Open-Meteo response for one location, requested with DAILY_VARIABLES.
+
+    Returns:
+        dict: A datetime64[D] array under 'date' and a float32 array per daily variable (NaN where missing).
+    """
+    # Process daily data. The order of variables needs to be the same as requested.
+    daily = response.Daily()
+    times = np.arange(daily.Time(), daily.TimeEnd(), daily.Interval(), dtype=np.int64) + response.UtcOffsetSeconds()
+    arrays = {"date": times.astype('datetime64[s]').astype('datetime64[D]')}
+    for index, variable in enumerate(DAILY_VARIABLES):
+        arrays[variable] = daily.Variables(index).ValuesAsNumpy()
+    return arrays
+
+
+def _json_columns(arrays: dict) -> dict:
+    """
+    Helper that converts daily arrays (see _daily_arrays) into JSON-ready columns.
+
+    Returns:
+        dict: A list of 'YYYY-MM-DD' dates under 'date' and a list of values per daily variable
+            (None where a value is missing).
+    """
+    columns = {"date": np.datetime_as_string(arrays["date"], unit='D').tolist()}
+    for variable in DAILY_VARIABLES:
+        values = arrays[variable]
+        missing = np.isnan(values)
+        if missing.any():
+            values = values.astype(object)
+            values[missing] = None
+        columns[variable] = values.tolist()
+    return columns
+
+
+def _check_layout(layout: str) -> None:
+    """
+    Helper that rejects an unknown daily series layout.
+
+    Raises:
+        ValueError: If the layout is not one of LAYOUTS.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'. Expected one of: {', '.join(LAYOUTS)}.")
+
+
+def _with_layout(data: dict, key: str, layout: str) -> dict:
+    """
+    Helper that returns weather data with its daily series under `key` in the requested layout.
+
+    Daily series are cached in columnar layout; the records layout is built from it on the way out.
+    """
+    if layout == 'columnar':
+        return data
+    columns = data[key]
+    names = list(columns)
+    return dict(data, **{key: [dict(zip(names, row)) for row in zip(*columns.values())]})
+
+def get_historical_weather(lat, lon, start: str, end: str, client=None, layout: str = 'records'):
+    """
+    Retrieves daily historical weather for a given location and date range using Open-Meteo API.
+
+    Not kept in the weather cache: settled days are served from the local historical store,
+    and the days too recent to be settled are fetched fresh on every call.
+
+    Args:
+        lat (float): Latitude of the location.
+        lon (float): Longitude of the location.
+        start (str): The start date in 'YYYY-MM-DD' format.
+        end (str): The end date in 'YYYY-MM-DD' format.
+        client (openmeteo_requests.Client, optional): The Open-Meteo client to use (default: the shared client).
+        layout (str): Shape of the daily series, 'records' (one dict per day) or 'columnar' (one list per variable).
+
+    Returns:
+        dict: A dictionary containing daily historical weather data.
+
+    Raises:
+        ValueError: If the layout is unknown.
+        Exception: If there is an error fetching or processing the historical weather data.
+    """
+    _check_layout(layout)
+    # Use the shared Open-Meteo client (cached, pooled and retrying on error)
+    openmeteo = client or get_client()
+    lat, lon = get_weather_cache().cell(lat, lon)
+    try:
+        historical = _fetch_historical_weather(lat, lon, start, end, openmeteo)
+    except Exception as e:
+        upstream_error = _upstream_error(e)
+        if upstream_error is not e:
+            raise upstream_error from e
+        raise
+    return _with_layout(historical, 'historical_weather', layout)
+
+
+def _fetch_historical_weather(lat, lon, start: str, end: str, client, force_refresh: bool = False) -> dict:
+    """
+    Helper that assembles daily historical weather for one location.
+
+    Settled days come from the historical store; only the days it is missing are fetched from
+    Open-Meteo (see _fill_historical_gaps) and merged into it. Days too recent to be settled
+    are always fetched.
+
+    Args:
+        lat (float): Latitude of the location (its grid cell).
+        lon (float): Longitude of the location (its grid cell).
+        start (str): The start date in 'YYYY-MM-DD' format.
+        end (str): The end date in 'YYYY-MM-DD' format.
+        client (openmeteo_requests.Client): The Open-Meteo client to use.
+        force_refresh (bool): Bypass the HTTP response cache for the days that are fetched.
+
+    Returns:
+        dict: A dictionary containing daily historical weather data in columnar layout.
+    """
+    store = get_historical_store()
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    settled_last = min(last, store.settled_until())
+
+    stored = store.load((lat, lon))
+    gaps = store.missing_ranges((lat, lon), first, settled_last, stored)
+    meta = None
+    if gaps:
+        meta = _fill_historical_gaps(lat, lon, gaps, client, force_refresh)
+        stored = store.load((lat, lon))  # Now with the merged days
+    arrays, stored_meta = store.read((lat, lon), first, settled_last, stored)
+    meta = meta or stored_meta
+
+    if last > settled_last:
+        recent_meta, recent = _fetch_historical_arrays(lat, lon, max(first, settled_last + timedelta(days=1)), last,
+                                                       client, force_refresh)
+        meta = meta or recent_meta
+        arrays = {name: np.concatenate((values, recent[name])) for name, values in arrays.items()}
+
+    check_deadline("processing historical weather")
+    logger.info(f"Assembled historical weather for ({lat}, {lon}) from {start} to {end}")
+    return dict(meta, historical_weather=_json_columns(arrays))
+
+
+def _fill_historical_gaps(lat, lon, gaps: list, client, force_refresh: bool = False) -> dict:
+    """
+    Helper that fetches the missing days of a grid cell in chunks and merges them into the historical store.
+
+    Gaps are split into chunks of at most the configured number of days, which are fetched
+    concurrently on the fan-out pool. A chunk that fails is retried on its own; the chunks
+    that succeeded are stored even if another one keeps failing.
+
+    Args:
+        lat (float): Latitude of the grid cell.
+        lon (float): Longitude of the grid cell.
+        gaps (list): (start, end) date tuples of the missing days, in order.
+        client (openmeteo_requests.Client): The Open-Meteo client to use.
+        force_refresh (bool): Bypass the HTTP response cache and always call upstream.
+
+    Returns:
+        dict: The location details returned with the data, or None if no chunk succeeded.
+
+    Raises:
+        Exception: The error of a chunk that still failed after its retries.
+    """
+    step = timedelta(days=_historical_chunk_days)
+    pending = []
+    for gap_start, gap_end in gaps:
+        while gap_start <= gap_end:
+            pending.append((gap_start, min(gap_start + step - timedelta(days=1), gap_end)))
+            gap_start += step
+
+    meta = None
+    fetched = []
+    error = None
+    for attempt in range(_historical_chunk_retries + 1):
+        if attempt:
+            logger.warning(f"Retrying {len(pending)} failed historical weather chunks for ({lat}, {lon})")
+        results = fan_out(_fetch_historical_arrays, [(lat, lon, start, end, client, force_refresh) for start, end in pending],
+                          host=HISTORICAL_HOST)
+        failed = []
+        for chunk, result in zip(pending, results):
+            if isinstance(result, Exception):
+                failed.append(chunk)
+                error = result
+            else:
+                meta = meta or result[0]
+                fetched.append(result[1])
+        pending = failed
+        # Retrying cannot help while the circuit is open or once the deadline has passed
+        if not pending or _upstream_error(error) is not error:
+            break
+
+    if fetched:
+        arrays = {name: np.concatenate([chunk[name] for chunk in fetched]) for name in fetched[0]}
+        get_historical_store().merge((lat, lon), arrays, meta)
+    if pending:
+        raise error
+    return meta
+
+
+def _fetch_historical_arrays(lat, lon, start: date, end: date, client, force_refresh: bool = False) -> tuple:
+    """
+    Helper that fetches daily historical weather for one location and date range from Open-Meteo.
+
+    Args:
+        lat (float): Latitude of the location.
+        lon (float): Longitude of the location.
+        start (date): The first day to fetch.
+        end (date): The last day to fetch, included.
+        client (openmeteo_requests.Client): The Open-Meteo client to use.
+        force_refresh (bool): Bypass the HTTP response cache and always call upstream.
+
+    Returns:
+        tuple: The location details (see _response_meta) and the daily arrays (see _daily_arrays).
+    """
     params = {
         "latitude": lat,
         "longitude": lon,
-        "start_date": start,
-        "end_date": end,
-        "daily": ["temperature_2m_max", "temperature_2m_min", "apparent_temperature_max", "apparent_temperature_min", "daylight_duration", "precipitation_sum", "precipitation_probability_max", "wind_speed_10m_max"],
-	    "timezone": "auto"
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "daily": DAILY_VARIABLES,
+        "timezone": "auto"
     }
     
     try: 
-        responses = openmeteo.weather_api(url, params=params)
+        responses = client.weather_api(HISTORICAL_URL, params=params, force_refresh=force_refresh)
 
         # Process first location. Add a for-loop for multiple locations or weather models
         response = responses[0]
-        
-        # Extract daily forecast data
-        daily = response.Daily()
-        dates = pd.to_datetime(daily.Time(), unit="s", utc=True)
-        daily_data = {
-            "date": dates,
-            "temperature_2m_max": daily.Variables(0).ValuesAsNumpy().tolist(),
-            "temperature_2m_min": daily.Variables(1).ValuesAsNumpy().tolist(),
-            "apparent_temperature_max": daily.Variables(2).ValuesAsNumpy().tolist(),
-            "apparent_temperature_min": daily.Variables(3).ValuesAsNumpy().tolist(),
-            "daylight_duration": daily.Variables(4).ValuesAsNumpy().tolist(),
-            "precipitation_sum": daily.Variables(5).ValuesAsNumpy().tolist(),
-            "precipitation_probability_max": daily.Variables(6).ValuesAsNumpy().tolist(),
-            "wind_speed_10m_max": daily.Variables(7).ValuesAsNumpy().tolist()
-        }
-        
-        historical_dataframe = pd.DataFrame(data=daily_data)
-
-        # Convert DataFrame to dictionary for JSON serialization
-        historical_data = historical_dataframe.to_dict(orient='records')
-
-        structured_data = {
-            "coordinates": {
-                "latitude": response.Latitude(),
-                "longitude": response.Longitude()
-            },
-            "elevation": response.Elevation(),
-            "timezone": response.Timezone(),
-            "utc_offset_seconds": response.UtcOffsetSeconds(),
-            "historical_weather": historical_data
-        }
 
         logger.info(f"Successfully fetched historical weather for ({lat}, {lon}) from {start} to {end}")
-        return structured_data
+        return _response_meta(response), _daily_arrays(response)
 
     except Exception as e:
         logger.error(f"Error fetching historical weather: {e}")
         raise
 
 
+def warm_cache(coords: list, kinds: tuple = ('current', 'forecast'), days: int = 7, client=None, chunk_size: int = 50) -> dict:
+    """
+    Fetches fresh current weather and/or forecasts for many locations and stores them in the weather cache.
+
+    Used by the cache warmer to refresh entries before they expire. The cache is bypassed on read,
+    locations are snapped to their grid cell and fetched with chunked multi-location requests
+    on the fan-out pool, bypassing the HTTP response cache as well.
+
+    Args:
+        coords (list): A list of (latitude, longitude) tuples.
+        kinds (tuple): The kinds of data to refresh ('current' and/or 'forecast').
+        days (int): Number of forecast days to cache.
+        client (openmeteo_requests.Client, optional): The Open-Meteo client to use (default: the shared client).
+        chunk_size (int): Maximum number of locations per upstream request.
+
+    Returns:
+        dict: The number of locations refreshed and failed, summed over the kinds of data.
+    """
+    openmeteo = client or get_client()
+    cache = get_weather_cache()
+    cells = list(dict.fromkeys(cache.cell(lat, lon) for lat, lon in coords))
+    chunks = [cells[start:start + chunk_size] for start in range(0, len(cells), chunk_size)]
+
+    refreshed = failed = 0
+    for kind in kinds:
+        if kind == 'current':
+            calls = [(chunk, openmeteo, True) for chunk in chunks]
+            chunk_results = fan_out(_fetch_current_weather_chunk, calls, host=OPEN_METEO_HOST)
+        else:
+            calls = [(chunk, days, openmeteo, True) for chunk in chunks]
+            chunk_results = fan_out(_fetch_forecast_chunk, calls, host=OPEN_METEO_HOST)
+
+        for chunk, chunk_result in zip(chunks, chunk_results):
+            if isinstance(chunk_result, Exception):
+                logger.warning(f"Could not warm {kind} weather for {len(chunk)} locations: {chunk_result}")
+                failed += len(chunk)
+                continue
+            for cell, data in zip(chunk, chunk_result):
+                cache.set(kind, cell if kind == 'current' else cell + (days,), data)
+            refreshed += len(chunk)
+
+    return {"refreshed": refreshed, "failed": failed}
+
+
 if __name__ == "__main__":
     lat, lon = get_coordinates('london')
     print(lat, lon)
@@ -0,0 +1,263 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+# Default time-to-live in seconds for each kind of weather data
+DEFAULT_TTLS = {
+    "current": 900,
+    "forecast": 3600,
+}
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a time-to-live and hit/miss counters per kind of entry.
+    """
+
+    def __init__(self, max_entries: int, ttls: dict):
+        """
+        Args:
+            max_entries (int): Maximum number of entries kept before the least recently used is evicted.
+            ttls (dict): Time-to-live in seconds per kind of entry.
+        """
+        self.max_entries = max_entries
+        self.ttls = dict(ttls)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = {kind: 0 for kind in self.ttls}
+        self._misses = {kind: 0 for kind in self.ttls}
+        self._stale_hits = {kind: 0 for kind in self.ttls}
+        self._evictions = 0
+
+    def get(self, kind: str, key: tuple):
+        """
+        Looks up a fresh entry and marks it as recently used.
+
+        Args:
+            kind (str): The kind of entry.
+            key (tuple): The entry key.
+
+        Returns:
+            The cached value, or None if it is missing or expired.
+        """
+        return self.lookup(kind, key)[0]
+
+    def lookup(self, kind: str, key: tuple, grace: float = 0) -> tuple:
+        """
+        Looks up an entry, accepting one that expired less than `grace` seconds ago.
+
+        Args:
+            kind (str): The kind of entry.
+            key (tuple): The entry key.
+            grace (float): Number of seconds past expiry during which an entry is still served as stale.
+
+        Returns:
+            tuple: The cached value (None if missing or too old), its age in seconds and whether it is stale.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is None or entry[0] + grace <= now:
+                self._misses[kind] = self._misses.get(kind, 0) + 1
+                return None, None, False
+            self._entries.move_to_end((kind, key))
+            stale = entry[0] <= now
+            if stale:
+                self._stale_hits[kind] = self._stale_hits.get(kind, 0) + 1
+            else:
+                self._hits[kind] = self._hits.get(kind, 0) + 1
+            return entry[1], now - entry[2], stale
+
+    def set(self, kind: str, key: tuple, value) -> None:
+        """
+        Stores an entry, evicting the least recently used entries if the cache is full.
+
+        Args:
+            kind (str): The kind of entry.
+            key (tuple): The entry key.
+            value: The value to cache. Must not be None.
+        """
+        stored_at = time.monotonic()
+        with self._lock:
+            self._entries[(kind, key)] = (stored_at + self.ttls[kind], value, stored_at)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """
+        Removes all entries. Counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The number of entries and evictions, and hits, stale hits and misses per kind of entry.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "evictions": self._evictions,
+                "hits": dict(self._hits),
+                "stale_hits": dict(self._stale_hits),
+                "misses": dict(self._misses),
+            }
+
+
+class WeatherCache(LRUCache):
+    """
+    In-process LRU cache for parsed weather data, shared by all users of a worker.
+
+    Entries are keyed by a grid cell rather than by raw coordinates, so favorites a few
+    hundred metres apart share one upstream result. Each kind of data ('current',
+    'forecast') has its own time-to-live and hit/miss counters. Historical weather is
+    kept in the HistoricalStore instead.
+    """
+
+    def __init__(self, max_entries: int = 10000, resolution: float = 0.1, ttls: dict = None):
+        """
+        Args:
+            max_entries (int): Maximum number of entries kept before the least recently used is evicted.
+            resolution (float): Grid cell size in degrees. 0 disables quantization.
+            ttls (dict, optional): Time-to-live in seconds per kind of data (default: DEFAULT_TTLS).
+        """
+        super().__init__(max_entries, dict(DEFAULT_TTLS, **(ttls or {})))
+        self.resolution = resolution
+
+    def cell(self, lat: float, lon: float) -> tuple:
+        """
+        Snaps coordinates to the centre of their grid cell.
+
+        Args:
+            lat (float): Latitude of the location.
+            lon (float): Longitude of the location.
+
+        Returns:
+            tuple: The quantized (latitude, longitude).
+        """
+        if not self.resolution:
+            return lat, lon
+        return (round(round(lat / self.resolution) * self.resolution, 6),
+                round(round(lon / self.resolution) * self.resolution, 6))
+
+
+class _Call:
+    """
+    An upstream call in flight, shared by its leader and followers.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls so that only one of them reaches upstream.
+
+    The first caller for a key (the leader) runs the call; callers arriving while it is in
+    flight (followers) wait for it and share its result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def claim(self, key: tuple) -> tuple:
+        """
+        Joins the call in flight for a key, or starts a new one.
+
+        Args:
+            key (tuple): The normalized request key.
+
+        Returns:
+            tuple: The call and True if the caller is its leader and must resolve() it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def resolve(self, key: tuple, result=None, error: Exception = None) -> None:
+        """
+        Publishes the outcome of a call to its followers. Only the leader calls this.
+
+        Args:
+            key (tuple): The normalized request key.
+            result: The result of the call.
+            error (Exception, optional): The exception raised by the call.
+        """
+        with self._lock:
+            call = self._calls.pop(key)
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    @staticmethod
+    def wait(call: _Call, timeout: float = None):
+        """
+        Waits for a call led by another caller.
+
+        Args:
+            call (_Call): The call returned by claim().
+            timeout (float, optional): Maximum number of seconds to wait.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            TimeoutError: If the leader did not finish in time.
+            Exception: The exception raised by the leader's call.
+        """
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"Timed out after {timeout}s waiting for an identical upstream call.")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: tuple, func, timeout: float = None):
+        """
+        Runs `func` unless an identical call is already in flight, in which case waits for it.
+
+        Args:
+            key (tuple): The normalized request key.
+            func (callable): The call to make, without arguments.
+            timeout (float, optional): Maximum number of seconds a follower waits.
+
+        Returns:
+            The result of the call.
+        """
+        call, leader = self.claim(key)
+        if not leader:
+            return self.wait(call, timeout)
+        try:
+            result = func()
+        except Exception as e:
+            self.resolve(key, error=e)
+            raise
+        except BaseException as e:
+            # The leader was interrupted (GeneratorExit, KeyboardInterrupt): followers get an error
+            # instead of waiting out their timeout, but not the interruption itself
+            self.resolve(key, error=RuntimeError(f"The identical upstream call was interrupted ({type(e).__name__})."))
+            raise
+        self.resolve(key, result=result)
+        return result
+
+    def in_flight(self) -> int:
+        """
+        Returns the number of calls currently in flight.
+        """
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,69 @@
+"""
+Production WSGI entry point.
+
+Builds the app with ProductionConfig. Serve it with gunicorn, which preloads this module in
+the master process and forks the workers from it (see gunicorn.conf.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import logging
+import os
+
+import weather_api
+from app import create_app
+from config import ProductionConfig
+from db import db
+
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'info').upper(),
+                    format='[%(asctime)s] [%(process)d] [%(levelname)s] %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+app = create_app(ProductionConfig)
+
+
+def prepare_fork(app) -> None:
+    """
+    Releases the resources of the preloaded app that must not be shared with forked workers.
+
+    Runs in the master process once the app is loaded, before any worker is forked: the
+    cache warmer thread is stopped and waited for until its batch is done (threads do not
+    survive a fork, and a lock it holds would stay held in every worker), and pooled database
+    connections, HTTP cache databases and upstream connections are closed. Each worker
+    reopens its own on first use.
+    """
+    app.extensions['cache_warmer'].stop()
+    with app.app_context():
+        db.engine.dispose()
+    weather_api.close_connections(app.extensions['openmeteo'])
+
+
+def init_worker(app) -> None:
+    """
+    Re-creates the per-process resources of the app in a freshly forked worker.
+
+    Args:
+        app (Flask): The preloaded app.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)  # Never reuse a connection opened by the master
+    weather_api.configure_fan_out(
+        max_workers=app.config['FAN_OUT_MAX_WORKERS'],
+        max_per_host=app.config['FAN_OUT_MAX_PER_HOST']
+    )
+    if app.config['CACHE_WARMER_ENABLED']:
+        # Each worker keeps its own in-memory weather cache warm
+        app.extensions['cache_warmer'].start()
+
+
+def shutdown_worker(app) -> None:
+    """
+    Stops the background work of a worker once it has finished its in-flight requests.
+
+    Args:
+        app (Flask): The app served by the worker.
+    """
+    app.extensions['cache_warmer'].stop(timeout=5)
+    with app.app_context():
+        db.engine.dispose()
+    logger.info("Worker shut down")